@@ -0,0 +1,190 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from unit_of_work import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLogBuffer:
+    """Write-behind buffer for ActivityLog rows.
+
+    Inside a request, events are staged on the request's unit of work, so
+    they commit or roll back with the request's own writes. Events logged
+    outside a request (background jobs, CLI commands) are queued in-process
+    and bulk-inserted by a background thread once ``flush_size`` events are
+    waiting or the oldest one is ``flush_interval`` seconds old. In
+    synchronous mode those are written and committed immediately instead,
+    which keeps tests deterministic.
+    """
+
+    def __init__(self, max_size=10000, flush_size=200, flush_interval=1.0, synchronous=False):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.app = None
+        self._queue = queue.Queue(maxsize=max_size)
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._oldest = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.staged = 0
+        self.failed = 0
+        self.batches = 0
+
+    def init_app(self, app):
+        """Read buffer settings from ``app.config`` and register shutdown flushing."""
+        self.app = app
+        self.synchronous = app.config.get('ACTIVITY_LOG_SYNC', self.synchronous)
+        self.flush_size = app.config.get('ACTIVITY_LOG_FLUSH_SIZE', self.flush_size)
+        self.flush_interval = app.config.get('ACTIVITY_LOG_FLUSH_INTERVAL', self.flush_interval)
+        max_size = app.config.get('ACTIVITY_LOG_BUFFER_SIZE', self.max_size)
+        if max_size != self.max_size:
+            self.max_size = max_size
+            self._queue = queue.Queue(maxsize=max_size)
+        atexit.register(self.shutdown)
+
+    def log(self, action_type, description, details=None, session_id='unknown'):
+        """Record one activity event: staged in a request, else buffered unless synchronous."""
+        record = {
+            'action_type': action_type,
+            'description': description,
+            'details': details,
+            'session_id': session_id,
+            'timestamp': datetime.utcnow(),
+        }
+        if unit_of_work.active():
+            from events import event_hub
+            unit_of_work.stage(self._insert, [record])
+            unit_of_work.after_commit(event_hub.publish_activities, [record])
+            self.staged += 1
+            return
+        if self.synchronous:
+            self._write([record])
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so start (or restart) lazily per process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='activity-log-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            oldest = self._oldest
+            timeout = self.flush_interval if oldest is None else max(0.0, oldest + self.flush_interval - time.monotonic())
+            try:
+                record = self._queue.get(timeout=timeout)
+                with self._flush_lock:
+                    if not self._pending:
+                        self._oldest = time.monotonic()
+                    self._pending.append(record)
+            except queue.Empty:
+                pass
+
+            oldest = self._oldest
+            if oldest is not None and (len(self._pending) >= self.flush_size
+                                       or time.monotonic() >= oldest + self.flush_interval):
+                self.flush()
+
+        self.flush()
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _insert(self, records):
+        """Insert ``records`` and count them on the current session; the caller commits."""
+        from app import db
+        from models import ActivityLog
+        import session_stats
+
+        db.session.execute(insert(ActivityLog), records)
+        session_stats.record_activities(records)
+
+    def _write(self, records):
+        from app import db
+        from events import event_hub
+
+        try:
+            if self.synchronous:
+                # Use the caller's session so tests see the row immediately
+                self._insert(records)
+                db.session.commit()
+                event_hub.publish_activities(records)
+            else:
+                with self.app.app_context():
+                    self._insert(records)
+                    db.session.commit()
+                    event_hub.publish_activities(records)
+            self.flushed += len(records)
+            self.batches += 1
+        except Exception as e:
+            if self.synchronous:
+                db.session.rollback()
+            self.failed += len(records)
+            logger.error(f"Error flushing {len(records)} activity log entries: {e}")
+
+    def flush(self):
+        """Write every buffered event now, on the calling thread."""
+        with self._flush_lock:
+            batch = self._pending + self._drain()
+            self._pending = []
+            self._oldest = None
+            for start in range(0, len(batch), self.flush_size):
+                self._write(batch[start:start + self.flush_size])
+
+    def shutdown(self):
+        """Stop the flusher thread and write any remaining events."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=max(5.0, self.flush_interval * 2))
+        self.flush()
+
+    def stats(self):
+        """Return buffer counters and current queue depth."""
+        return {
+            'synchronous': self.synchronous,
+            'queue_depth': self._queue.qsize() + len(self._pending),
+            'max_size': self.max_size,
+            'enqueued': self.enqueued,
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'staged': self.staged,
+            'failed': self.failed,
+            'batches': self.batches,
+        }
+
+
+activity_buffer = ActivityLogBuffer()
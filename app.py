@@ -1,38 +1,205 @@
 import os
 import logging
-from flask import Flask
+from flask import Flask, url_for
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
-
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+from storage import RoutingSession
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
-
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "labmate-ai-secret-key-2025")
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///labmate.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
+# Per-environment defaults, selected with LABMATE_ENV (production when it is
+# unset); the LOG_LEVEL and SCHEMA_AUTO_UPGRADE environment variables override
+# them. Production never touches the schema on start-up: run `flask upgrade-db`
+# as a release step.
+ENVIRONMENTS = {
+    "development": {"LOG_LEVEL": "DEBUG", "SCHEMA_AUTO_UPGRADE": True, "MAX_COMMITS_PER_REQUEST": "1"},
+    "testing": {"LOG_LEVEL": "WARNING", "SCHEMA_AUTO_UPGRADE": True, "MAX_COMMITS_PER_REQUEST": "1"},
+    "production": {"LOG_LEVEL": "INFO", "SCHEMA_AUTO_UPGRADE": False, "MAX_COMMITS_PER_REQUEST": ""},
 }
 
-# Initialize the app with the extension
-db.init_app(app)
+def load_config():
+    """Build the app configuration from environment variables."""
+    config = {}
+    config["ENVIRONMENT"] = os.environ.get("LABMATE_ENV", "production")
+    defaults = ENVIRONMENTS.get(config["ENVIRONMENT"], ENVIRONMENTS["production"])
+    config["LOG_LEVEL"] = os.environ.get("LOG_LEVEL", defaults["LOG_LEVEL"]).upper()
+    config["SCHEMA_AUTO_UPGRADE"] = os.environ.get(
+        "SCHEMA_AUTO_UPGRADE", "1" if defaults["SCHEMA_AUTO_UPGRADE"] else "0") == "1"
+    # Each request commits once (see unit_of_work); more commits than this
+    # are logged, and fail the request in the testing environment. Empty
+    # disables the check.
+    max_commits = os.environ.get("MAX_COMMITS_PER_REQUEST", defaults["MAX_COMMITS_PER_REQUEST"])
+    config["MAX_COMMITS_PER_REQUEST"] = int(max_commits) if max_commits else None
+    config["SECRET_KEY"] = os.environ.get("SESSION_SECRET", "labmate-ai-secret-key-2025")
+
+    # Configure the database
+    config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///labmate.db")
+    config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+
+    # File-backed SQLite runs in WAL mode and read-only views use a separate
+    # pool of query_only connections (or DATABASE_READ_URL, e.g. a replica).
+    # SQLITE_WRITE_LOCK=1 makes a process's write transactions take turns on
+    # a lock: it cuts /calculate tail latency under contention but raises the
+    # median, so it is off by default. See storage.py.
+    config["SQLITE_WAL"] = os.environ.get("SQLITE_WAL", "1") == "1"
+    config["SQLITE_SYNCHRONOUS"] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+    config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    config["SQLITE_MMAP_SIZE"] = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    config["SQLITE_WRITER_CONNECTIONS"] = int(os.environ.get("SQLITE_WRITER_CONNECTIONS", "5"))
+    config["SQLITE_WRITE_LOCK"] = os.environ.get("SQLITE_WRITE_LOCK", "0") == "1"
+    config["DATABASE_READ_URL"] = os.environ.get("DATABASE_READ_URL")
+    config["DATABASE_READ_POOL_SIZE"] = int(os.environ.get("DATABASE_READ_POOL_SIZE", "5"))
+
+    # Requests commit their activity entries with their own writes; entries
+    # logged outside a request are buffered and bulk-inserted in the background.
+    # Set ACTIVITY_LOG_SYNC=1 to write those immediately (e.g. in tests)
+    config["ACTIVITY_LOG_SYNC"] = os.environ.get("ACTIVITY_LOG_SYNC", "0") == "1"
+    config["ACTIVITY_LOG_BUFFER_SIZE"] = int(os.environ.get("ACTIVITY_LOG_BUFFER_SIZE", "10000"))
+    config["ACTIVITY_LOG_FLUSH_SIZE"] = int(os.environ.get("ACTIVITY_LOG_FLUSH_SIZE", "200"))
+    config["ACTIVITY_LOG_FLUSH_INTERVAL"] = float(os.environ.get("ACTIVITY_LOG_FLUSH_INTERVAL", "1.0"))
+
+    # PDF reports requested through the JSON API are rendered by a process pool
+    config["REPORT_WORKERS"] = int(os.environ.get("REPORT_WORKERS", "2"))
+    config["REPORT_QUEUE_SIZE"] = int(os.environ.get("REPORT_QUEUE_SIZE", "32"))
+    config["REPORT_OUTPUT_DIR"] = os.environ.get("REPORT_OUTPUT_DIR")
+    config["REPORT_CACHE_DIR"] = os.environ.get("REPORT_CACHE_DIR")
+    config["REPORT_CACHE_MAX_BYTES"] = int(os.environ.get("REPORT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    config["REPORT_BUNDLE_MAX_REPORTS"] = int(os.environ.get("REPORT_BUNDLE_MAX_REPORTS", "500"))
+
+    # Activity older than ACTIVITY_RETENTION_DAYS is rolled up, archived to
+    # gzip NDJSON and deleted by `flask compact-activity`; set
+    # ACTIVITY_RETENTION_INTERVAL (seconds) to also run it in the background
+    config["ACTIVITY_RETENTION_DAYS"] = int(os.environ.get("ACTIVITY_RETENTION_DAYS", "90"))
+    config["ACTIVITY_ARCHIVE_DIR"] = os.environ.get("ACTIVITY_ARCHIVE_DIR")
+    config["ACTIVITY_RETENTION_BATCH_SIZE"] = int(os.environ.get("ACTIVITY_RETENTION_BATCH_SIZE", "1000"))
+    config["ACTIVITY_RETENTION_INTERVAL"] = float(os.environ.get("ACTIVITY_RETENTION_INTERVAL", "0")) or None
+
+    # Repeated calculations are served from an LRU; CALCULATION_DEDUP=1 also
+    # stores same-day repeats as a hit count on the existing Calculation row
+    config["CALCULATION_CACHE_SIZE"] = int(os.environ.get("CALCULATION_CACHE_SIZE", "1024"))
+    config["CALCULATION_DEDUP"] = os.environ.get("CALCULATION_DEDUP", "0") == "1"
+
+    # Server-sent events for the dashboard; SSE_MAX_CLIENTS=0 disables the
+    # stream and clients keep polling /api/recent_activity and /api/stats.
+    # Each open stream holds a request thread, so SSE is off unless the worker
+    # serves several requests at once: set SERVER_THREADS to gunicorn's
+    # --threads (gthread) or --worker-connections (gevent). Streams are capped
+    # below SERVER_THREADS so ordinary requests always have a thread.
+    config["SERVER_THREADS"] = int(os.environ.get("SERVER_THREADS", "1"))
+    config["SSE_MAX_CLIENTS"] = int(os.environ.get("SSE_MAX_CLIENTS", str(config["SERVER_THREADS"] // 2)))
+    config["SSE_QUEUE_SIZE"] = int(os.environ.get("SSE_QUEUE_SIZE", "100"))
+    config["SSE_HEARTBEAT"] = float(os.environ.get("SSE_HEARTBEAT", "15"))
+    config["SSE_MAX_DURATION"] = float(os.environ.get("SSE_MAX_DURATION", "300"))
+
+    # Report bodies are stored zlib-compressed on SQLite; older plain rows
+    # are still read as-is
+    config["REPORT_COMPRESSION"] = os.environ.get("REPORT_COMPRESSION", "1") == "1"
+
+    # Report search uses SQLite FTS5 when available; "python" forces the
+    # in-memory inverted index
+    config["REPORT_SEARCH_BACKEND"] = os.environ.get("REPORT_SEARCH_BACKEND", "auto")
+
+    # Opt-in stack sampling of requests slower than this many milliseconds
+    config["PROFILE_SLOW_REQUEST_MS"] = os.environ.get("PROFILE_SLOW_REQUEST_MS")
+    config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR")
+    return config
+
+def configure_logging(app):
+    level = getattr(logging, app.config["LOG_LEVEL"], logging.INFO)
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(level=level)
+    root.setLevel(level)
+    app.logger.setLevel(level)
+
+def create_app(config=None):
+    """Create and configure the Flask app.
+
+    ``config`` is a mapping applied on top of the environment-derived settings.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(load_config())
+    if config:
+        app.config.from_mapping(config)
+    configure_logging(app)
+
+    # Initialize the app with the extension, behind the storage layer
+    from storage import storage
+    storage.init_app(app)
+
+    # Registered before the routes so request timing wraps every other hook
+    from instrumentation import instrumentation
+    instrumentation.init_app(app)
+
+    from unit_of_work import unit_of_work
+    unit_of_work.init_app(app)
+
+    from activity_buffer import activity_buffer
+    activity_buffer.init_app(app)
+
+    from report_jobs import report_jobs
+    report_jobs.init_app(app)
+
+    from report_cache import report_cache
+    report_cache.init_app(app)
+
+    from bundles import bundle_store
+    bundle_store.init_app(app)
+
+    from events import event_hub
+    event_hub.init_app(app)
+
+    from chemical_registry import registry
+    instrumentation.add_stats('labmate_storage', storage.stats, 'Database connection pools')
+    instrumentation.add_stats('labmate_unit_of_work', unit_of_work.stats, 'Per-request transactions')
+    instrumentation.add_stats('labmate_event_stream', event_hub.stats, 'Server-sent event hub')
+    instrumentation.add_stats('labmate_activity_buffer', activity_buffer.stats, 'Activity log buffer')
+    instrumentation.add_stats('labmate_report_jobs', report_jobs.stats, 'Report job queue')
+    instrumentation.add_stats('labmate_report_cache', report_cache.stats, 'Report PDF cache')
+    instrumentation.add_stats('labmate_report_bundles', bundle_store.stats, 'Report bundles')
+    instrumentation.add_stats('labmate_chemical_registry', registry.stats, 'Chemical registry')
+
+    from report_storage import report_storage
+    report_storage.init_app(app)
+    instrumentation.add_stats('labmate_report_storage', report_storage.stats, 'Report body storage')
+
+    from report_search import report_search
+    report_search.init_app(app)
+    instrumentation.add_stats('labmate_report_search', report_search.stats, 'Report full-text search')
+
+    from calculations import calculation_cache
+    calculation_cache.init_app(app)
+    instrumentation.add_stats('labmate_calculation_cache', calculation_cache.stats, 'Calculation result cache')
+
+    from retention import retention
+    retention.init_app(app)
+    instrumentation.add_stats('labmate_activity_retention', retention.stats, 'Activity log retention')
+
+    from routes import bp as main_blueprint
+    from cli import commands
+    app.register_blueprint(main_blueprint)
+    app.register_blueprint(commands)
+
+    # Templates written against the old flat endpoint names ("dashboard")
+    # keep resolving to the blueprint's endpoints ("main.dashboard")
+    def legacy_endpoint(error, endpoint, values):
+        if '.' not in endpoint and f'main.{endpoint}' in app.view_functions:
+            return url_for(f'main.{endpoint}', **values)
+        raise error
+    app.url_build_error_handlers.append(legacy_endpoint)
 
-with app.app_context():
-    # Import models to ensure tables are created
-    import models
-    db.create_all()
+    if app.config["SCHEMA_AUTO_UPGRADE"]:
+        from migrations import upgrade_schema
+        with app.app_context():
+            upgrade_schema()
 
-# Import routes after app creation
-from routes import *
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,113 @@
+"""Latency benchmark for the chemical search engine.
+
+Run from the repository root:
+
+    python benchmarks/bench_chemical_search.py --entries 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chemical_search import ChemicalSearchEngine  # noqa: E402
+
+SYLLABLES = ['meth', 'eth', 'prop', 'but', 'pent', 'hex', 'hept', 'oct', 'non', 'dec',
+             'chlor', 'brom', 'fluor', 'iod', 'sulf', 'phos', 'nitr', 'carb', 'ox', 'hydr',
+             'amin', 'benz', 'phen', 'tol', 'xyl', 'pyr', 'furan', 'thi', 'az', 'im',
+             'cycl', 'acet', 'form', 'glyc', 'lact', 'malon', 'succin', 'cinnam', 'anthr', 'naphth']
+SUFFIXES = ['ide', 'ate', 'ite', 'ane', 'ene', 'yne', 'ol', 'one', 'al', 'ic acid', 'amine',
+            'amide', 'yl ether', 'ine', 'oate', 'ium']
+PREFIXES = ['', '', '', 'sodium ', 'potassium ', 'calcium ', 'magnesium ', 'lithium ',
+            'ammonium ', 'zinc ', 'copper ', 'iron ', 'methyl ', 'ethyl ', 'tert-butyl ']
+LOCANTS = ['', '', '1-', '2-', '3-', '4-', '1,2-di', '1,3-di', '2,4-di', '1,3,5-tri']
+
+
+def generate_chemicals(count, seed=42):
+    """Generate a synthetic chemical database with ``count`` unique entries."""
+    rng = random.Random(seed)
+    chemicals = {}
+    while len(chemicals) < count:
+        stem = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        name = f'{rng.choice(PREFIXES)}{rng.choice(LOCANTS)}{stem}{rng.choice(SUFFIXES)}'
+        if name in chemicals:
+            continue
+        chemicals[name] = {
+            'name': name,
+            'formula': f'C{rng.randint(1, 30)}H{rng.randint(1, 60)}X{len(chemicals)}',
+            'molecular_weight': round(rng.uniform(10, 900), 2),
+            'common_names': [],
+            'hazards': [],
+        }
+    return chemicals
+
+
+def make_typo(text, rng):
+    """Delete, duplicate or swap one character of ``text``."""
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 1)
+    op = rng.choice(['delete', 'duplicate', 'swap'])
+    if op == 'delete':
+        return text[:i] + text[i + 1:]
+    if op == 'duplicate':
+        return text[:i] + text[i] + text[i:]
+    return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    chemicals = generate_chemicals(args.entries, args.seed)
+
+    start = time.perf_counter()
+    engine = ChemicalSearchEngine(chemicals.values())
+    build_ms = (time.perf_counter() - start) * 1000
+
+    names = list(chemicals)
+    queries = []
+    for _ in range(args.queries):
+        name = rng.choice(names)
+        kind = rng.choice(['prefix', 'prefix typo', 'typo', 'exact'])
+        if kind == 'prefix':
+            queries.append((name[:rng.randint(2, len(name))], name))
+        elif kind == 'prefix typo':
+            queries.append((make_typo(name[:rng.randint(5, len(name))], rng), name))
+        elif kind == 'typo':
+            queries.append((make_typo(name, rng), name))
+        else:
+            queries.append((name, name))
+
+    latencies = []
+    found = 0
+    for query, expected in queries:
+        start = time.perf_counter()
+        results = engine.suggest(query)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        if any(result['name'] == expected for result in results):
+            found += 1
+
+    print(f'entries:      {len(engine)}')
+    print(f'build:        {build_ms:.0f} ms')
+    print(f'queries:      {len(queries)}')
+    print(f'recall@10:    {found / len(queries):.3f}')
+    print(f'mean:         {statistics.mean(latencies):.0f} us')
+    print(f'p50:          {percentile(latencies, 50):.0f} us')
+    print(f'p99:          {percentile(latencies, 99):.0f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""Concurrency stress test: many threads hitting /calculate and /api/stats.
+
+Starts ``--workers`` server processes on one temporary SQLite database. Each
+process is a threaded werkzeug server, like a multi-worker deployment.
+``--threads`` client threads then send a mix of writes (``/calculate``) and
+reads (``/api/stats``, ``/api/activity_logs``) for ``--duration`` seconds.
+Run from the repository root:
+
+    python benchmarks/bench_concurrency.py --workers 4 --threads 32
+    python benchmarks/bench_concurrency.py --legacy     # rollback-journal defaults
+
+``--legacy`` turns the storage layer off for comparison: no WAL, synchronous
+FULL, no read pool and no write lock. It reports throughput and
+latency per endpoint, HTTP errors, and how many "database is locked" errors
+the servers logged. The exit status is 1 on any error.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_chemical_search import percentile  # noqa: E402
+from bench_suite import BASE_CHEMICALS, build_chemical_db, seed_database  # noqa: E402
+
+LEGACY = {
+    'SQLITE_WAL': '0',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_MMAP_SIZE': '0',
+    'SQLITE_WRITER_CONNECTIONS': '5',
+    'SQLITE_WRITE_LOCK': '0',
+    'DATABASE_READ_POOL_SIZE': '0',
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(port):
+    """Child process: serve the app on ``port`` until killed."""
+    from werkzeug.serving import make_server
+    from app import create_app
+    app = create_app({'LOG_LEVEL': 'WARNING'})
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def wait_until_up(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/stats', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+class Client(threading.Thread):
+    def __init__(self, ports, deadline, write_ratio, seed, results):
+        super().__init__(daemon=True)
+        self.ports = ports
+        self.deadline = deadline
+        self.write_ratio = write_ratio
+        self.rng = random.Random(seed)
+        self.results = results
+
+    def run(self):
+        # Each thread is one browser session, pinned to one worker like a sticky balancer
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        base = f'http://127.0.0.1:{self.rng.choice(self.ports)}'
+        names = [chemical['name'] for chemical in BASE_CHEMICALS.values()]
+        while time.monotonic() < self.deadline:
+            if self.rng.random() < self.write_ratio:
+                endpoint = '/calculate'
+                body = json.dumps({'chemical_name': self.rng.choice(names),
+                                   'molarity': self.rng.choice([0.01, 0.1, 0.5, 1.0]),
+                                   'volume': self.rng.choice([10, 100, 250, 1000]),
+                                   'volume_unit': 'ml'}).encode()
+                request = urllib.request.Request(base + endpoint, data=body,
+                                                 headers={'Content-Type': 'application/json'})
+            else:
+                endpoint = self.rng.choice(['/api/stats', '/api/activity_logs'])
+                request = urllib.request.Request(base + endpoint)
+            start = time.perf_counter()
+            try:
+                with opener.open(request, timeout=60) as response:
+                    response.read()
+                status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except OSError:
+                status = 'connection error'
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.results.append((endpoint, status, elapsed_ms))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='server processes')
+    parser.add_argument('--threads', type=int, default=32, help='client threads')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load')
+    parser.add_argument('--write-ratio', type=float, default=0.3, help='share of requests that are /calculate')
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--activities-per-session', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--legacy', action='store_true', help='disable WAL, pragmas and read/write routing')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='labmate-concurrency-')
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+        'ACTIVITY_LOG_SYNC': '1',
+        'REPORT_OUTPUT_DIR': os.path.join(workdir, 'reports'),
+        'REPORT_CACHE_DIR': os.path.join(workdir, 'report_cache'),
+        'LABMATE_ENV': 'production',
+        'PYTHONPATH': ROOT,
+    })
+    env.pop('PROFILE_SLOW_REQUEST_MS', None)
+    if args.legacy:
+        env.update(LEGACY)
+    os.environ.update(env)
+
+    servers = []
+    try:
+        # The registry reads data/chemicals.json relative to the working directory
+        os.makedirs(os.path.join(workdir, 'data'))
+        build_chemical_db(os.path.join(workdir, 'data', 'chemicals.json'), len(BASE_CHEMICALS), args.seed)
+
+        from app import create_app
+        app = create_app({'LOG_LEVEL': 'WARNING', 'SCHEMA_AUTO_UPGRADE': True})
+        with app.app_context():
+            seed_database(args.sessions, args.activities_per_session, args.seed)
+            from app import db
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+        ports = [free_port() for _ in range(args.workers)]
+        for port in ports:
+            log = open(os.path.join(workdir, f'server-{port}.log'), 'w+')
+            process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port)],
+                                       cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+            servers.append((process, log))
+        for port in ports:
+            wait_until_up(port)
+
+        results = []
+        deadline = time.monotonic() + args.duration
+        clients = [Client(ports, deadline, args.write_ratio, args.seed + i, results) for i in range(args.threads)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+
+        locked = 0
+        for process, log in servers:
+            process.terminate()
+            process.wait()
+            log.seek(0)
+            locked += log.read().count('database is locked')
+    finally:
+        for process, log in servers:
+            if process.poll() is None:
+                process.kill()
+            log.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = {
+        'mode': 'legacy' if args.legacy else 'storage',
+        'workers': args.workers,
+        'threads': args.threads,
+        'duration_s': args.duration,
+        'requests': len(results),
+        'requests_per_sec': round(len(results) / args.duration, 1),
+        'database_locked_errors': locked,
+        'endpoints': {},
+    }
+    errors = 0
+    for endpoint in sorted({endpoint for endpoint, _, _ in results}):
+        samples = [ms for e, _, ms in results if e == endpoint]
+        failed = [status for e, status, _ in results if e == endpoint and status != 200]
+        errors += len(failed)
+        summary['endpoints'][endpoint] = {
+            'requests': len(samples),
+            'errors': len(failed),
+            'median_ms': round(statistics.median(samples), 2),
+            'p95_ms': round(percentile(samples, 95), 2),
+            'p99_ms': round(percentile(samples, 99), 2),
+            'max_ms': round(max(samples), 2),
+        }
+
+    print(f'{summary["mode"]}: {args.workers} worker(s), {args.threads} thread(s), '
+          f'{summary["requests"]} requests, {summary["requests_per_sec"]:,.0f} req/s, '
+          f'{locked} "database is locked"')
+    for endpoint, stats in summary['endpoints'].items():
+        print(f'  {endpoint:<20} {stats["requests"]:>7} req  median {stats["median_ms"]:>8.2f} ms  '
+              f'p95 {stats["p95_ms"]:>8.2f} ms  p99 {stats["p99_ms"]:>8.2f} ms  errors {stats["errors"]}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if errors or locked:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Latency benchmark for hazard incompatibility checks.
+
+Run from the repository root:
+
+    python benchmarks/bench_hazards.py --entries 50000 --reagents 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_chemical_search import generate_chemicals, percentile  # noqa: E402
+from hazard_index import HazardIndex  # noqa: E402
+
+HAZARDS = ['Corrosive', 'Strong acid', 'Strong base', 'Oxidizer', 'Highly flammable liquid', 'Toxic if inhaled',
+           'Reacts violently with water', 'Strong reducing agent', 'Eye irritant', 'Non-flammable', 'Explosive when dry']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--reagents', type=int, default=500, help='chemicals per checked list')
+    parser.add_argument('--checks', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    chemicals = generate_chemicals(args.entries, args.seed)
+    for chemical in chemicals.values():
+        chemical['hazards'] = rng.sample(HAZARDS, rng.randint(0, 2))
+
+    start = time.perf_counter()
+    index = HazardIndex(chemicals.values())
+    build_ms = (time.perf_counter() - start) * 1000
+
+    names = list(chemicals)
+    latencies = []
+    conflicts = 0
+    for _ in range(args.checks):
+        reagents = rng.sample(names, args.reagents)
+        start = time.perf_counter()
+        result = index.check(reagents)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        conflicts += len(result['conflicts'])
+
+    print(f'entries:      {len(index)}')
+    print(f'build:        {build_ms:.0f} ms')
+    print(f'checks:       {args.checks} x {args.reagents} reagents')
+    print(f'conflicts:    {conflicts / args.checks:.1f} rules fired per check')
+    print(f'mean:         {statistics.mean(latencies):.0f} us')
+    print(f'p50:          {percentile(latencies, 50):.0f} us')
+    print(f'p99:          {percentile(latencies, 99):.0f} us')
+
+
+if __name__ == '__main__':
+    main()
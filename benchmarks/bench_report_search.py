@@ -0,0 +1,187 @@
+"""Report search benchmark: FTS5 vs the Python index vs a LIKE '%...%' scan.
+
+Seeds a temporary SQLite database with ``--reports`` synthetic lab reports
+(100k by default) spread over ``--sessions`` sessions, then times one page
+of results for a set of queries with each approach. Run from the
+repository root:
+
+    python benchmarks/bench_report_search.py --reports 100000 --output search.json
+
+The LIKE baseline is what search looked like without an index: every word
+must appear in the title or content, newest first, plus a count for
+pagination. It is neither ranked nor prefix-aware, so it does the least
+work of the three and is still the slowest. The FTS5 timing is the full
+``report_search.search`` call, snippets included; the Python timing is
+the in-memory ranking alone, which is the part that grows with the table.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_chemical_search import percentile  # noqa: E402
+
+WORDS = ('buffer titration absorbance assay protein enzyme kinetics centrifuge pellet supernatant '
+         'incubate overnight dilution standard curve calibration spectrophotometer cuvette pipette '
+         'reagent solvent ethanol methanol acetone chloride sodium potassium hydroxide acid base '
+         'precipitate filtrate crystal yield purity chromatography column gradient elution fraction '
+         'sample control replicate mean deviation error temperature pressure volume molarity '
+         'observation result conclusion procedure materials method discussion stock aliquot').split()
+# Common, mid-frequency and rare lab words, plus a prefix and a miss
+QUERIES = ['buffer', 'protein assay', 'spectrophotometer calibration', 'centrif', 'sodium hydroxide acid',
+           'chromatography gradient elution', 'aliquot stock', 'xylophone']
+SYLLABLES = 'ba be bi bo ca ce co da de di do fa fe ga go la le li lo ma me mi mo na ne no pa pe po ra re ri ro '\
+            'sa se si so ta te ti to va ve vi za ze zo'.split()
+
+
+def vocabulary(size, rng):
+    """The lab words plus ``size`` pseudo-words, with cumulative Zipf weights.
+
+    Real text is Zipf-distributed: a few words are in every report and most
+    are rare. A uniform vocabulary makes every query match every report,
+    which no index can help with.
+    """
+    words = list(WORDS)
+    seen = set(words)
+    while len(words) < len(WORDS) + size:
+        word = ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    # Spread the lab words over the frequency ranks instead of making them the commonest
+    rng.shuffle(words)
+    return words, list(itertools.accumulate(1.0 / rank for rank in range(1, len(words) + 1)))
+
+
+def generate_reports(count, sessions, seed):
+    rng = random.Random(seed)
+    words, cum_weights = vocabulary(20000, rng)
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        body = rng.choices(words, cum_weights=cum_weights, k=rng.randint(40, 160))
+        yield {
+            'title': ' '.join(rng.choices(words, cum_weights=cum_weights, k=3)).title(),
+            'content': ' '.join(body).capitalize() + '.',
+            'report_type': rng.choice(['experiment', 'analysis', 'general']),
+            'session_id': f'bench-session-{i % sessions:04d}',
+            'created_at': start + timedelta(minutes=i),
+        }
+
+
+def like_search(session_id, query, per_page=20):
+    from sqlalchemy import or_
+    from models import LabReport
+    filters = [LabReport.session_id == session_id]
+    for word in query.split():
+        pattern = f'%{word}%'
+        filters.append(or_(LabReport.title.like(pattern), LabReport.content.like(pattern)))
+    base = LabReport.query.filter(*filters)
+    total = base.count()
+    rows = base.order_by(LabReport.created_at.desc()).limit(per_page).all()
+    return total, rows
+
+
+def time_calls(fn, queries, repeat):
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            fn(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, default=100000)
+    parser.add_argument('--sessions', type=int, default=10, help='reports are spread evenly over this many sessions')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='labmate-search-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['REPORT_OUTPUT_DIR'] = os.path.join(workdir, 'reports')
+    os.environ['REPORT_CACHE_DIR'] = os.path.join(workdir, 'report_cache')
+    os.environ.pop('PROFILE_SLOW_REQUEST_MS', None)
+    # LIKE cannot look inside compressed bodies; keep them plain for the baseline
+    os.environ['REPORT_COMPRESSION'] = '0'
+
+    try:
+        from sqlalchemy import insert
+        from app import create_app, db
+        from models import LabReport
+        from report_search import InvertedIndex, parse_query, report_search
+
+        app = create_app({'LOG_LEVEL': 'WARNING', 'SCHEMA_AUTO_UPGRADE': True})
+        results = {'reports': args.reports, 'sessions': args.sessions, 'queries': QUERIES}
+        with app.app_context():
+            start = time.perf_counter()
+            batch = []
+            for report in generate_reports(args.reports, args.sessions, args.seed):
+                batch.append(report)
+                if len(batch) == 5000:
+                    db.session.execute(insert(LabReport), batch)
+                    batch = []
+            if batch:
+                db.session.execute(insert(LabReport), batch)
+            db.session.commit()
+            print(f'seeded {args.reports} reports in {time.perf_counter() - start:.1f} s')
+
+            # Core inserts bypass the insert hook, as a pre-existing table would
+            start = time.perf_counter()
+            with db.engine.begin() as conn:
+                backend, count = report_search.rebuild(conn)
+            results['fts5_backfill_s'] = round(time.perf_counter() - start, 2)
+            print(f'{backend} backfill of {count} reports: {results["fts5_backfill_s"]:.2f} s')
+
+            session_id = 'bench-session-0000'
+
+            def fts(query):
+                return report_search.search(session_id, query, 1, 20)
+
+            index = InvertedIndex()
+            start = time.perf_counter()
+            index.catch_up(db.session)
+            results['python_index_build_s'] = round(time.perf_counter() - start, 2)
+            print(f'python index build: {results["python_index_build_s"]:.2f} s')
+
+            def python(query):
+                terms, prefix = parse_query(query)
+                return index.search(terms, prefix, session_id)[:20]
+
+            def like(query):
+                return like_search(session_id, query)
+
+            for name, fn in (('fts5', fts), ('python', python), ('like', like)):
+                fn(QUERIES[0])
+                results[name] = time_calls(fn, QUERIES, args.repeat)
+                print(f'{name:<8} median {results[name]["median_ms"]:>9.3f} ms   '
+                      f'p95 {results[name]["p95_ms"]:>9.3f} ms   mean {results[name]["mean_ms"]:>9.3f} ms')
+            results['speedup_fts5_vs_like'] = round(results['like']['median_ms'] / results['fts5']['median_ms'], 1)
+            print(f'fts5 is {results["speedup_fts5_vs_like"]}x faster than LIKE (median)')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
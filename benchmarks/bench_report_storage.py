@@ -0,0 +1,150 @@
+"""Report storage benchmark: database size and list-view cost before and after compaction.
+
+Seeds a temporary SQLite database with ``--reports`` plain-text reports of
+about ``--body-kb`` KiB each, as an older database would hold them. It then
+times the documentation list query with the body loaded (the old mapping)
+and deferred (``queries.recent_reports``), runs ``report_storage.compact()``
+and VACUUM, and reports the file size before and after. Run from the
+repository root:
+
+    python benchmarks/bench_report_storage.py --reports 5000 --body-kb 20
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_chemical_search import percentile  # noqa: E402
+from bench_report_search import WORDS  # noqa: E402
+
+
+def generate_reports(count, sessions, body_kb, seed):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        paragraphs = []
+        size = 0
+        while size < body_kb * 1024:
+            paragraph = ' '.join(rng.choices(WORDS, k=rng.randint(30, 90))).capitalize() + '.'
+            paragraphs.append(paragraph)
+            size += len(paragraph) + 2
+        yield {
+            'title': ' '.join(rng.choices(WORDS, k=3)).title(),
+            'content': '\n\n'.join(paragraphs),
+            'report_type': rng.choice(['experiment', 'analysis', 'general']),
+            'session_id': f'bench-session-{i % sessions:04d}',
+            'created_at': start + timedelta(minutes=i),
+        }
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, default=5000)
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--body-kb', type=int, default=20, help='approximate size of each report body')
+    parser.add_argument('--limit', type=int, default=50, help='reports per list page')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='labmate-storage-')
+    path = os.path.join(workdir, 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ['REPORT_OUTPUT_DIR'] = os.path.join(workdir, 'reports')
+    os.environ['REPORT_CACHE_DIR'] = os.path.join(workdir, 'report_cache')
+    os.environ['REPORT_SEARCH_BACKEND'] = 'python'
+    os.environ.pop('PROFILE_SLOW_REQUEST_MS', None)
+
+    try:
+        from sqlalchemy import insert
+        from sqlalchemy.orm import undefer
+        from app import create_app, db
+        from models import LabReport
+        from report_storage import report_storage
+        import queries
+
+        app = create_app({'LOG_LEVEL': 'WARNING', 'SCHEMA_AUTO_UPGRADE': True})
+        results = {'reports': args.reports, 'body_kb': args.body_kb}
+        session_id = 'bench-session-0000'
+
+        def size_mb():
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+            return round(os.path.getsize(path) / 1024 / 1024, 2)
+
+        def full_rows():
+            LabReport.query.options(undefer(LabReport.content)).filter_by(session_id=session_id) \
+                .order_by(LabReport.created_at.desc()).limit(args.limit).all()
+            db.session.expunge_all()
+
+        def list_rows():
+            queries.recent_reports(session_id, args.limit).all()
+            db.session.expunge_all()
+
+        with app.app_context():
+            # Older rows: plain text, no summary
+            report_storage.compress = False
+            batch = []
+            for report in generate_reports(args.reports, args.sessions, args.body_kb, args.seed):
+                batch.append(report)
+                if len(batch) == 500:
+                    db.session.execute(insert(LabReport), batch)
+                    batch = []
+            if batch:
+                db.session.execute(insert(LabReport), batch)
+            db.session.commit()
+            db.session.execute(LabReport.__table__.update().values(summary=None))
+            db.session.commit()
+            report_storage.compress = True
+
+            results['plain_db_mb'] = size_mb()
+            results['list_with_bodies'] = time_calls(full_rows, args.repeat)
+            results['list_deferred'] = time_calls(list_rows, args.repeat)
+
+            start = time.perf_counter()
+            results['compacted_rows'] = report_storage.compact()
+            results['compact_s'] = round(time.perf_counter() - start, 2)
+            with db.engine.connect() as conn:
+                conn.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM')
+            results['compressed_db_mb'] = size_mb()
+            results['list_with_bodies_compressed'] = time_calls(full_rows, args.repeat)
+            results['list_deferred_compressed'] = time_calls(list_rows, args.repeat)
+            db.session.remove()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{args.reports} reports of ~{args.body_kb} KiB: {results["plain_db_mb"]} MB plain, '
+          f'{results["compressed_db_mb"]} MB compressed '
+          f'({results["compacted_rows"]} rows compacted in {results["compact_s"]} s)')
+    for name in ('list_with_bodies', 'list_deferred', 'list_with_bodies_compressed', 'list_deferred_compressed'):
+        print(f'  {name:<30} median {results[name]["median_ms"]:>8.3f} ms   p95 {results[name]["p95_ms"]:>8.3f} ms')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Cold-start benchmark: time to import ``main`` (which calls create_app).
+
+Each run is a fresh ``python -X importtime`` process in the production
+environment, so schema upgrades are skipped as they would be in a
+deployed container. Run from the repository root:
+
+    python benchmarks/bench_startup.py --runs 5 --output startup.json
+
+The results are checked against ``startup_budget.json``:
+- ``total_ms`` caps the median wall time of ``import main``;
+- ``modules_ms`` caps the median cumulative import time of individual
+  top-level packages;
+- ``forbidden`` lists modules that must not be imported at start-up at all.
+The exit status is 1 when any budget is exceeded.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET = os.path.join(ROOT, 'benchmarks', 'startup_budget.json')
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+SNIPPET = 'import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)'
+
+
+def run_once(workdir):
+    env = dict(os.environ)
+    env.update({
+        'LABMATE_ENV': 'production',
+        'LOG_LEVEL': 'WARNING',
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'startup.db'),
+        'REPORT_OUTPUT_DIR': os.path.join(workdir, 'reports'),
+        'REPORT_CACHE_DIR': os.path.join(workdir, 'report_cache'),
+    })
+    env.pop('PROFILE_SLOW_REQUEST_MS', None)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', SNIPPET], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+    modules = {}
+    imported = set()
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        _, cumulative, _, name = match.groups()
+        package = name.split('.')[0]
+        imported.add(package)
+        # A package's outermost import has the largest cumulative time and
+        # already includes its submodules
+        modules[package] = max(modules.get(package, 0), int(cumulative) / 1000.0)
+    total_ms = float(proc.stdout.strip().splitlines()[-1]) * 1000
+    return total_ms, modules, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', default=BUDGET)
+    parser.add_argument('--top', type=int, default=10, help='print the N slowest packages')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    totals = []
+    per_module = {}
+    imported = set()
+    with tempfile.TemporaryDirectory(prefix='labmate-startup-') as workdir:
+        # The first run warms the bytecode cache and creates the database file
+        run_once(workdir)
+        for _ in range(args.runs):
+            total_ms, modules, names = run_once(workdir)
+            totals.append(total_ms)
+            imported |= names
+            for name, ms in modules.items():
+                per_module.setdefault(name, []).append(ms)
+
+    modules_ms = {name: round(statistics.median(samples), 2) for name, samples in per_module.items()}
+    result = {
+        'runs': args.runs,
+        'total_ms': round(statistics.median(totals), 2),
+        'total_ms_min': round(min(totals), 2),
+        'modules_ms': dict(sorted(modules_ms.items(), key=lambda item: -item[1])),
+    }
+
+    print(f'import main (create_app): median {result["total_ms"]:.1f} ms, min {result["total_ms_min"]:.1f} ms')
+    for name, ms in list(result['modules_ms'].items())[:args.top]:
+        print(f'  {name:<28} {ms:>8.1f} ms')
+
+    with open(args.budget) as f:
+        budget = json.load(f)
+    violations = []
+    if result['total_ms'] > budget.get('total_ms', float('inf')):
+        violations.append(f'total {result["total_ms"]:.1f} ms > {budget["total_ms"]} ms')
+    for name, limit in budget.get('modules_ms', {}).items():
+        if modules_ms.get(name, 0) > limit:
+            violations.append(f'{name} {modules_ms[name]:.1f} ms > {limit} ms')
+    for name in budget.get('forbidden', []):
+        if name in imported:
+            violations.append(f'{name} is imported at start-up')
+    result['violations'] = violations
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    for violation in violations:
+        print(f'BUDGET EXCEEDED: {violation}')
+    if violations:
+        sys.exit(1)
+    print('within budget')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+"""Reproducible benchmark suite for the hot helpers and routes.
+
+Every run uses a fresh temporary SQLite database seeded with synthetic
+sessions and a generated chemical database, so results only depend on the
+code and the parameters. Run from the repository root:
+
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --save-baseline baseline.json
+    python benchmarks/bench_suite.py --baseline baseline.json --threshold 0.15
+
+The exit status is 1 when any benchmark raises or a route answers with a
+non-2xx status, and, with ``--baseline``, when any benchmark's median is more
+than ``--threshold`` slower than the baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_chemical_search import generate_chemicals, percentile  # noqa: E402
+
+CORPUS = os.path.join(ROOT, 'benchmarks', 'voice_corpus.json')
+
+# Real reagents so the voice corpus and calculator inputs resolve
+BASE_CHEMICALS = {
+    'sodium_chloride': {'name': 'Sodium Chloride', 'formula': 'NaCl', 'molecular_weight': 58.44,
+                        'common_names': ['salt', 'table salt'], 'hazards': ['Eye irritant']},
+    'potassium_chloride': {'name': 'Potassium Chloride', 'formula': 'KCl', 'molecular_weight': 74.55,
+                           'common_names': [], 'hazards': []},
+    'hydrochloric_acid': {'name': 'Hydrochloric Acid', 'formula': 'HCl', 'molecular_weight': 36.46,
+                          'common_names': ['muriatic acid'], 'hazards': ['Corrosive', 'Strong acid']},
+    'calcium_chloride': {'name': 'Calcium Chloride', 'formula': 'CaCl2', 'molecular_weight': 110.98,
+                         'common_names': [], 'hazards': ['Eye irritant']},
+    'sodium_hydroxide': {'name': 'Sodium Hydroxide', 'formula': 'NaOH', 'molecular_weight': 40.0,
+                         'common_names': ['caustic soda', 'lye'], 'hazards': ['Corrosive', 'Strong base']},
+    'glucose': {'name': 'Glucose', 'formula': 'C6H12O6', 'molecular_weight': 180.16,
+                'common_names': ['dextrose'], 'hazards': []},
+    'sulfuric_acid': {'name': 'Sulfuric Acid', 'formula': 'H2SO4', 'molecular_weight': 98.08,
+                      'common_names': [], 'hazards': ['Corrosive', 'Strong acid', 'Oxidizer']},
+    'tris': {'name': 'Tris', 'formula': 'C4H11NO3', 'molecular_weight': 121.14,
+             'common_names': ['tris base', 'trometamol'], 'hazards': []},
+}
+
+ACTION_TYPES = ['login', 'calculation', 'voice_command', 'report_generated', 'msds_search', 'navigation']
+
+
+def build_chemical_db(path, count, seed):
+    chemicals = dict(BASE_CHEMICALS)
+    chemicals.update(generate_chemicals(max(0, count - len(chemicals)), seed))
+    with open(path, 'w') as f:
+        json.dump(chemicals, f)
+    return chemicals
+
+
+def seed_database(sessions, activities_per_session, seed):
+    """Insert synthetic sessions and rebuild the materialized counters."""
+    from sqlalchemy import insert
+    from app import db
+    from models import ActivityLog, Calculation
+    import session_stats
+
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    session_ids = [f'bench-session-{i:04d}' for i in range(sessions)]
+    for session_id in session_ids:
+        activities = []
+        calculations = []
+        for i in range(activities_per_session):
+            timestamp = start + timedelta(minutes=i * 7 + rng.randint(0, 6))
+            action_type = rng.choice(ACTION_TYPES)
+            activities.append({
+                'session_id': session_id,
+                'timestamp': timestamp,
+                'action_type': action_type,
+                'description': f'Synthetic {action_type} #{i}',
+                'details': None,
+            })
+            if action_type == 'calculation':
+                calculations.append({
+                    'session_id': session_id,
+                    'timestamp': timestamp,
+                    'chemical_name': 'Sodium Chloride',
+                    'molarity': 0.1,
+                    'volume': 0.25,
+                    'mass_required': 1.461,
+                    'molecular_weight': 58.44,
+                })
+        db.session.execute(insert(ActivityLog), activities)
+        if calculations:
+            db.session.execute(insert(Calculation), calculations)
+    db.session.commit()
+    session_stats.rebuild()
+    return session_ids
+
+
+def measure(fn, iterations, warmup):
+    """Call ``fn`` ``warmup`` + ``iterations`` times and summarize the timed calls in microseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return {
+        'iterations': iterations,
+        'min_us': round(min(samples), 2),
+        'median_us': round(statistics.median(samples), 2),
+        'p95_us': round(percentile(samples, 95), 2),
+        'mean_us': round(statistics.fmean(samples), 2),
+        'ops_per_sec': round(1e6 / statistics.fmean(samples), 1),
+    }
+
+
+class SkipBenchmark(Exception):
+    """Raised by a benchmark that cannot run in this environment."""
+
+
+class BenchmarkFailed(Exception):
+    """Raised when a benchmarked route answers with a non-2xx status."""
+
+
+def make_benchmarks(app, chemicals, session_ids, utterances, seed):
+    """Return ``{name: (setup, scale)}``; ``setup()`` returns the callable to time.
+
+    ``scale`` multiplies the iteration count for very cheap or very expensive
+    benchmarks so every one finishes in a comparable amount of time.
+    """
+    from flask import session
+    from routes import parse_lab_command
+    from utils import calculate_reagent_mass, generate_pdf_report, get_chemical_data, log_activity
+
+    rng = random.Random(seed)
+    lookup_names = [chemical['name'] for chemical in chemicals.values()]
+    rng.shuffle(lookup_names)
+    lookups = lookup_names[:1000] + [name.upper() for name in lookup_names[:200]] + ['no such chemical'] * 50
+    calc_inputs = [{'chemical_name': name, 'molarity': rng.choice([0.01, 0.1, 0.5, 1.0]),
+                    'volume': rng.choice([10.0, 100.0, 250.0, 1000.0]), 'volume_unit': 'ml'}
+                   for name in (chemical['name'] for chemical in BASE_CHEMICALS.values())]
+    report_content = '\n'.join(f'Step {i}: add {rng.choice(lookup_names)} and stir for {i} minutes.'
+                               for i in range(60))
+
+    def cycle(items):
+        state = {'i': 0}
+
+        def next_item():
+            item = items[state['i'] % len(items)]
+            state['i'] += 1
+            return item
+        return next_item
+
+    def client_for(session_id):
+        client = app.test_client()
+        with client.session_transaction() as s:
+            s['session_id'] = session_id
+            s['user_name'] = 'Benchmark'
+        return client
+
+    def checked(client_call):
+        # Every timed call is checked, so a route that starts failing mid-run fails the suite
+        def run():
+            response = client_call()
+            if not 200 <= response.status_code < 300:
+                raise BenchmarkFailed(f'HTTP {response.status_code}')
+        return run
+
+    def bench_get_chemical_data():
+        next_name = cycle(lookups)
+        return lambda: get_chemical_data(next_name())
+
+    def bench_parse_lab_command():
+        next_utterance = cycle(utterances)
+        return lambda: parse_lab_command(next_utterance())
+
+    def bench_calculate_reagent_mass():
+        next_input = cycle(calc_inputs)
+
+        def run():
+            item = next_input()
+            calculate_reagent_mass(item['molarity'], item['volume'] / 1000.0, 58.44)
+        return run
+
+    def bench_generate_pdf_report():
+        return lambda: generate_pdf_report('Benchmark report', report_content, 'experiment')
+
+    def bench_log_activity():
+        ctx = app.test_request_context('/')
+        ctx.push()
+        session['session_id'] = session_ids[0]
+        # Left pushed for the rest of the run; each call is one buffered/synchronous insert
+        return lambda: log_activity('benchmark', 'Benchmark activity entry')
+
+    def bench_route_calculate():
+        client = client_for(session_ids[1 % len(session_ids)])
+        next_input = cycle(calc_inputs)
+        return checked(lambda: client.post('/calculate', json=next_input()))
+
+    def bench_route_voice_command():
+        client = client_for(session_ids[2 % len(session_ids)])
+        next_utterance = cycle(utterances)
+        return checked(lambda: client.post('/voice_command', json={'command': next_utterance()}))
+
+    def bench_route_api_stats():
+        client = client_for(session_ids[3 % len(session_ids)])
+        return checked(lambda: client.get('/api/stats'))
+
+    def bench_route_activity_logs():
+        if 'activity_logs.html' not in app.jinja_env.list_templates():
+            raise SkipBenchmark('activity_logs.html template not found')
+        client = client_for(session_ids[4 % len(session_ids)])
+        return checked(lambda: client.get('/activity_logs'))
+
+    def bench_route_api_activity_logs():
+        client = client_for(session_ids[4 % len(session_ids)])
+        return checked(lambda: client.get('/api/activity_logs?limit=20'))
+
+    return {
+        'get_chemical_data': (bench_get_chemical_data, 10),
+        'parse_lab_command': (bench_parse_lab_command, 10),
+        'calculate_reagent_mass': (bench_calculate_reagent_mass, 10),
+        'generate_pdf_report': (bench_generate_pdf_report, 0.1),
+        'log_activity': (bench_log_activity, 1),
+        'route_calculate': (bench_route_calculate, 1),
+        'route_voice_command': (bench_route_voice_command, 1),
+        'route_api_stats': (bench_route_api_stats, 1),
+        'route_activity_logs': (bench_route_activity_logs, 1),
+        'route_api_activity_logs': (bench_route_api_activity_logs, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison table and return the names of regressed benchmarks."""
+    regressions = []
+    print(f'\n{"benchmark":<26} {"baseline us":>12} {"current us":>12} {"change":>8}')
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if 'median_us' not in result or not before or 'median_us' not in before:
+            print(f'{name:<26} {"-":>12} {result.get("median_us", "-"):>12} {"n/a":>8}')
+            continue
+        ratio = result['median_us'] / before['median_us']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:<26} {before["median_us"]:>12.2f} {result["median_us"]:>12.2f} {ratio - 1:>+8.1%}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chemicals', type=int, default=2000, help='size of the generated chemical database')
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--activities-per-session', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', action='append', help='run only this benchmark (repeatable)')
+    parser.add_argument('--compiled', action='store_true',
+                        help='serve chemical lookups from the compiled binary database')
+    parser.add_argument('--buffered', action='store_true',
+                        help='use the background activity log buffer instead of synchronous writes')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against results saved by an earlier run')
+    parser.add_argument('--save-baseline', help='write results as JSON to this file for later comparison')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='allowed median slowdown against the baseline (default 0.10 = 10%%)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='labmate-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['ACTIVITY_LOG_SYNC'] = '0' if args.buffered else '1'
+    os.environ['REPORT_OUTPUT_DIR'] = os.path.join(workdir, 'reports')
+    os.environ['REPORT_CACHE_DIR'] = os.path.join(workdir, 'report_cache')
+    os.environ.pop('PROFILE_SLOW_REQUEST_MS', None)
+
+    try:
+        chemicals_path = os.path.join(workdir, 'chemicals.json')
+        chemicals = build_chemical_db(chemicals_path, args.chemicals, args.seed)
+
+        from app import create_app
+        from chemical_registry import registry
+        app = create_app({'LOG_LEVEL': 'WARNING', 'SCHEMA_AUTO_UPGRADE': True})
+        registry.path = chemicals_path
+        registry.compiled_path = os.path.join(workdir, 'chemicals.bin')
+        if args.compiled:
+            from chemical_binary import compile_chemicals
+            compile_chemicals(chemicals_path, registry.compiled_path)
+        registry.reload()
+
+        with open(CORPUS) as f:
+            utterances = [entry['utterance'].lower() for entry in json.load(f)]
+
+        results = {}
+        failures = []
+        with app.app_context():
+            session_ids = seed_database(args.sessions, args.activities_per_session, args.seed)
+            benchmarks = make_benchmarks(app, chemicals, session_ids, utterances, args.seed)
+            for name, (setup, scale) in benchmarks.items():
+                if args.only and name not in args.only:
+                    continue
+                iterations = max(1, int(args.iterations * scale))
+                try:
+                    results[name] = measure(setup(), iterations, args.warmup)
+                except SkipBenchmark as e:
+                    results[name] = {'skipped': str(e)}
+                except Exception as e:
+                    results[name] = {'failed': f'{type(e).__name__}: {e}'}
+                    failures.append(name)
+                result = results[name]
+                if 'skipped' in result:
+                    print(f'{name:<26} skipped ({result["skipped"]})')
+                elif 'failed' in result:
+                    print(f'{name:<26} FAILED ({result["failed"]})')
+                else:
+                    print(f'{name:<26} median {result["median_us"]:>10.2f} us   p95 {result["p95_us"]:>10.2f} us'
+                          f'   {result["ops_per_sec"]:>10,.0f} ops/s')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {key: value for key, value in vars(args).items()
+                       if key not in ('output', 'baseline', 'save_baseline')},
+        },
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    if failures:
+        print(f'\n{len(failures)} benchmark(s) failed: {", ".join(failures)}')
+        sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('params') != report['meta']['params']:
+            print('warning: baseline was recorded with different parameters')
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
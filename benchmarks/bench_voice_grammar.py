@@ -0,0 +1,65 @@
+"""Throughput and accuracy benchmark for the voice command grammar.
+
+Run from the repository root:
+
+    python benchmarks/bench_voice_grammar.py --iterations 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from voice_grammar import parse_command  # noqa: E402
+
+CORPUS = os.path.join(ROOT, 'benchmarks', 'voice_corpus.json')
+
+
+def matches(result, expected):
+    for field, value in expected.items():
+        actual = result.get(field)
+        if isinstance(value, float):
+            if actual is None or abs(actual - value) > 1e-9:
+                return False
+        elif actual != value:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=CORPUS)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--verbose', action='store_true', help='print every mismatch')
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = json.load(f)
+    utterances = [entry['utterance'].lower() for entry in corpus]
+
+    correct = 0
+    for entry, utterance in zip(corpus, utterances):
+        result = parse_command(utterance)
+        if matches(result, entry['expected']):
+            correct += 1
+        elif args.verbose:
+            print(f'MISMATCH {entry["utterance"]!r}: expected {entry["expected"]}, got {result}')
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for utterance in utterances:
+            parse_command(utterance)
+    elapsed = time.perf_counter() - start
+    parses = args.iterations * len(utterances)
+
+    print(f'utterances:   {len(corpus)}')
+    print(f'accuracy:     {correct / len(corpus):.3f} ({correct}/{len(corpus)})')
+    print(f'throughput:   {parses / elapsed:,.0f} parses/s')
+    print(f'mean:         {elapsed / parses * 1e6:.1f} us/parse')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""Multi-report bundles: many LabReports as one streamed ZIP or one combined PDF.
+
+Creating a bundle writes a small JSON manifest to
+``REPORT_OUTPUT_DIR/bundles/<bundle_id>.json``. It also submits every render
+that is not already in the report cache to the report process pool, so the
+PDFs render in parallel. Rendered files are the report cache's own
+content-addressed files. Progress is therefore just "how many of the
+manifest's files exist", which any worker process can answer from the
+manifest alone.
+
+A ZIP download starts straight away. Members are written in manifest order;
+a render that has not finished is waited for, and a file that is missing
+(evicted, or its worker died) is rendered inline. ``zipfile`` writes to an
+unseekable sink using data descriptors, so the archive is produced chunk
+by chunk and never held in memory.
+
+A combined PDF is rendered as one document by a pool worker (``pdf`` format),
+then streamed from disk like any cached report. If that render fails, a
+``<bundle_id>.error`` file next to the manifest records it, so every worker
+reports the bundle as failed instead of pending.
+
+Renders share ``report_jobs``' bounded queue. Bundles use at most half of
+its slots, so single-report jobs are never starved; renders waiting for a
+slot sit in this process's backlog, which holds at most one full bundle
+(``REPORT_BUNDLE_MAX_REPORTS``). A bundle that does not fit is refused with
+``QueueFull``.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+
+from pdf_render import TEMPLATE_VERSION, render_combined_to_file, render_to_file
+from report_cache import CHUNK_SIZE, cache_key, report_cache, stream_file
+from report_jobs import QueueFull, report_jobs
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'zip': 'application/zip',
+    'pdf': 'application/pdf',
+}
+
+BUNDLE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class _Sink:
+    """Write-only file object whose contents are drained by the ZIP generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _safe_filename(title):
+    name = re.sub(r'[^A-Za-z0-9._ -]+', '_', title or 'report').strip() or 'report'
+    return name[:80]
+
+
+class BundleStore:
+    def __init__(self, max_reports=500, wait_timeout=120.0):
+        self.max_reports = max_reports
+        self.wait_timeout = wait_timeout
+        self.directory = None
+        self._futures = {}
+        self._backlog = deque()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, report_jobs.max_pending // 2))
+        self.created = 0
+        self.failed = 0
+
+    def init_app(self, app):
+        """Read bundle settings from ``app.config``; call after ``report_jobs.init_app``."""
+        self.max_reports = app.config.get('REPORT_BUNDLE_MAX_REPORTS', self.max_reports)
+        self._slots = threading.BoundedSemaphore(max(1, report_jobs.max_pending // 2))
+        output_dir = app.config.get('REPORT_OUTPUT_DIR') or os.path.join(app.instance_path, 'reports')
+        self.directory = os.path.join(output_dir, 'bundles')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def manifest_path(self, bundle_id):
+        return os.path.join(self.directory, f'{bundle_id}.json')
+
+    def error_path(self, bundle_id):
+        return os.path.join(self.directory, f'{bundle_id}.error')
+
+    def create(self, session_id, reports, fmt):
+        """Write a manifest for ``reports`` and start rendering; returns the manifest.
+
+        Raises ``QueueFull`` when the render backlog cannot take the bundle.
+        """
+        entries = []
+        for report in reports:
+            entries.append({
+                'report_id': report.id,
+                'title': report.title,
+                'key': cache_key(report.title, report.content, report.report_type),
+                'name': f'{report.id:05d}-{_safe_filename(report.title)}.pdf',
+            })
+        manifest = {
+            'bundle_id': uuid.uuid4().hex,
+            'session_id': session_id,
+            'format': fmt,
+            'created_at': time.time(),
+            'reports': entries,
+        }
+        if fmt == 'pdf':
+            digest = hashlib.sha256(TEMPLATE_VERSION.encode('utf-8'))
+            for entry in entries:
+                digest.update(entry['key'].encode('utf-8'))
+            manifest['combined_key'] = 'bundle-' + digest.hexdigest()
+
+        sources = {report.id: (report.title, report.content, report.report_type) for report in reports}
+        if fmt == 'pdf':
+            renders = [(manifest['combined_key'], render_combined_to_file,
+                        ([sources[entry['report_id']] for entry in entries],), manifest['bundle_id'])]
+        else:
+            renders = [(entry['key'], render_to_file, sources[entry['report_id']], None) for entry in entries]
+        self._enqueue(renders)
+
+        tmp_path = f'{self.manifest_path(manifest["bundle_id"])}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path(manifest['bundle_id']))
+        self.created += 1
+        return manifest
+
+    def _enqueue(self, renders):
+        """Add ``(key, fn, args, bundle_id)`` renders that are not cached yet to the backlog."""
+        with self._lock:
+            missing = [render for render in renders
+                       if render[0] not in self._queued and render[0] not in self._futures
+                       and not os.path.exists(report_cache.path_for(render[0]))]
+            if len(self._backlog) + len(missing) > self.max_reports:
+                report_jobs.rejected += 1
+                raise QueueFull(f'{len(self._backlog)} bundle renders already waiting')
+            for render in missing:
+                self._backlog.append(render)
+                self._queued.add(render[0])
+        self._pump()
+
+    def _pump(self):
+        """Move backlog renders onto the report pool while bundle slots are free."""
+        while True:
+            with self._lock:
+                if not self._backlog or not self._slots.acquire(blocking=False):
+                    return
+                key, fn, args, bundle_id = self._backlog.popleft()
+                self._queued.discard(key)
+                path = report_cache.path_for(key)
+                if os.path.exists(path):
+                    self._slots.release()
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                try:
+                    future = report_jobs.render_async(fn, *args, path)
+                except QueueFull:
+                    # Single-report jobs hold the rest; retry when a bundle render finishes
+                    self._backlog.appendleft((key, fn, args, bundle_id))
+                    self._queued.add(key)
+                    self._slots.release()
+                    return
+                self._futures[key] = future
+            future.add_done_callback(lambda done, key=key, bundle_id=bundle_id: self._finished(key, bundle_id, done))
+
+    def _finished(self, key, bundle_id, future):
+        self._slots.release()
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+            idle = not self._futures and not self._backlog
+        if future.exception() is not None:
+            logger.error(f"Bundle render {key} failed: {future.exception()}")
+            if bundle_id is not None:
+                # Zip members are re-rendered inline on download; a combined PDF is not
+                self.failed += 1
+                with open(self.error_path(bundle_id), 'w') as f:
+                    f.write(str(future.exception()))
+        self._pump()
+        if idle:
+            report_cache.trim()
+
+    def load(self, bundle_id, session_id):
+        """Return the manifest for this session's bundle, or ``None``."""
+        if not BUNDLE_ID_RE.match(bundle_id):
+            return None
+        try:
+            with open(self.manifest_path(bundle_id)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('session_id') != session_id:
+            return None
+        return manifest
+
+    def progress(self, manifest):
+        """Return ``(rendered, total)`` for a bundle."""
+        if manifest['format'] == 'pdf':
+            return int(os.path.exists(report_cache.path_for(manifest['combined_key']))), 1
+        rendered = sum(1 for entry in manifest['reports'] if os.path.exists(report_cache.path_for(entry['key'])))
+        return rendered, len(manifest['reports'])
+
+    def _wait_for(self, key, render_inline):
+        """Return the cached path for ``key``, waiting for or redoing its render."""
+        path = report_cache.path_for(key)
+        future = self._futures.get(key)
+        if future is not None:
+            try:
+                future.result(timeout=self.wait_timeout)
+            except Exception as e:
+                logger.warning(f"Bundle render {key} did not finish ({e}); rendering inline")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            render_inline(path)
+        return path
+
+    def error(self, manifest):
+        """The recorded render error of a failed bundle, or ``None``."""
+        try:
+            with open(self.error_path(manifest['bundle_id'])) as f:
+                return f.read() or 'Rendering failed'
+        except OSError:
+            return None
+
+    def combined_path(self, manifest):
+        """Path of the combined PDF if it has been rendered, else ``None``."""
+        path = report_cache.path_for(manifest['combined_key'])
+        return path if os.path.exists(path) else None
+
+    def generate_zip(self, manifest, load_report):
+        """Yield the bundle as a ZIP archive, one member per report.
+
+        ``load_report(report_id)`` returns the LabReport for an inline render.
+        """
+        sink = _Sink()
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for entry in manifest['reports']:
+                def render_inline(path, report_id=entry['report_id']):
+                    report = load_report(report_id)
+                    render_to_file(report.title, report.content, report.report_type, path)
+
+                path = self._wait_for(entry['key'], render_inline)
+                try:
+                    chunks = stream_file(path, CHUNK_SIZE)
+                except FileNotFoundError:
+                    # Evicted between the check and the open
+                    render_inline(path)
+                    chunks = stream_file(path, CHUNK_SIZE)
+                with archive.open(entry['name'], 'w') as member:
+                    for chunk in chunks:
+                        member.write(chunk)
+                        yield sink.drain()
+                yield sink.drain()
+        yield sink.drain()
+
+    def stats(self):
+        return {
+            'created': self.created,
+            'rendering': len(self._futures),
+            'backlog': len(self._backlog),
+            'failed': self.failed,
+            'max_reports': self.max_reports,
+        }
+
+
+bundle_store = BundleStore()
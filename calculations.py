@@ -0,0 +1,134 @@
+"""Memoized reagent calculations and optional deduplicated storage.
+
+``calculation_cache`` is an LRU of results keyed by (normalized chemical,
+molarity, volume, chemical database version). ``/calculate`` and voice
+calculations share it. The cache is cleared whenever the chemical registry
+reloads, and the version in the key keeps a result computed against old
+data from being served while a reload is in progress.
+
+With ``CALCULATION_DEDUP`` enabled, ``store_calculation`` turns a same-day
+repeat into a ``hit_count`` increment on the existing row instead of a new
+row. Session counters still count every calculation.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app import db
+from chemical_registry import normalize_key, registry
+from models import Calculation
+import session_stats
+from unit_of_work import unit_of_work
+from utils import calculate_reagent_mass, find_chemical, get_chemical_data
+
+# No chemical name: entries are shared by every spelling of the same key, so
+# callers report and store the name they were given
+CalculationResult = namedtuple('CalculationResult', 'chemical_data mass_required fuzzy')
+
+
+class CalculationCache:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.dedup = False
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Read cache settings from ``app.config`` and hook registry reloads."""
+        self.max_entries = app.config.get('CALCULATION_CACHE_SIZE', self.max_entries)
+        self.dedup = app.config.get('CALCULATION_DEDUP', self.dedup)
+        registry.on_reload(self.invalidate)
+
+    def invalidate(self, version=None):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def calculate(self, chemical_name, molarity, volume_liters, allow_fuzzy=False):
+        """Return a ``CalculationResult``, or ``None`` if the chemical is unknown.
+
+        ``allow_fuzzy`` falls back to the closest match for misheard names;
+        cached fuzzy results are never served to exact-only callers.
+        """
+        key = (normalize_key(chemical_name), molarity, volume_liters, registry.current_version())
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None and (allow_fuzzy or not result.fuzzy):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+        self.misses += 1
+
+        if allow_fuzzy:
+            chemical_data, fuzzy = find_chemical(chemical_name)
+        else:
+            chemical_data, fuzzy = get_chemical_data(chemical_name), False
+        if not chemical_data:
+            return None
+
+        # Every entry point converts volumes to litres (see utils.volume_to_liters)
+        mass_required = calculate_reagent_mass(molarity, volume_liters, chemical_data['molecular_weight'])
+        result = CalculationResult(chemical_data, mass_required, fuzzy)
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'dedup': self.dedup,
+        }
+
+
+calculation_cache = CalculationCache()
+
+
+def store_calculation(session_id, chemical_name, result, molarity, volume_liters):
+    """Stage a Calculation row (or a hit on today's identical row) and count it; caller commits.
+
+    ``chemical_name`` is the caller's own spelling, or the matched name for a
+    fuzzy result.
+    """
+    now = datetime.utcnow()
+    if calculation_cache.dedup:
+        day_start = datetime.combine(now.date(), datetime.min.time())
+        # Only same-day rows, so per-day counters still match the raw table
+        existing_id = db.session.query(Calculation.id).filter(
+            Calculation.session_id == session_id,
+            Calculation.timestamp >= day_start,
+            Calculation.timestamp < day_start + timedelta(days=1),
+            Calculation.chemical_name == chemical_name,
+            Calculation.molarity == molarity,
+            Calculation.volume == volume_liters
+        ).order_by(Calculation.id.desc()).limit(1).scalar()
+        if existing_id is not None:
+            unit_of_work.stage(db.session.execute, (
+                update(Calculation)
+                .where(Calculation.id == existing_id)
+                .values(hit_count=Calculation.hit_count + 1, last_used_at=now)
+            ))
+            session_stats.record_calculations(session_id, when=now)
+            return
+
+    db.session.add(Calculation(
+        chemical_name=chemical_name,
+        molarity=molarity,
+        volume=volume_liters,
+        mass_required=result.mass_required,
+        molecular_weight=result.chemical_data['molecular_weight'],
+        session_id=session_id,
+        timestamp=now
+    ))
+    session_stats.record_calculations(session_id, when=now)
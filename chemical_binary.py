@@ -0,0 +1,330 @@
+"""Compiled, mmap-able chemical database.
+
+``compile_chemicals`` turns ``chemicals.json`` into one binary file:
+
+    header     magic, format version, source (mtime_ns, size, sha1), section offsets
+    strings    every distinct string once, UTF-8, referenced as (offset, length)
+    records    one fixed-width record per chemical
+    lists      (offset, length) string refs for common_names and hazards
+    index      open-addressing hash table: normalized name/formula/common
+               name -> record number, keyed by CRC-32
+
+``CompiledChemicalDB`` maps the file read-only, so every worker process
+shares the same page-cache pages. Opening it costs a header read no matter
+how large the database is. A record is only decoded into a dict when it is
+looked up.
+
+The header stores the signature and SHA-1 of the JSON it was built from.
+``is_fresh`` compares them with the current JSON, so a stale compiled file is
+never served.
+
+Build step:
+
+    python chemical_binary.py data/chemicals.json data/chemicals.bin
+"""
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+
+MAGIC = b'LMCHEM\x00\x01'
+FORMAT_VERSION = 1
+
+# magic, format, records, buckets, source mtime_ns, source size, source sha1,
+# strings/records/lists/index offsets
+HEADER = struct.Struct('<8sIIIQQ20sQQQQ')
+# key, name, formula (offset, length), molecular_weight,
+# common_names, hazards (list offset, count), extra JSON (offset, length)
+RECORD = struct.Struct('<IIIIIIdIIIIII')
+STRING_REF = struct.Struct('<II')
+# key (offset, length), record number, crc32
+BUCKET = struct.Struct('<IIII')
+
+NONE = 0xFFFFFFFF
+FIXED_FIELDS = ('name', 'formula', 'molecular_weight', 'common_names', 'hazards')
+
+
+def normalize_key(value):
+    # Same rule as chemical_registry.normalize_key; duplicated so the build
+    # step has no dependencies
+    if not value:
+        return ''
+    return ' '.join(str(value).lower().split())
+
+
+def source_signature(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class _StringTable:
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = {}
+
+    def add(self, value):
+        if value is None:
+            return NONE, NONE
+        encoded = value.encode('utf-8')
+        offset = self.offsets.get(value)
+        if offset is None:
+            offset = self.offsets[value] = len(self.data)
+            self.data += encoded
+        return offset, len(encoded)
+
+
+def compile_chemicals(source, target):
+    """Compile ``source`` (chemicals.json) into ``target``; returns the record count.
+
+    The file is written to a temporary name and renamed into place, so
+    readers never see a partial file and keep their old mapping until they
+    reopen.
+    """
+    with open(source, 'rb') as f:
+        raw = f.read()
+    chemicals = json.loads(raw)
+    mtime_ns, size = source_signature(source)
+
+    strings = _StringTable()
+    lists = bytearray()
+    records = bytearray()
+    keys = OrderedDict()
+
+    def string_list(values):
+        if not values:
+            return 0, 0
+        offset = len(lists) // STRING_REF.size
+        for value in values:
+            lists.extend(STRING_REF.pack(*strings.add(str(value))))
+        return offset, len(values)
+
+    for number, (key, chemical) in enumerate(chemicals.items()):
+        name = chemical.get('name')
+        formula = chemical.get('formula')
+        weight = chemical.get('molecular_weight')
+        common_names = chemical.get('common_names')
+        hazards = chemical.get('hazards')
+
+        # Anything that does not fit the fixed layout round-trips through JSON
+        extra = {field: value for field, value in chemical.items() if field not in FIXED_FIELDS}
+        for field, value, fits in (
+            ('name', name, isinstance(name, str)),
+            ('formula', formula, isinstance(formula, str)),
+            ('molecular_weight', weight, isinstance(weight, float)),
+            ('common_names', common_names, isinstance(common_names, list) and all(isinstance(v, str) for v in common_names)),
+            ('hazards', hazards, isinstance(hazards, list) and all(isinstance(v, str) for v in hazards)),
+        ):
+            if field in chemical and not fits:
+                extra[field] = value
+
+        records.extend(RECORD.pack(
+            *strings.add(key),
+            *strings.add(name if isinstance(name, str) else None),
+            *strings.add(formula if isinstance(formula, str) else None),
+            weight if isinstance(weight, float) else math.nan,
+            *(string_list(common_names) if 'common_names' not in extra and common_names is not None else (NONE, 0)),
+            *(string_list(hazards) if 'hazards' not in extra and hazards is not None else (NONE, 0)),
+            *strings.add(json.dumps(extra) if extra else None),
+        ))
+
+        lookup_keys = [name, formula]
+        lookup_keys.extend(common_names if isinstance(common_names, list) else [])
+        for lookup_key in lookup_keys:
+            lookup_key = normalize_key(lookup_key)
+            if lookup_key:
+                # First entry wins, like ChemicalRegistry's dict index
+                keys.setdefault(lookup_key, number)
+
+    buckets = 1
+    while buckets < max(8, len(keys) * 2):
+        buckets *= 2
+    table = [None] * buckets
+    for lookup_key, number in keys.items():
+        encoded = lookup_key.encode('utf-8')
+        crc = zlib.crc32(encoded)
+        slot = crc & (buckets - 1)
+        while table[slot] is not None:
+            slot = (slot + 1) & (buckets - 1)
+        table[slot] = (*strings.add(lookup_key), number, crc)
+    index = bytearray()
+    for entry in table:
+        index.extend(BUCKET.pack(*(entry or (NONE, 0, NONE, 0))))
+
+    strings_offset = HEADER.size
+    records_offset = strings_offset + len(strings.data)
+    lists_offset = records_offset + len(records)
+    index_offset = lists_offset + len(lists)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(chemicals), buckets, mtime_ns, size,
+                         hashlib.sha1(raw).digest(), strings_offset, records_offset, lists_offset, index_offset)
+
+    tmp = f'{target}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        for part in (header, strings.data, records, lists, index):
+            f.write(part)
+    os.replace(tmp, target)
+    return len(chemicals)
+
+
+class CompiledChemicalDB:
+    """Read-only view of a compiled chemical database."""
+
+    def __init__(self, path, cache_size=4096):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.count, self.buckets, mtime_ns, size, self.source_sha1,
+         self._strings, self._records, self._lists, self._index) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f'{path} is not a compiled chemical database (format {FORMAT_VERSION})')
+        self.source_signature = (mtime_ns, size)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._readers = 0
+        self._retired = False
+        self.closed = False
+
+    def acquire(self):
+        """Register a reader; returns False once the database has been retired."""
+        with self._lock:
+            if self._retired:
+                return False
+            self._readers += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._readers -= 1
+            close = self._retired and not self._readers
+        if close:
+            self.close()
+
+    def retire(self):
+        """Refuse new readers and close the map once the current ones release it."""
+        with self._lock:
+            self._retired = True
+            close = not self._readers
+        if close:
+            self.close()
+
+    def is_fresh(self, source):
+        """True if this file was compiled from the current contents of ``source``."""
+        try:
+            if source_signature(source) == self.source_signature:
+                return True
+            # Deploys often touch mtimes without changing contents
+            return _sha1(source) == self.source_sha1
+        except OSError:
+            return False
+
+    def _string(self, offset, length):
+        if length == NONE:
+            return None
+        start = self._strings + offset
+        return self._map[start:start + length].decode('utf-8')
+
+    def _string_list(self, offset, count):
+        if offset == NONE:
+            return None
+        start = self._lists + offset * STRING_REF.size
+        return [self._string(*STRING_REF.unpack_from(self._map, start + i * STRING_REF.size))
+                for i in range(count)]
+
+    def _decode(self, number):
+        (key_off, key_len, name_off, name_len, formula_off, formula_len, weight,
+         common_off, common_count, hazards_off, hazards_count, extra_off, extra_len) = \
+            RECORD.unpack_from(self._map, self._records + number * RECORD.size)
+        chemical = {}
+        name = self._string(name_off, name_len)
+        if name is not None:
+            chemical['name'] = name
+        formula = self._string(formula_off, formula_len)
+        if formula is not None:
+            chemical['formula'] = formula
+        if not math.isnan(weight):
+            chemical['molecular_weight'] = weight
+        common_names = self._string_list(common_off, common_count)
+        if common_names is not None:
+            chemical['common_names'] = common_names
+        hazards = self._string_list(hazards_off, hazards_count)
+        if hazards is not None:
+            chemical['hazards'] = hazards
+        extra = self._string(extra_off, extra_len)
+        if extra:
+            chemical.update(json.loads(extra))
+        return self._string(key_off, key_len), chemical
+
+    def record(self, number):
+        """Return the decoded chemical dict for record ``number`` (cached)."""
+        with self._lock:
+            chemical = self._cache.get(number)
+            if chemical is not None:
+                self._cache.move_to_end(number)
+                return chemical
+        chemical = self._decode(number)[1]
+        with self._lock:
+            self._cache[number] = chemical
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return chemical
+
+    def find(self, key):
+        """Return the record number for a normalized key, or ``None``."""
+        encoded = key.encode('utf-8')
+        crc = zlib.crc32(encoded)
+        mask = self.buckets - 1
+        slot = crc & mask
+        for _ in range(self.buckets):
+            key_off, key_len, number, bucket_crc = BUCKET.unpack_from(self._map, self._index + slot * BUCKET.size)
+            if key_off == NONE:
+                return None
+            if bucket_crc == crc and key_len == len(encoded):
+                start = self._strings + key_off
+                if self._map[start:start + key_len] == encoded:
+                    return number
+            slot = (slot + 1) & mask
+        return None
+
+    def get(self, key):
+        """Look up a chemical by normalized name, formula or common name."""
+        number = self.find(key)
+        return None if number is None else self.record(number)
+
+    def records(self):
+        """Yield every chemical dict in file order, without caching them."""
+        for number in range(self.count):
+            yield self._decode(number)[1]
+
+    def all(self):
+        """Decode every record into the same dict shape as chemicals.json."""
+        return dict(self._decode(number) for number in range(self.count))
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._cache.clear()
+        self._map.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(f'usage: {sys.argv[0]} SOURCE.json TARGET.bin')
+    count = compile_chemicals(sys.argv[1], sys.argv[2])
+    print(f'Compiled {count} chemical(s) into {sys.argv[2]}')
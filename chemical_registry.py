@@ -0,0 +1,215 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from chemical_binary import CompiledChemicalDB
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_key(value):
+    """Normalize a chemical name, formula or common name for index lookups."""
+    if not value:
+        return ''
+    return ' '.join(str(value).lower().split())
+
+
+class ChemicalRegistry:
+    """Process-wide chemical database loaded once and indexed by normalized keys.
+
+    The backing JSON file is re-read only when its mtime or size changes. The
+    file is stat'ed at most once every ``check_interval`` seconds.
+
+    When ``compiled_path`` (``chemicals.bin`` next to the JSON by default)
+    was built from the current JSON, lookups are served from its memory map
+    instead and the JSON is never parsed. A reload retires the old map; it
+    is closed once the last lookup or ``snapshot`` using it is done.
+
+    Derived indexes (search, hazards) are built from ``snapshot()``, which
+    streams the records of one load together with its version.
+    """
+
+    def __init__(self, path, check_interval=1.0, compiled_path=None):
+        self.path = path
+        self.compiled_path = compiled_path or os.path.splitext(path)[0] + '.bin'
+        self._compiled = None
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._chemicals = {}
+        self._index = {}
+        self._signature = None
+        self._last_check = 0.0
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._reload_callbacks = []
+
+    def on_reload(self, callback):
+        """Call ``callback(version)`` every time the database is (re)loaded."""
+        self._reload_callbacks.append(callback)
+
+    def _file_signature(self):
+        signature = []
+        for path in (self.path, self.compiled_path):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _open_compiled(self, signature):
+        if signature[1] is None:
+            return None
+        try:
+            compiled = CompiledChemicalDB(self.compiled_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring compiled chemical database: {e}")
+            return None
+        if not compiled.is_fresh(self.path):
+            logger.warning(f"{self.compiled_path} is stale; loading {self.path} instead")
+            compiled.close()
+            return None
+        return compiled
+
+    def _load(self, signature):
+        compiled = self._open_compiled(signature)
+        chemicals = None
+        index = None
+        if compiled is None:
+            chemicals = {}
+            if signature[0] is not None:
+                try:
+                    with open(self.path, 'r') as f:
+                        chemicals = json.load(f)
+                except FileNotFoundError:
+                    chemicals = {}
+
+            index = {}
+            for chemical in chemicals.values():
+                keys = [chemical.get('name'), chemical.get('formula')]
+                keys.extend(chemical.get('common_names', []))
+                for key in keys:
+                    key = normalize_key(key)
+                    if key:
+                        # First entry wins, matching the old linear scan order
+                        index.setdefault(key, chemical)
+
+        previous = self._compiled
+        self._compiled = compiled
+        self._chemicals = chemicals
+        if previous is not None:
+            previous.retire()
+        self._index = index
+        self._signature = signature
+        self.version += 1
+        self.reloads += 1
+        for callback in self._reload_callbacks:
+            callback(self.version)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self.version and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if self.version and now - self._last_check < self.check_interval:
+                return
+            signature = self._file_signature()
+            if signature != self._signature or not self.version:
+                self._load(signature)
+            self._last_check = now
+
+    def current_version(self):
+        """Return the version of the loaded data, reloading first if the file changed."""
+        self._ensure_fresh()
+        return self.version
+
+    def all(self):
+        """Return the raw chemical database dictionary.
+
+        With the compiled database this decodes every record into a new dict
+        on each call; indexes should use ``snapshot()`` instead.
+        """
+        self._ensure_fresh()
+        compiled = self._acquire_compiled()
+        if compiled is None:
+            return self._chemicals or {}
+        try:
+            return compiled.all()
+        finally:
+            compiled.release()
+
+    def snapshot(self):
+        """Return ``(version, chemicals)`` from the same load.
+
+        ``chemicals`` iterates the chemical dicts in file order. With the
+        compiled database they are decoded one at a time and the map stays
+        open until the iteration finishes.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            version = self.version
+            compiled = self._compiled
+            chemicals = self._chemicals
+            # Reloads retire the map under this lock, so the current one accepts readers
+            if compiled is not None:
+                compiled.acquire()
+        if compiled is None:
+            return version, list(chemicals.values())
+        return version, self._stream(compiled)
+
+    @staticmethod
+    def _stream(compiled):
+        try:
+            yield from compiled.records()
+        finally:
+            compiled.release()
+
+    def _acquire_compiled(self):
+        while True:
+            compiled = self._compiled
+            if compiled is None or compiled.acquire():
+                return compiled
+
+    def get(self, chemical_name):
+        """Get chemical data by name, formula or common name."""
+        self._ensure_fresh()
+        compiled = self._acquire_compiled()
+        if compiled is not None:
+            try:
+                chemical = compiled.get(normalize_key(chemical_name))
+            finally:
+                compiled.release()
+        else:
+            # None for a moment while a reload switches to the compiled file
+            chemical = (self._index or {}).get(normalize_key(chemical_name))
+        if chemical is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return chemical
+
+    def reload(self):
+        """Force a reload of the backing file."""
+        with self._lock:
+            self._load(self._file_signature())
+            self._last_check = time.monotonic()
+
+    def stats(self):
+        """Return lookup and reload counters."""
+        compiled = self._compiled
+        return {
+            'compiled': compiled is not None,
+            'entries': compiled.count if compiled is not None else len(self._chemicals),
+            'keys': len(self._index) if self._index is not None else None,
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+        }
+
+
+registry = ChemicalRegistry(os.path.join('data', 'chemicals.json'))
@@ -0,0 +1,292 @@
+import heapq
+import threading
+from bisect import bisect_left
+from itertools import combinations, islice
+
+from chemical_registry import normalize_key, registry
+
+NGRAM_SIZE = 3
+# Fuzzy candidates come from pairwise intersections of a few n-grams spread
+# across the query; a single typo breaks at most NGRAM_SIZE adjacent n-grams,
+# so the intended key still contains at least one intact pair.
+MAX_PROBE_GRAMS = 4
+MAX_CANDIDATES = 500
+DEFAULT_MIN_SCORE = 0.3
+# Shorter queries are one edit away from too many prefixes to be useful
+MIN_FUZZY_PREFIX = 3
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    """Return the set of padded character n-grams for a normalized string."""
+    padded = f' {text} '
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class ChemicalSearchEngine:
+    """Prefix and fuzzy search over chemical names, formulas and common names.
+
+    Prefix matches are served from a sorted key array (a flattened trie that is
+    walked with ``bisect``). A prefix with a typo is found by walking it for
+    every string one edit away from the query; whole-name fuzzy matches are
+    ranked by n-gram similarity.
+    Only names and formulas are kept; ``best_match`` fetches the full record
+    from the registry by the matched key.
+    """
+
+    def __init__(self, chemicals):
+        """Index ``chemicals``, an iterable of chemical dicts (see ``registry.snapshot``)."""
+        self._entries = []
+        self._keys = []
+        self._grams = []
+        self._postings = {}
+        self._prefix_keys = []
+        self._prefix_texts = []
+
+        seen = {}
+        for chemical in chemicals:
+            entry_id = len(self._entries)
+            self._entries.append((chemical.get('name'), chemical.get('formula')))
+            names = [chemical.get('name'), chemical.get('formula')]
+            names.extend(chemical.get('common_names', []))
+            for name in names:
+                key = normalize_key(name)
+                if not key or key in seen:
+                    continue
+                seen[key] = len(self._keys)
+                self._add_key(key, entry_id)
+
+        self._prefix_keys.sort()
+        self._postings = {gram: frozenset(ids) for gram, ids in self._postings.items()}
+        # Plain strings bisect faster than the (text, key_id) pairs
+        self._prefix_texts = [text for text, _ in self._prefix_keys]
+
+    def _add_key(self, key, entry_id):
+        key_id = len(self._keys)
+        self._keys.append((key, entry_id))
+        grams = ngrams(key)
+        self._grams.append(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(key_id)
+
+        # Index every word start so "chloride" also completes "sodium chloride"
+        words = key.split(' ')
+        offset = 0
+        for word in words:
+            self._prefix_keys.append((key[offset:], key_id))
+            offset += len(word) + 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _result(self, key_id, score, match):
+        key, entry_id = self._keys[key_id]
+        name, formula = self._entries[entry_id]
+        return {
+            'name': name,
+            'formula': formula,
+            'matched': key,
+            'score': round(score, 4),
+            'match': match,
+        }
+
+    def _walk(self, query, found, limit):
+        """Add to ``found`` the ids of keys with a word starting with ``query``."""
+        prefix_keys = self._prefix_keys
+        for position in range(bisect_left(self._prefix_texts, query), len(prefix_keys)):
+            suffix, key_id = prefix_keys[position]
+            if not suffix.startswith(query) or len(found) >= limit:
+                break
+            found.setdefault(key_id, query)
+
+    def prefix(self, query, limit=10):
+        """Return key ids whose name or any word in it starts with ``query``."""
+        query = normalize_key(query)
+        if not query:
+            return []
+        found = {}
+        self._walk(query, found, limit * 4)
+        # Prefer keys where the query covers more of the whole name
+        return sorted(found, key=lambda key_id: (not self._keys[key_id][0].startswith(query),
+                                                 len(self._keys[key_id][0])))[:limit]
+
+    def _is_prefix(self, text):
+        texts = self._prefix_texts
+        position = bisect_left(texts, text)
+        return position < len(texts) and texts[position].startswith(text)
+
+    def _next_chars(self, text):
+        """Characters that follow ``text`` at the start of some key or word."""
+        texts = self._prefix_texts
+        depth = len(text)
+        chars = []
+        position = bisect_left(texts, text)
+        while position < len(texts) and texts[position].startswith(text):
+            if len(texts[position]) == depth:
+                position += 1
+                continue
+            char = texts[position][depth]
+            chars.append(char)
+            # Skip straight past every entry continuing with ``char``
+            position = bisect_left(texts, text + chr(ord(char) + 1), position)
+        return chars
+
+    def _matched_length(self, query):
+        """Length of the longest start of ``query`` that starts some key or word."""
+        low, high = 0, len(query)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._is_prefix(query[:middle]):
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def _edits(self, query):
+        """Strings one deletion, transposition, substitution or insertion away from ``query``.
+
+        Only edits where the text before them starts some key can complete
+        one, and only with a character that follows that text in the index,
+        so every other edit is skipped.
+        """
+        edits = set()
+        for split in range(self._matched_length(query) + 1):
+            left, right = query[:split], query[split:]
+            chars = self._next_chars(left)
+            if right:
+                edits.add(left + right[1:])
+                if len(right) > 1:
+                    edits.add(left + right[1] + right[0] + right[2:])
+                edits.update(left + char + right[1:] for char in chars)
+            edits.update(left + char + right for char in chars)
+        edits.discard(query)
+        return edits
+
+    def fuzzy_prefix(self, query, limit=10):
+        """Return key ids with a name or word starting one edit away from ``query``."""
+        query = normalize_key(query)
+        if len(query) < MIN_FUZZY_PREFIX:
+            return []
+        found = {}
+        for variant in self._edits(query):
+            self._walk(variant, found, len(found) + limit)
+        # Whole-name prefixes first, then the shortest names
+        return sorted(found, key=lambda key_id: (not self._keys[key_id][0].startswith(found[key_id]),
+                                                 len(self._keys[key_id][0])))[:limit]
+
+    def _probe_grams(self, query):
+        """Pick up to MAX_PROBE_GRAMS rare, non-overlapping n-grams of ``query``."""
+        padded = f' {query} '
+        positioned = []
+        for start in range(max(1, len(padded) - NGRAM_SIZE + 1)):
+            posting = self._postings.get(padded[start:start + NGRAM_SIZE])
+            if posting:
+                positioned.append((len(posting), start, posting))
+        positioned.sort(key=lambda item: item[0])
+
+        probes = []
+        for _, start, posting in positioned:
+            if all(abs(start - other) >= NGRAM_SIZE for other, _ in probes):
+                probes.append((start, posting))
+                if len(probes) == MAX_PROBE_GRAMS:
+                    break
+        return [posting for _, posting in probes]
+
+    def _candidates(self, query):
+        probes = self._probe_grams(query)
+        if len(probes) < 2:
+            # Too short to pair n-grams up; fall back to the rarest posting
+            return set(islice(probes[0], MAX_CANDIDATES)) if probes else set()
+
+        # Spaced probes mean one typo breaks at most one of them, so keys that
+        # share all but one probe are tried first; looser pairs are the fallback
+        if len(probes) > 2:
+            strict = set()
+            for group in combinations(probes, len(probes) - 1):
+                strict |= frozenset.intersection(*group)
+            if strict:
+                return strict
+
+        candidates = set()
+        for first, second in combinations(probes, 2):
+            candidates.update(islice(first & second, MAX_CANDIDATES - len(candidates)))
+            if len(candidates) >= MAX_CANDIDATES:
+                break
+        return candidates
+
+    def fuzzy(self, query, limit=10, min_score=DEFAULT_MIN_SCORE):
+        """Return ``(score, key_id)`` pairs ranked by n-gram Jaccard similarity."""
+        query = normalize_key(query)
+        if not query:
+            return []
+        query_grams = ngrams(query)
+        query_size = len(query_grams)
+        grams = self._grams
+        scored = []
+        for key_id in self._candidates(query):
+            key_grams = grams[key_id]
+            shared = len(query_grams & key_grams)
+            score = shared / (query_size + len(key_grams) - shared)
+            if score >= min_score:
+                scored.append((score, key_id))
+        return heapq.nlargest(limit, scored)
+
+    def suggest(self, query, limit=10, min_score=DEFAULT_MIN_SCORE):
+        """Return ranked suggestions: exact, then prefix, then prefixes with a typo,
+        then fuzzy matches."""
+        query = normalize_key(query)
+        results = []
+        seen_entries = set()
+
+        def add(key_id, score, match):
+            entry_id = self._keys[key_id][1]
+            if entry_id in seen_entries:
+                return
+            seen_entries.add(entry_id)
+            results.append(self._result(key_id, score, match))
+
+        for key_id in self.prefix(query, limit):
+            key = self._keys[key_id][0]
+            if key == query:
+                add(key_id, 1.0, 'exact')
+            else:
+                add(key_id, len(query) / len(key), 'prefix')
+        results.sort(key=lambda result: result['match'] != 'exact')
+
+        # Only fall back to fuzzy matching when nothing completes the query
+        if not results:
+            for key_id in self.fuzzy_prefix(query, limit):
+                add(key_id, (len(query) - 1) / len(self._keys[key_id][0]), 'fuzzy')
+        if not results:
+            for score, key_id in self.fuzzy(query, limit, min_score):
+                add(key_id, score, 'fuzzy')
+                if len(results) >= limit:
+                    break
+        return results[:limit]
+
+    def best_match(self, query, min_score=0.5):
+        """Return the chemical closest to ``query`` or ``None``."""
+        matches = self.fuzzy(query, limit=1, min_score=min_score)
+        if not matches:
+            return None
+        # Keys map to chemicals first-entry-wins here and in the registry alike
+        return registry.get(self._keys[matches[0][1]][0])
+
+
+_engine = None
+_engine_version = None
+_engine_lock = threading.Lock()
+
+
+def get_search_engine():
+    """Return the search engine for the current chemical registry version."""
+    global _engine, _engine_version
+    if _engine is None or _engine_version != registry.current_version():
+        with _engine_lock:
+            if _engine is None or _engine_version != registry.current_version():
+                # Version and records come from the same load
+                version, chemicals = registry.snapshot()
+                _engine = ChemicalSearchEngine(chemicals)
+                _engine_version = version
+    return _engine
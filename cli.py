@@ -0,0 +1,127 @@
+import os
+import sys
+import click
+from flask import Blueprint
+from app import db
+
+# Registered by create_app; cli_group=None keeps the commands top-level
+commands = Blueprint('commands', __name__, cli_group=None)
+
+@commands.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Create missing tables, columns and indexes (the schema release step)."""
+    from migrations import upgrade_schema
+    created = upgrade_schema()
+    click.echo(f"Schema up to date ({len(created)} index(es) created)")
+
+@commands.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any per-session route query does a full table scan."""
+    from query_plans import check_query_plans
+    if db.engine.dialect.name != 'sqlite':
+        click.echo(f"Query plan check only supports SQLite, not {db.engine.dialect.name}")
+        return
+
+    failed = False
+    for name, uses_index, plan in check_query_plans():
+        status = 'ok  ' if uses_index else 'SCAN'
+        click.echo(f"{status} {name}: {' | '.join(plan)}")
+        failed = failed or not uses_index
+    if failed:
+        sys.exit(1)
+
+@commands.cli.command('index-reports')
+def index_reports_command():
+    """Create the report search index if needed and re-index every report."""
+    from report_search import report_search
+    with db.engine.begin() as conn:
+        report_search.create_fts_table(conn)
+        backend, count = report_search.rebuild(conn)
+    click.echo(f"Indexed {count} report(s) with the {backend} search backend")
+
+@commands.cli.command('compact-reports')
+@click.option('--vacuum', is_flag=True, help='VACUUM afterwards so the database file shrinks (SQLite only).')
+def compact_reports_command(vacuum):
+    """Compress stored report bodies and fill in missing report summaries."""
+    from report_storage import report_storage
+    count = report_storage.compact()
+    click.echo(f"Compacted {count} report(s)")
+    if vacuum and db.engine.dialect.name == 'sqlite':
+        # Freed pages are only reused otherwise; VACUUM returns them to the filesystem
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM')
+        click.echo("Vacuumed the database")
+
+@commands.cli.command('rebuild-session-stats')
+def rebuild_session_stats_command():
+    """Recompute the per-session counters from the raw history tables."""
+    import session_stats
+    sessions, days = session_stats.rebuild()
+    click.echo(f"Rebuilt stats for {sessions} session(s) across {days} session-day(s)")
+
+@commands.cli.command('check-session-stats')
+def check_session_stats_command():
+    """Fail if the per-session counters disagree with the raw history tables."""
+    import session_stats
+    from activity_buffer import activity_buffer
+    activity_buffer.flush()
+    problems = session_stats.check_consistency()
+    for problem in problems:
+        click.echo(problem)
+    if problems:
+        sys.exit(1)
+    click.echo("Session stats are consistent")
+
+@commands.cli.command('export')
+@click.argument('kind', type=click.Choice(['calculations', 'activity', 'reports']))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv')
+@click.option('--session-id', default=None, help='Only export this session (default: all sessions).')
+@click.option('--start', default=None, help='Inclusive start date (YYYY-MM-DD or ISO 8601).')
+@click.option('--end', default=None, help='Exclusive end date (YYYY-MM-DD or ISO 8601).')
+@click.option('--output', type=click.File('w'), default='-')
+def export_command(kind, fmt, session_id, start, end, output):
+    """Stream history rows to a CSV or NDJSON file."""
+    from exports import generate_export, parse_bound
+    for chunk in generate_export(kind, fmt, session_id, parse_bound(start), parse_bound(end)):
+        output.write(chunk)
+
+@commands.cli.command('compact-activity')
+@click.option('--older-than-days', type=int, default=None,
+              help='Retention window in days (default: ACTIVITY_RETENTION_DAYS).')
+@click.option('--archive-dir', default=None, help='Archive directory (default: ACTIVITY_ARCHIVE_DIR).')
+@click.option('--batch-size', type=int, default=None, help='Rows archived and deleted per transaction.')
+@click.option('--pause', type=float, default=0.0, help='Seconds to sleep between batches.')
+@click.option('--dry-run', is_flag=True, help='Only count the rows that would be compacted.')
+def compact_activity_command(older_than_days, archive_dir, batch_size, pause, dry_run):
+    """Roll up, archive and delete activity log rows older than the retention window."""
+    from retention import CompactionRunning, compact, retention
+    from activity_buffer import activity_buffer
+    activity_buffer.flush()
+    try:
+        summary = compact(
+            older_than_days if older_than_days is not None else retention.retention_days,
+            archive_dir or retention.archive_dir,
+            batch_size or retention.batch_size,
+            pause,
+            dry_run=dry_run
+        )
+    except CompactionRunning as e:
+        click.echo(str(e))
+        sys.exit(1)
+    if dry_run:
+        click.echo(f"{summary['rows']} row(s) older than {summary['cutoff']} would be compacted")
+    else:
+        click.echo(f"Compacted {summary['rows']} row(s) older than {summary['cutoff']} in {summary['batches']} "
+                   f"batch(es); {summary['rollup_rows']} rollup update(s)")
+
+@commands.cli.command('compile-chemicals')
+@click.option('--source', default=None, help='chemicals.json to compile (default: the registry path).')
+@click.option('--output', default=None, help='Compiled file (default: chemicals.bin next to the source).')
+def compile_chemicals_command(source, output):
+    """Compile the chemical database into the mmap-able binary format."""
+    from chemical_binary import compile_chemicals
+    from chemical_registry import registry
+    source = source or registry.path
+    output = output or os.path.splitext(source)[0] + '.bin'
+    count = compile_chemicals(source, output)
+    click.echo(f"Compiled {count} chemical(s) into {output}")
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class CachedJsonFile:
+    """A JSON data file parsed once and re-read only when its mtime or size changes.
+
+    ``etag`` is a hash of the file contents, so every worker process derives
+    the same validator for the same data.
+    """
+
+    def __init__(self, path, default=None, check_interval=1.0):
+        self.path = path
+        self.default = default
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._last_check = 0.0
+        self._loaded = False
+        self.data = default
+        self.raw = b''
+        self.etag = None
+        self.last_modified = None
+        self.version = 0
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self, signature):
+        raw = b''
+        data = self.default
+        if signature is not None:
+            try:
+                with open(self.path, 'rb') as f:
+                    raw = f.read()
+                data = json.loads(raw)
+            except FileNotFoundError:
+                signature = None
+
+        self.raw = raw
+        self.data = data
+        self.etag = hashlib.sha1(raw).hexdigest()
+        self.last_modified = (datetime.fromtimestamp(signature[0] / 1e9, tz=timezone.utc).replace(microsecond=0)
+                              if signature else None)
+        self._signature = signature
+        self._loaded = True
+        self.version += 1
+
+    def refresh(self):
+        """Reload the file if it changed; returns ``self``."""
+        now = time.monotonic()
+        if self._loaded and now - self._last_check < self.check_interval:
+            return self
+        with self._lock:
+            if not self._loaded or now - self._last_check >= self.check_interval:
+                signature = self._file_signature()
+                if not self._loaded or signature != self._signature:
+                    self._load(signature)
+                self._last_check = now
+        return self
+
+    @property
+    def exists(self):
+        return self.refresh()._signature is not None
@@ -0,0 +1,216 @@
+"""In-process pub/sub hub behind the ``/api/events`` server-sent events stream.
+
+Writers publish to a session once their transaction has committed:
+ActivityLog inserts (``activity_buffer``) push ``activity`` events, and both
+activity and calculation writes push a fresh ``stats`` event. Each connected
+client has its own bounded queue. When a slow client's queue overflows, the
+oldest events are dropped and the client gets a ``resync`` event telling it
+to re-read ``/api/recent_activity`` and ``/api/stats`` once.
+
+The hub only sees writes made by its own process. To also pick up writes
+from other worker processes, every heartbeat re-reads the session counters,
+which is a single primary-key lookup, and pushes them when they changed.
+Streams close after ``SSE_MAX_DURATION`` seconds; EventSource reconnects on
+its own. Every open stream holds a request thread, so the number of streams
+is kept below ``SERVER_THREADS``; with a single-threaded sync worker SSE is
+off. When SSE is disabled (``SSE_MAX_CLIENTS=0``) or full, the endpoint
+answers 503 and clients keep polling the JSON endpoints.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+POLL_ENDPOINTS = ['/api/recent_activity', '/api/stats']
+
+
+class TooManySubscribers(Exception):
+    """Raised when the process already serves ``max_clients`` event streams."""
+
+
+def format_event(event, data):
+    """Encode one server-sent event."""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def activity_payload(record):
+    """Match the items returned by ``/api/recent_activity``."""
+    return {
+        'description': record['description'],
+        'action_type': record['action_type'],
+        'timestamp': record['timestamp'].strftime('%H:%M'),
+    }
+
+
+def stats_payload(stats):
+    """Match the body returned by ``/api/stats``."""
+    return {
+        'calculations_today': stats['calculations_today'],
+        'total_activities': stats['total_activities'],
+    }
+
+
+class Subscription:
+    def __init__(self, session_id, max_queue):
+        self.session_id = session_id
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lagged = False
+        self.last_stats = None
+
+    def put(self, item):
+        """Queue an event, dropping the oldest one if the client is not keeping up.
+
+        Returns the number of events dropped.
+        """
+        try:
+            self.queue.put_nowait(item)
+            return 0
+        except queue.Full:
+            pass
+        self.lagged = True
+        dropped = 0
+        try:
+            self.queue.get_nowait()
+            dropped = 1
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            dropped += 1
+        return dropped
+
+
+class EventHub:
+    def __init__(self, max_queue=100, heartbeat=15.0, max_clients=200, max_duration=300.0):
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self.max_duration = max_duration
+        self.app = None
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._count = 0
+        self.published = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def init_app(self, app):
+        """Read stream settings from ``app.config``."""
+        self.app = app
+        self.max_queue = app.config.get('SSE_QUEUE_SIZE', self.max_queue)
+        self.heartbeat = app.config.get('SSE_HEARTBEAT', self.heartbeat)
+        self.max_clients = app.config.get('SSE_MAX_CLIENTS', self.max_clients)
+        threads = app.config.get('SERVER_THREADS')
+        if threads is not None and self.max_clients > threads - 1:
+            logger.warning(f"SSE_MAX_CLIENTS={self.max_clients} would tie up all {threads} request "
+                           f"thread(s); capping at {max(0, threads - 1)}")
+            self.max_clients = max(0, threads - 1)
+        self.max_duration = app.config.get('SSE_MAX_DURATION', self.max_duration)
+
+    def subscribe(self, session_id):
+        """Register a client for ``session_id``; raises ``TooManySubscribers`` when full."""
+        with self._lock:
+            if self._count >= self.max_clients:
+                self.rejected += 1
+                raise TooManySubscribers(f'{self.max_clients} event streams already open')
+            subscription = Subscription(session_id, self.max_queue)
+            self._subscribers[session_id].add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.session_id)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscription.session_id]
+
+    def has_subscribers(self, session_id):
+        return session_id in self._subscribers
+
+    def publish(self, session_id, event, data):
+        """Send an event to every client of ``session_id``; never blocks."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(session_id, ()))
+        if not subscribers:
+            return
+        message = format_event(event, data)
+        for subscription in subscribers:
+            if event == 'stats':
+                subscription.last_stats = data
+            self.dropped += subscription.put(message)
+        self.published += 1
+
+    def publish_stats(self, session_id):
+        """Push the session's current counters; call after the write has committed."""
+        if not self.has_subscribers(session_id):
+            return
+        import session_stats
+        try:
+            self.publish(session_id, 'stats', stats_payload(session_stats.get_stats(session_id)))
+        except Exception as e:
+            logger.error(f"Could not publish stats for {session_id}: {e}")
+
+    def publish_activities(self, records):
+        """Push committed ActivityLog records, then the updated counters, to their sessions."""
+        by_session = defaultdict(list)
+        for record in records:
+            if self.has_subscribers(record['session_id']):
+                by_session[record['session_id']].append(record)
+        for session_id, session_records in by_session.items():
+            for record in session_records:
+                self.publish(session_id, 'activity', activity_payload(record))
+            self.publish_stats(session_id)
+
+    def _current_stats(self, session_id):
+        import session_stats
+        from storage import use_reader
+        with self.app.app_context():
+            use_reader()
+            return stats_payload(session_stats.get_stats(session_id))
+
+    def stream(self, subscription, initial_stats):
+        """Yield the SSE body for one client until it disconnects or the stream expires."""
+        subscription.last_stats = initial_stats
+        deadline = time.monotonic() + self.max_duration
+        try:
+            yield f'retry: {int(self.heartbeat * 1000)}\n'
+            yield format_event('stats', initial_stats)
+            while time.monotonic() < deadline:
+                try:
+                    message = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    # Catch writes made by other worker processes
+                    stats = self._current_stats(subscription.session_id)
+                    if stats != subscription.last_stats:
+                        subscription.last_stats = stats
+                        yield format_event('stats', stats)
+                    else:
+                        yield ': heartbeat\n\n'
+                    continue
+                if subscription.lagged:
+                    subscription.lagged = False
+                    yield format_event('resync', {'poll': POLL_ENDPOINTS})
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        return {
+            'clients': self._count,
+            'sessions': len(self._subscribers),
+            'max_clients': self.max_clients,
+            'published': self.published,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+        }
+
+
+event_hub = EventHub()
@@ -0,0 +1,98 @@
+"""Streaming CSV / NDJSON export of the history tables.
+
+Rows are selected as plain column tuples (no ORM identity map) and fetched
+in ``yield_per`` batches, and output is produced by generators, so memory use
+stays flat regardless of how many rows an export covers.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import select
+from app import db
+from models import ActivityLog, Calculation, LabReport
+
+EXPORTS = {
+    'calculations': (Calculation, 'timestamp', ['id', 'session_id', 'timestamp', 'chemical_name', 'molarity',
+                                                'volume', 'mass_required', 'molecular_weight', 'hit_count']),
+    'activity': (ActivityLog, 'timestamp', ['id', 'session_id', 'timestamp', 'action_type', 'description',
+                                            'details']),
+    'reports': (LabReport, 'created_at', ['id', 'session_id', 'created_at', 'title', 'report_type', 'content']),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+BATCH_SIZE = 1000
+
+def parse_bound(value):
+    """Parse a ``YYYY-MM-DD`` or ISO 8601 date range bound; ``None`` passes through."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid date: {value!r}, expected YYYY-MM-DD or ISO 8601')
+
+def export_rows(kind, session_id=None, start=None, end=None, batch_size=BATCH_SIZE):
+    """Yield row tuples (in ``EXPORTS`` field order) for one export, oldest first.
+
+    ``session_id`` of ``None`` exports every session; ``start`` is inclusive
+    and ``end`` exclusive.
+    """
+    model, time_field, fields = EXPORTS[kind]
+    time_column = getattr(model, time_field)
+    stmt = select(*(getattr(model, field) for field in fields))
+    if session_id is not None:
+        stmt = stmt.where(model.session_id == session_id)
+    if start is not None:
+        stmt = stmt.where(time_column >= start)
+    if end is not None:
+        stmt = stmt.where(time_column < end)
+    stmt = stmt.order_by(time_column, model.id).execution_options(yield_per=batch_size)
+
+    for row in db.session.execute(stmt):
+        yield row
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def generate_csv(kind, rows, batch_size=BATCH_SIZE):
+    """Yield CSV text in chunks of up to ``batch_size`` rows, header first."""
+    fields = EXPORTS[kind][2]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    pending = 0
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+def generate_ndjson(kind, rows, batch_size=BATCH_SIZE):
+    """Yield newline-delimited JSON in chunks of up to ``batch_size`` rows."""
+    fields = EXPORTS[kind][2]
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({field: _plain(value) for field, value in zip(fields, row)}))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def generate_export(kind, fmt, session_id=None, start=None, end=None):
+    """Return a generator producing the whole export as text chunks."""
+    rows = export_rows(kind, session_id, start, end)
+    if fmt == 'csv':
+        return generate_csv(kind, rows)
+    return generate_ndjson(kind, rows)
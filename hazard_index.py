@@ -0,0 +1,166 @@
+"""Hazard classes and chemical incompatibility checks over the chemical registry.
+
+Hazard statements in the chemical database are free text ("Corrosive",
+"Strong acid", "Highly flammable liquid"). Each chemical is mapped onto the
+fixed ``HAZARD_CLASSES`` by keyword from its hazards only, never its name
+("ascorbic acid" is not a hazardous acid); a chemical may also list
+``hazard_classes`` itself. Every class is one bit, so a chemical's hazards
+are a single int.
+
+Checking a reagent list ORs the bits of every reagent together and tests
+each ``INCOMPATIBLE`` rule against that union with two ANDs; only rules that
+fire look at which reagents are involved. A check is one dict lookup per
+reagent plus work proportional to the conflicts found, not a lookup per pair.
+"""
+import re
+import threading
+
+from chemical_registry import normalize_key, registry
+
+HAZARD_CLASSES = (
+    'flammable', 'oxidizer', 'reducer', 'corrosive', 'acid', 'base',
+    'water_reactive', 'cyanide', 'explosive', 'toxic',
+)
+BITS = {name: 1 << position for position, name in enumerate(HAZARD_CLASSES)}
+
+# (class, class, why the two must not be mixed or stored together)
+INCOMPATIBLE = (
+    ('oxidizer', 'flammable', 'Oxidizers can ignite flammable materials'),
+    ('oxidizer', 'reducer', 'Oxidizers react violently with reducing agents'),
+    ('oxidizer', 'explosive', 'Oxidizers can set off explosives'),
+    ('acid', 'base', 'Acids and bases neutralize exothermically'),
+    ('acid', 'cyanide', 'Acids release hydrogen cyanide gas from cyanides'),
+    ('acid', 'water_reactive', 'Water-reactive chemicals react with aqueous acids'),
+    ('water_reactive', 'oxidizer', 'Water-reactive chemicals can react violently with oxidizers'),
+)
+RULES = tuple((BITS[first], BITS[second], first, second, reason) for first, second, reason in INCOMPATIBLE)
+
+NEGATED = r'(?<!non-)(?<!non )(?<!not )'
+HAZARD_PATTERNS = {
+    'acid': re.compile(NEGATED + r'\b(?:(?:strong|corrosive|mineral) acid|acidic)\b'),
+    'base': re.compile(NEGATED + r'\b(?:(?:strong|corrosive) (?:base|alkali)|alkaline|caustic)\b'),
+    'cyanide': re.compile(NEGATED + r'\bcyanide\b'),
+    'flammable': re.compile(NEGATED + r'\b(?:flammab|inflammab|combustib|pyrophoric)'),
+    'oxidizer': re.compile(NEGATED + r'\b(?:oxidi[sz]|peroxide)'),
+    'reducer': re.compile(NEGATED + r'\breduc(?:ing|er)'),
+    'corrosive': re.compile(NEGATED + r'\bcorrosive'),
+    'water_reactive': re.compile(NEGATED + r'\b(?:water[- ]reactive|reacts? (?:violently )?with water)'),
+    'explosive': re.compile(NEGATED + r'\bexplosive'),
+    'toxic': re.compile(NEGATED + r'\b(?:toxic|poison)'),
+}
+
+
+def hazard_mask(chemical):
+    """Return the hazard class bitset of one chemical record."""
+    mask = 0
+    for name in chemical.get('hazard_classes') or ():
+        mask |= BITS.get(normalize_key(name).replace(' ', '_'), 0)
+    hazards = ' '.join(normalize_key(hazard) for hazard in chemical.get('hazards') or ())
+    for name, pattern in HAZARD_PATTERNS.items():
+        if pattern.search(hazards):
+            mask |= BITS[name]
+    return mask
+
+
+def class_names(mask):
+    return [name for name in HAZARD_CLASSES if mask & BITS[name]]
+
+
+class HazardIndex:
+    """Hazard bitsets for every chemical, and the chemicals in each hazard class."""
+
+    def __init__(self, chemicals):
+        """Index ``chemicals``, an iterable of chemical dicts (see ``registry.snapshot``)."""
+        self._names = []
+        self._masks = []
+        self._keys = {}
+        self.members = {name: [] for name in HAZARD_CLASSES}
+
+        for chemical in chemicals:
+            entry_id = len(self._names)
+            mask = hazard_mask(chemical)
+            self._names.append(chemical.get('name'))
+            self._masks.append(mask)
+            for name in class_names(mask):
+                self.members[name].append(entry_id)
+            keys = [chemical.get('name'), chemical.get('formula')]
+            keys.extend(chemical.get('common_names', []))
+            for key in keys:
+                key = normalize_key(key)
+                if key:
+                    # First entry wins, as in the registry
+                    self._keys.setdefault(key, entry_id)
+
+    def __len__(self):
+        return len(self._names)
+
+    def chemicals_with(self, hazard_class):
+        """Names of the chemicals in ``hazard_class``."""
+        return [self._names[entry_id] for entry_id in self.members.get(hazard_class, ())]
+
+    def check(self, reagents):
+        """Check a reagent list against ``INCOMPATIBLE``.
+
+        Returns a dict with each resolved ``reagent`` and its hazard classes,
+        the ``unknown`` names, and one ``conflict`` per rule that fires,
+        listing the reagents on either side of it.
+        """
+        found = {}
+        unknown = []
+        for reagent in reagents:
+            entry_id = self._keys.get(normalize_key(reagent))
+            if entry_id is None:
+                unknown.append(reagent)
+            else:
+                found.setdefault(entry_id, reagent)
+
+        present = 0
+        for entry_id in found:
+            present |= self._masks[entry_id]
+
+        conflicts = []
+        for first_bit, second_bit, first, second, reason in RULES:
+            if not (present & first_bit and present & second_bit):
+                continue
+            first_ids = [entry_id for entry_id in found if self._masks[entry_id] & first_bit]
+            second_ids = [entry_id for entry_id in found if self._masks[entry_id] & second_bit]
+            # A chemical in both classes does not conflict with itself, only
+            # with the other chemicals on the opposite side
+            first_ids, second_ids = (
+                [entry_id for entry_id in first_ids if len(second_ids) > 1 or second_ids[0] != entry_id],
+                [entry_id for entry_id in second_ids if len(first_ids) > 1 or first_ids[0] != entry_id],
+            )
+            if not first_ids:
+                continue
+            conflicts.append({
+                'hazards': [first, second],
+                'reason': reason,
+                'chemicals': [self._names[entry_id] for entry_id in first_ids],
+                'incompatible_with': [self._names[entry_id] for entry_id in second_ids],
+            })
+
+        return {
+            'reagents': [{'query': reagent, 'name': self._names[entry_id],
+                          'hazard_classes': class_names(self._masks[entry_id])}
+                         for entry_id, reagent in found.items()],
+            'unknown': unknown,
+            'conflicts': conflicts,
+        }
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_hazard_index():
+    """Return the hazard index for the current chemical registry version."""
+    global _index, _index_version
+    if _index is None or _index_version != registry.current_version():
+        with _index_lock:
+            if _index is None or _index_version != registry.current_version():
+                # Version and records come from the same load
+                version, chemicals = registry.snapshot()
+                _index = HazardIndex(chemicals)
+                _index_version = version
+    return _index
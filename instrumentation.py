@@ -0,0 +1,324 @@
+"""Request, SQL and helper instrumentation exposed in Prometheus text format.
+
+``init_app`` hooks Flask's request lifecycle and SQLAlchemy engine events so
+every request records its latency, SQL query count and time, and commit
+count under its endpoint name. Work outside a request (the activity log
+flusher, CLI commands) is recorded under the ``<background>`` endpoint.
+
+When ``PROFILE_SLOW_REQUEST_MS`` is set, a stack sampling profiler watches
+request threads and writes collapsed stacks (flamegraph input) for requests
+slower than the threshold to ``PROFILE_DIR``.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter, defaultdict
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND = '<background>'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Labelled counters and histograms guarded by one lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._help = {}
+        self._kinds = {}
+
+    def describe(self, name, kind, help_text):
+        self._kinds[name] = kind
+        self._help[name] = help_text
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self._counters[(name, labels)] += value
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        with self._lock:
+            key = (name, labels)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self, gauges=()):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            described = set()
+
+            def header(name):
+                if name not in described:
+                    described.add(name)
+                    if name in self._help:
+                        lines.append(f'# HELP {name} {self._help[name]}')
+                    lines.append(f'# TYPE {name} {self._kinds.get(name, "untyped")}')
+
+            for (name, labels), value in counters:
+                header(name)
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+
+            for (name, labels), histogram in histograms:
+                header(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram.total}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(histogram.sum)}')
+                lines.append(f'{name}_count{_labels(labels)} {histogram.total}')
+
+        for name, kind, help_text, value in gauges:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+metrics = MetricsRegistry()
+metrics.describe('labmate_request_duration_seconds', 'histogram', 'Request latency by endpoint.')
+metrics.describe('labmate_requests_total', 'counter', 'Requests by endpoint, method and status.')
+metrics.describe('labmate_sql_queries_total', 'counter', 'SQL statements executed, by endpoint.')
+metrics.describe('labmate_sql_duration_seconds_total', 'counter', 'Time spent executing SQL, by endpoint.')
+metrics.describe('labmate_sql_queries_per_request', 'histogram', 'SQL statements per request, by endpoint.')
+metrics.describe('labmate_db_commits_total', 'counter', 'Database commits, by endpoint.')
+metrics.describe('labmate_pdf_render_seconds', 'histogram', 'PDF render time, by endpoint.')
+metrics.describe('labmate_report_job_seconds', 'histogram', 'Background report job time from submit to finish.')
+metrics.describe('labmate_chemical_lookup_seconds', 'histogram', 'Chemical lookup time, by endpoint.')
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or '<unmatched>'
+    return BACKGROUND
+
+
+@contextmanager
+def timed(metric):
+    """Observe the duration of the ``with`` block into ``metric`` for the current endpoint."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(metric, time.perf_counter() - start, (('endpoint', current_endpoint()),))
+
+
+# SQLAlchemy engine events
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+    endpoint = current_endpoint()
+    labels = (('endpoint', endpoint),)
+    metrics.inc('labmate_sql_queries_total', labels)
+    metrics.inc('labmate_sql_duration_seconds_total', labels, elapsed)
+    if endpoint != BACKGROUND and 'labmate_start' in g:
+        g.labmate_sql_queries = g.get('labmate_sql_queries', 0) + 1
+
+
+def _on_commit(conn):
+    endpoint = current_endpoint()
+    metrics.inc('labmate_db_commits_total', (('endpoint', endpoint),))
+    if endpoint != BACKGROUND and 'labmate_start' in g:
+        g.labmate_commits = g.get('labmate_commits', 0) + 1
+
+
+_engine_events_installed = False
+
+
+def install_engine_events():
+    """Attach the SQL listeners to every engine (idempotent)."""
+    global _engine_events_installed
+    if _engine_events_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'commit', _on_commit)
+    _engine_events_installed = True
+
+
+class StackSampler:
+    """Samples the stacks of registered request threads at a fixed interval."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def start(self, thread_id):
+        with self._lock:
+            self._samples[thread_id] = StackCounter()
+        self._ensure_started()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._samples.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._samples:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, counter in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                        frame = frame.f_back
+                    counter[';'.join(reversed(stack))] += 1
+
+
+class Instrumentation:
+    def __init__(self):
+        self.slow_request_ms = None
+        self.profile_dir = None
+        self.sampler = None
+        self.gauge_providers = []
+
+    def init_app(self, app):
+        """Register request hooks, SQL listeners and the optional slow-request profiler."""
+        slow_ms = app.config.get('PROFILE_SLOW_REQUEST_MS')
+        if slow_ms:
+            self.slow_request_ms = float(slow_ms)
+            self.profile_dir = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+            os.makedirs(self.profile_dir, exist_ok=True)
+            self.sampler = StackSampler(app.config.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+        install_engine_events()
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def add_gauges(self, provider):
+        """Register a callable returning ``(name, kind, help, value)`` tuples for /metrics."""
+        self.gauge_providers.append(provider)
+
+    def add_stats(self, prefix, stats, description):
+        """Expose every numeric value of a ``stats()`` dict as a ``<prefix>_<key>`` gauge."""
+        def provider():
+            return [(f'{prefix}_{key}', 'gauge', f'{description}: {key}.', value)
+                    for key, value in stats().items()
+                    if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        self.add_gauges(provider)
+
+    def _before_request(self):
+        g.labmate_start = time.perf_counter()
+        g.labmate_sql_queries = 0
+        g.labmate_commits = 0
+        if self.sampler is not None:
+            self.sampler.start(threading.get_ident())
+
+    def _after_request(self, response):
+        g.labmate_status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        start = g.pop('labmate_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or '<unmatched>'
+        status = g.get('labmate_status', 500 if exc else 200)
+        labels = (('endpoint', endpoint),)
+        metrics.observe('labmate_request_duration_seconds', elapsed, labels)
+        metrics.inc('labmate_requests_total', labels + (('method', request.method), ('status', str(status))))
+        metrics.observe('labmate_sql_queries_per_request', g.get('labmate_sql_queries', 0), labels, COUNT_BUCKETS)
+
+        if self.sampler is not None:
+            samples = self.sampler.stop(threading.get_ident())
+            if samples and elapsed * 1000 >= self.slow_request_ms:
+                self._write_profile(endpoint, elapsed, samples)
+
+    def _write_profile(self, endpoint, elapsed, samples):
+        safe_endpoint = ''.join(c if c.isalnum() or c in '-_' else '_' for c in endpoint)
+        path = os.path.join(self.profile_dir, f'{safe_endpoint}-{int(time.time() * 1000)}.folded')
+        try:
+            with open(path, 'w') as f:
+                for stack, count in samples.most_common():
+                    f.write(f'{stack} {count}\n')
+            logger.warning(f"Slow request {endpoint} took {elapsed * 1000:.0f} ms; profile written to {path}")
+        except OSError as e:
+            logger.error(f"Could not write profile for {endpoint}: {e}")
+
+    def render(self):
+        gauges = []
+        for provider in self.gauge_providers:
+            try:
+                gauges.extend(provider())
+            except Exception as e:
+                logger.error(f"Metrics gauge provider failed: {e}")
+        return metrics.render(gauges)
+
+
+instrumentation = Instrumentation()
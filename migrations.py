@@ -0,0 +1,84 @@
+"""Lightweight schema upgrades for existing databases.
+
+``db.create_all()`` only creates missing tables; it never touches tables that
+already exist. ``upgrade_schema`` additionally adds columns and creates
+indexes declared on the models that an older database file is missing.
+"""
+import logging
+from sqlalchemy import inspect, text
+from app import db
+
+logger = logging.getLogger(__name__)
+
+def add_missing_columns():
+    """Add model columns missing from existing tables; returns ``table.column`` names.
+
+    New columns must be nullable or have a ``server_default`` so existing rows
+    get a value.
+    """
+    inspector = inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} ' \
+                  f'{column.type.compile(db.engine.dialect)}'
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += f' DEFAULT {getattr(default, "text", default)}'
+                if not column.nullable:
+                    ddl += ' NOT NULL'
+            with db.engine.begin() as conn:
+                conn.execute(text(ddl))
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+def upgrade_schema():
+    """Create missing tables, columns and indexes. Safe to run repeatedly."""
+    import models  # noqa: F401 - registers the tables on db.metadata
+
+    existing_tables = set(inspect(db.engine).get_table_names())
+    db.create_all()
+
+    added = add_missing_columns()
+    for name in added:
+        logger.info(f"Added column {name}")
+
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine, checkfirst=True)
+                created.append(index.name)
+
+    for name in created:
+        logger.info(f"Created index {name}")
+
+    # Full-text index over lab reports (SQLite with FTS5 only); a new index
+    # on a database that already has reports is filled once
+    from report_search import report_search
+    with db.engine.begin() as conn:
+        if report_search.create_fts_table(conn):
+            backend, count = report_search.rebuild(conn)
+            logger.info(f"Created {backend} report search index over {count} report(s)")
+
+    # Reports written before summaries existed get one, and their bodies
+    # are compressed, in the same pass
+    if 'lab_report.summary' in added:
+        from report_storage import report_storage
+        logger.info(f"Compacted {report_storage.compact()} lab report(s)")
+
+    # Counter tables added to a database that already has history start out
+    # empty; fill them from the raw tables once
+    if existing_tables and 'session_stats' not in existing_tables:
+        import session_stats
+        sessions, days = session_stats.rebuild()
+        logger.info(f"Backfilled session stats for {sessions} session(s), {days} day(s)")
+    return created
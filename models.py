@@ -1,6 +1,7 @@
 from app import db
 from datetime import datetime
 from sqlalchemy import Text
+from report_storage import CompressedText, SUMMARY_LENGTH, summary_default
 
 class ActivityLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,6 +11,10 @@ class ActivityLog(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     session_id = db.Column(db.String(100))
 
+    __table_args__ = (
+        db.Index('ix_activity_log_session_timestamp', 'session_id', 'timestamp'),
+    )
+
     def __repr__(self):
         return f'<ActivityLog {self.action_type}: {self.description}>'
 
@@ -17,11 +22,18 @@ class Calculation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     chemical_name = db.Column(db.String(100), nullable=False)
     molarity = db.Column(db.Float, nullable=False)
-    volume = db.Column(db.Float, nullable=False)
+    volume = db.Column(db.Float, nullable=False)  # litres
     mass_required = db.Column(db.Float, nullable=False)
     molecular_weight = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     session_id = db.Column(db.String(100))
+    # Same-day repeats are counted here when CALCULATION_DEDUP is on
+    hit_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    last_used_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_calculation_session_timestamp', 'session_id', 'timestamp'),
+    )
 
     def __repr__(self):
         return f'<Calculation {self.chemical_name}: {self.mass_required}g>'
@@ -29,10 +41,48 @@ class Calculation(db.Model):
 class LabReport(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
-    content = db.Column(Text, nullable=False)
+    # Deferred: list views read ``summary``; the body loads on first access
+    content = db.deferred(db.Column(CompressedText, nullable=False))
+    summary = db.Column(db.String(SUMMARY_LENGTH + 1), default=summary_default)
     report_type = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     session_id = db.Column(db.String(100))
 
+    __table_args__ = (
+        db.Index('ix_lab_report_session_created', 'session_id', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<LabReport {self.title}>'
+
+class SessionStats(db.Model):
+    """Running per-session totals maintained alongside ActivityLog/Calculation writes."""
+    session_id = db.Column(db.String(100), primary_key=True)
+    total_activities = db.Column(db.Integer, nullable=False, default=0)
+    total_calculations = db.Column(db.Integer, nullable=False, default=0)
+    last_activity_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<SessionStats {self.session_id}: {self.total_activities} activities>'
+
+class SessionDailyStats(db.Model):
+    """Per-session, per-UTC-day activity and calculation counts."""
+    session_id = db.Column(db.String(100), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    activities = db.Column(db.Integer, nullable=False, default=0)
+    calculations = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SessionDailyStats {self.session_id} {self.day}>'
+
+class ActivityRollup(db.Model):
+    """Per-session, per-UTC-day, per-action_type counts of compacted ActivityLog rows."""
+    session_id = db.Column(db.String(100), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    action_type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    first_at = db.Column(db.DateTime)
+    last_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<ActivityRollup {self.session_id} {self.day} {self.action_type}: {self.count}>'
@@ -0,0 +1,114 @@
+"""Keyset (cursor) pagination.
+
+Pages are addressed by an opaque cursor encoding the ``(timestamp, id)`` of
+the last row seen, so fetching page N costs the same as fetching page 1:
+there is no OFFSET to skip and no COUNT(*) unless a caller asks for one.
+
+``KeysetPage`` also has the attributes templates read from Flask-SQLAlchemy's
+``Pagination`` (``page``, ``pages``, ``prev_num``, ``next_num``,
+``iter_pages``). Page numbers there only label pages; callers map them back
+to cursors (see ``routes.activity_log_page``).
+"""
+import base64
+import math
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that cannot be decoded."""
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        timestamp, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}') from e
+
+class KeysetPage:
+    """One page of rows plus the cursors needed to move around it."""
+
+    def __init__(self, items, per_page, has_next, has_prev, timestamp_attr, total=None, total_is_exact=False,
+                 page=1):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.total = total
+        self.total_is_exact = total_is_exact
+        self.next_cursor = None
+        self.prev_cursor = None
+        if items and has_next:
+            last = items[-1]
+            self.next_cursor = encode_cursor(getattr(last, timestamp_attr), last.id)
+        if items and has_prev:
+            first = items[0]
+            self.prev_cursor = encode_cursor(getattr(first, timestamp_attr), first.id)
+
+    @property
+    def pages(self):
+        # Counter totals can lag behind the rows; never report fewer pages than exist
+        known = self.page + (1 if self.has_next else 0)
+        if self.total is None:
+            return known
+        return max(known, math.ceil(self.total / self.per_page))
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev and self.page > 1 else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    def iter_pages(self, **kwargs):
+        """Yield the page numbers that can be reached without OFFSET, ``None`` for a gap.
+
+        That is the first page and the current page's neighbours; the
+        ``Pagination`` keyword arguments are accepted and ignored.
+        """
+        numbers = [number for number in (1, self.prev_num, self.page, self.next_num) if number]
+        previous = None
+        for number in sorted(set(numbers)):
+            if previous is not None and number > previous + 1:
+                yield None
+            yield number
+            previous = number
+
+def newest_first(query, model, timestamp_attr='timestamp', per_page=20, after_key=None):
+    """Build the query for one newest-first page following ``(timestamp, id)``.
+
+    One extra row is fetched so callers can tell whether another page exists.
+    """
+    column = getattr(model, timestamp_attr)
+    if after_key is not None:
+        timestamp, row_id = after_key
+        query = query.filter(or_(column < timestamp, and_(column == timestamp, model.id < row_id)))
+    return query.order_by(column.desc(), model.id.desc()).limit(per_page + 1)
+
+def keyset_page(query, model, timestamp_attr='timestamp', per_page=20, after=None, before=None):
+    """Return a newest-first ``KeysetPage`` of ``query``.
+
+    ``after`` continues past an earlier page's ``next_cursor``; ``before``
+    goes back from a ``prev_cursor``. Both are opaque strings from this module.
+    """
+    column = getattr(model, timestamp_attr)
+
+    if before:
+        timestamp, row_id = decode_cursor(before)
+        rows = (query.filter(or_(column > timestamp, and_(column == timestamp, model.id > row_id)))
+                .order_by(column.asc(), model.id.asc())
+                .limit(per_page + 1).all())
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        return KeysetPage(items, per_page, has_next=True, has_prev=has_prev, timestamp_attr=timestamp_attr)
+
+    after_key = decode_cursor(after) if after else None
+    rows = newest_first(query, model, timestamp_attr, per_page, after_key).all()
+    return KeysetPage(rows[:per_page], per_page, has_next=len(rows) > per_page,
+                      has_prev=bool(after), timestamp_attr=timestamp_attr)
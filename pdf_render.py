@@ -0,0 +1,123 @@
+"""PDF rendering for lab reports.
+
+This module deliberately avoids importing the Flask app or database so that
+report worker processes can import it cheaply. ReportLab itself is imported
+on the first render, so workers that never render a PDF never load it.
+"""
+import os
+import tempfile
+from datetime import datetime
+from io import BytesIO
+
+# Bump whenever the layout below changes so cached renders are not reused
+TEMPLATE_VERSION = '1'
+
+def _document(target):
+    """Return a letter-size report document writing to ``target`` and its styles.
+
+    ``target`` is a file name or a file-like object. The styles are a dict
+    with ``title``, ``header`` and ``body`` paragraph styles.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+
+    doc = SimpleDocTemplate(target, pagesize=letter, topMargin=1*inch)
+    styles = getSampleStyleSheet()
+    return doc, {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=30,
+            alignment=1  # Center alignment
+        ),
+        'header': ParagraphStyle(
+            'CustomHeader',
+            parent=styles['Heading2'],
+            fontSize=14,
+            spaceAfter=12
+        ),
+        'body': styles['Normal'],
+    }
+
+def _report_story(styles, title, content, report_type, generated=None):
+    """Return the flowables for one report; ``generated`` adds a timestamp line."""
+    from reportlab.platypus import Paragraph, Spacer
+
+    # Title
+    story = [Paragraph(title, styles['title']), Spacer(1, 12)]
+
+    # Report metadata
+    story.append(Paragraph(f"Report Type: {report_type.title()}", styles['header']))
+    if generated is not None:
+        story.append(Paragraph(f"Generated: {generated.strftime('%Y-%m-%d %H:%M:%S')}", styles['body']))
+    story.append(Spacer(1, 20))
+
+    # Content, one paragraph per line
+    story.append(Paragraph("Report Content", styles['header']))
+    for paragraph in content.split('\n'):
+        if paragraph.strip():
+            story.append(Paragraph(paragraph, styles['body']))
+            story.append(Spacer(1, 12))
+    return story
+
+def render_pdf(title, content, report_type):
+    """Generate a PDF report using ReportLab."""
+    buffer = BytesIO()
+    doc, styles = _document(buffer)
+    doc.build(_report_story(styles, title, content, report_type, generated=datetime.now()))
+    pdf_content = buffer.getvalue()
+    buffer.close()
+
+    return pdf_content
+
+def render_to_file(title, content, report_type, path):
+    """Render a report to ``path`` atomically and return its size in bytes."""
+    pdf_content = render_pdf(title, content, report_type)
+    fd, tmp_path = _temp_file(path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf_content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    return len(pdf_content)
+
+def _temp_file(path):
+    """Create a unique temp file next to ``path``, so threads rendering the same key never share one."""
+    return tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+
+def _discard(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+def render_combined_to_file(reports, path):
+    """Render several reports into one PDF at ``path`` atomically; returns its size.
+
+    ``reports`` is a sequence of ``(title, content, report_type)`` tuples; each
+    report starts on a new page. ReportLab writes straight to the file.
+    """
+    from reportlab.platypus import PageBreak
+
+    fd, tmp_path = _temp_file(path)
+    os.close(fd)
+    doc, styles = _document(tmp_path)
+
+    story = []
+    for index, (title, content, report_type) in enumerate(reports):
+        if index:
+            story.append(PageBreak())
+        story.extend(_report_story(styles, title, content, report_type))
+
+    try:
+        doc.build(story)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    return os.path.getsize(path)
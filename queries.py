@@ -0,0 +1,56 @@
+"""Per-session history queries shared by the routes and the query plan check."""
+from datetime import datetime
+from sqlalchemy.orm import undefer
+from pagination import newest_first
+from models import ActivityLog, LabReport, SessionStats, SessionDailyStats
+
+def session_activities(session_id):
+    """All activity for a session, newest first."""
+    return ActivityLog.query.filter_by(session_id=session_id).order_by(ActivityLog.timestamp.desc())
+
+def session_activity_filter(session_id):
+    """Unordered activity for a session, for keyset pagination."""
+    return ActivityLog.query.filter_by(session_id=session_id)
+
+def recent_activity(session_id, limit):
+    """The most recent activity entries for a session."""
+    return session_activities(session_id).limit(limit)
+
+def recent_reports(session_id, limit=10):
+    """The most recent lab reports for a session, without their bodies (``content`` is deferred)."""
+    return LabReport.query.filter_by(session_id=session_id).order_by(LabReport.created_at.desc()).limit(limit)
+
+def bundle_reports(session_id, report_ids=None, start=None, end=None, limit=None):
+    """A session's reports picked by id and/or created_at range, oldest first."""
+    # Every body is rendered, so load them with the rows
+    query = LabReport.query.options(undefer(LabReport.content)).filter_by(session_id=session_id)
+    if report_ids is not None:
+        query = query.filter(LabReport.id.in_(report_ids))
+    if start is not None:
+        query = query.filter(LabReport.created_at >= start)
+    if end is not None:
+        query = query.filter(LabReport.created_at < end)
+    return query.order_by(LabReport.created_at, LabReport.id).limit(limit)
+
+def session_stats(session_id, day):
+    """Materialized counters for a session and one UTC day."""
+    return (SessionStats.query.filter_by(session_id=session_id),
+            SessionDailyStats.query.filter_by(session_id=session_id, day=day))
+
+def keyset_query(session_id, after_key=None, per_page=20):
+    """The query keyset pagination issues for a newest-first activity page."""
+    return newest_first(session_activity_filter(session_id), ActivityLog, per_page=per_page, after_key=after_key)
+
+def route_queries(session_id):
+    """Every per-session query issued by the routes, keyed by a short name."""
+    totals, daily = session_stats(session_id, datetime.utcnow().date())
+    return {
+        'dashboard.recent_activity': recent_activity(session_id, 5),
+        'api_recent_activity': recent_activity(session_id, 10),
+        'stats.session_totals': totals,
+        'stats.session_daily': daily,
+        'documentation.recent_reports': recent_reports(session_id),
+        'bundles.date_range': bundle_reports(session_id, start=datetime(2025, 1, 1), end=datetime.utcnow(), limit=500),
+        'activity_logs.first_page': keyset_query(session_id),
+        'activity_logs.after_cursor': keyset_query(session_id, (datetime.utcnow(), 1)),
+    }
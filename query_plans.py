@@ -0,0 +1,26 @@
+"""EXPLAIN QUERY PLAN checks for the per-session route queries (SQLite only)."""
+from sqlalchemy import text
+from app import db
+import queries
+
+def _plan(statement):
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).all()
+    return [row[-1] for row in rows]
+
+def _uses_index(plan):
+    for detail in plan:
+        # A bare "SCAN <table>" is a full table scan; "SCAN ... USING INDEX" is fine
+        if detail.startswith('SCAN') and 'INDEX' not in detail:
+            return False
+        if 'TEMP B-TREE' in detail:
+            return False
+    return True
+
+def check_query_plans(session_id='query-plan-check'):
+    """Return ``(name, uses_index, plan)`` for every route query."""
+    results = []
+    for name, query in queries.route_queries(session_id).items():
+        plan = _plan(query.statement)
+        results.append((name, _uses_index(plan), plan))
+    return results
@@ -0,0 +1,163 @@
+"""Content-addressed on-disk cache of rendered report PDFs.
+
+Entries are keyed by a SHA-256 of (template version, title, content,
+report_type), so identical reports render once and are then served straight
+from disk. The cache is bounded by total size; the least recently used files
+(by mtime, refreshed on every hit) are evicted first.
+
+A miss only adds the new file's size to a running total. The directory is
+walked when that total passes ``max_bytes`` (and by ``trim``, which also
+picks up files written by other processes), and eviction then goes down to
+``LOW_WATER`` of the limit so walks stay rare.
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from instrumentation import timed
+from pdf_render import TEMPLATE_VERSION, render_to_file
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+LOW_WATER = 0.9
+
+
+def cache_key(title, content, report_type):
+    """Return the cache key for a report's rendering inputs."""
+    digest = hashlib.sha256()
+    for part in (TEMPLATE_VERSION, title, content, report_type):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def stream_file(path, chunk_size=CHUNK_SIZE):
+    """Open ``path`` now and yield its contents in chunks.
+
+    The file is opened eagerly so a concurrent eviction cannot remove it
+    between the cache lookup and the first chunk.
+    """
+    f = open(path, 'rb')
+
+    def generate():
+        with f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    return generate()
+
+
+class ReportCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directory = None
+        self._lock = threading.Lock()
+        self._bytes = None
+        self._files = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        """Read cache settings from ``app.config``."""
+        self.max_bytes = app.config.get('REPORT_CACHE_MAX_BYTES', self.max_bytes)
+        self.directory = app.config.get('REPORT_CACHE_DIR') or os.path.join(app.instance_path, 'report_cache')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.pdf')
+
+    def get(self, key):
+        """Return the cached file path for ``key`` or ``None``; marks it recently used."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def render(self, title, content, report_type):
+        """Return ``(key, path)`` for the report, rendering it on a cache miss."""
+        key = cache_key(title, content, report_type)
+        path = self.get(key)
+        if path:
+            return key, path
+
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with timed('labmate_pdf_render_seconds'):
+            size = render_to_file(title, content, report_type, path)
+        with self._lock:
+            if self._bytes is None:
+                self._scan()
+            else:
+                self._bytes += size
+                self._files += 1
+            over = self._bytes > self.max_bytes
+        if over:
+            self._evict(keep=path)
+        return key, path
+
+    def trim(self):
+        """Evict least recently used files until the cache is within its size limit."""
+        self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.pdf'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _scan(self):
+        """Walk the directory, resync the running totals and return entries oldest first."""
+        entries = sorted(self._entries())
+        self._bytes = sum(size for _, size, _ in entries)
+        self._files = len(entries)
+        return entries
+
+    def _evict(self, keep=None):
+        with self._lock:
+            entries = self._scan()
+            if self._bytes <= self.max_bytes:
+                return
+            target = self.max_bytes * LOW_WATER
+            for _, size, path in entries:
+                if self._bytes <= target:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    self._bytes -= size
+                    self._files -= 1
+                    self.evictions += 1
+                except OSError:
+                    pass
+
+    def stats(self):
+        if self.directory and self._bytes is None:
+            with self._lock:
+                self._scan()
+        return {
+            'entries': self._files,
+            'bytes': self._bytes or 0,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+report_cache = ReportCache()
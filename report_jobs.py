@@ -0,0 +1,243 @@
+"""Background PDF rendering.
+
+Report jobs are rendered by a process pool so long documents never hold a
+web worker. Finished PDFs are written to ``REPORT_OUTPUT_DIR/<job_id>.pdf``
+next to a small ``<job_id>.json`` with the job's session and status. Because
+both paths only depend on the job id, any worker process can report on a job
+and serve its download, for the owning session only, even if it did not run
+the job itself.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import metrics
+from pdf_render import render_to_file
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised when too many report jobs are already waiting or running."""
+
+
+class ReportJob:
+    def __init__(self, job_id, session_id, title, report_type, report_id=None):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.title = title
+        self.report_type = report_type
+        self.report_id = report_id
+        self.status = QUEUED
+        self.future = None
+        self.error = None
+        self.size = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'report_id': self.report_id,
+            'title': self.title,
+            'status': self.status,
+            'error': self.error,
+            'size': self.size,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class ReportJobQueue:
+    """Bounded report rendering queue backed by a process pool."""
+
+    def __init__(self, workers=2, max_pending=32, retention=200):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self.output_dir = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    def init_app(self, app):
+        """Read pool settings from ``app.config``."""
+        self.workers = app.config.get('REPORT_WORKERS', self.workers)
+        self.max_pending = app.config.get('REPORT_QUEUE_SIZE', self.max_pending)
+        self.retention = app.config.get('REPORT_JOB_RETENTION', self.retention)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self.output_dir = app.config.get('REPORT_OUTPUT_DIR') or os.path.join(app.instance_path, 'reports')
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _get_executor(self):
+        # A pool created before a fork is unusable in the child; make one per process
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def render_async(self, fn, *args):
+        """Run a render function on the shared pool without job bookkeeping; returns its future.
+
+        Takes one of the same ``max_pending`` slots as ``submit`` until the
+        render finishes, and raises ``QueueFull`` when none is free.
+        """
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise QueueFull(f'{self.max_pending} report jobs already pending')
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda done: self._slots.release())
+        return future
+
+    def path_for(self, job_id):
+        return os.path.join(self.output_dir, f'{job_id}.pdf')
+
+    def meta_path(self, job_id):
+        return os.path.join(self.output_dir, f'{job_id}.json')
+
+    def _write_meta(self, job):
+        meta = job.to_dict()
+        meta['session_id'] = job.session_id
+        meta['report_type'] = job.report_type
+        path = self.meta_path(job.job_id)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write metadata for report job {job.job_id}: {e}")
+
+    def _read_meta(self, job_id):
+        try:
+            with open(self.meta_path(job_id)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = ReportJob(job_id, meta.get('session_id'), meta.get('title'), meta.get('report_type'),
+                        meta.get('report_id'))
+        for field in ('status', 'error', 'size', 'created_at', 'finished_at'):
+            setattr(job, field, meta.get(field))
+        return job
+
+    def submit(self, title, content, report_type, session_id, report_id=None):
+        """Queue a report for rendering and return its job without waiting.
+
+        Raises ``QueueFull`` when ``max_pending`` jobs are already in flight.
+        """
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise QueueFull(f'{self.max_pending} report jobs already pending')
+
+        job = ReportJob(uuid.uuid4().hex, session_id, title, report_type, report_id)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._write_meta(job)
+
+        try:
+            future = self._get_executor().submit(render_to_file, title, content, report_type,
+                                                 self.path_for(job.job_id))
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+            self._remove_files(job.job_id)
+            raise
+
+        job.future = future
+        future.add_done_callback(lambda done: self._finish(job, done))
+        self.submitted += 1
+        return job
+
+    def _finish(self, job, future):
+        try:
+            job.size = future.result()
+            job.status = DONE
+            self.completed += 1
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            self.failed += 1
+            logger.error(f"Report job {job.job_id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            self._write_meta(job)
+            metrics.observe('labmate_report_job_seconds', job.finished_at - job.created_at, (('status', job.status),))
+            self._slots.release()
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.status in (DONE, FAILED)]
+        excess = len(self._jobs) - self.retention
+        for job in sorted(finished, key=lambda job: job.finished_at or 0)[:max(0, excess)]:
+            del self._jobs[job.job_id]
+            self._remove_files(job.job_id)
+
+    def _remove_files(self, job_id):
+        for path in (self.path_for(job_id), self.meta_path(job_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, job_id, session_id):
+        """Return the job for this session, or ``None``.
+
+        Jobs submitted by another worker process are read from their
+        metadata file, so they report ``queued`` until that worker finishes.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            if job.session_id != session_id:
+                return None
+            if job.status == QUEUED and job.future is not None and job.future.running():
+                job.status = RUNNING
+            return job
+        if len(job_id) == 32 and job_id.isalnum():
+            job = self._read_meta(job_id)
+            if job is not None and job.session_id == session_id:
+                return job
+        return None
+
+    def pending(self):
+        return sum(1 for job in self._jobs.values() if job.status in (QUEUED, RUNNING))
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending(),
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed,
+        }
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+report_jobs = ReportJobQueue()
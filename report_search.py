@@ -0,0 +1,379 @@
+"""Full-text search over lab report titles and content.
+
+Search uses SQLite FTS5 where it is available and falls back to an
+in-memory BM25 index elsewhere. Both backends answer the same queries with
+the same tokenization (Unicode words, case- and accent-insensitive; the
+last word also matches as a prefix, for search-as-you-type):
+
+- ``fts5``: a contentless SQLite FTS5 table, ``lab_report_fts``, keyed by
+  ``lab_report.id``. Bodies are stored compressed (see ``report_storage``),
+  so the index is always fed decoded text rather than reading the column
+  itself. ``upgrade_schema`` creates it and ``flask index-reports``
+  backfills it. A mapper event adds each new LabReport in the same flush,
+  so the index commits or rolls back with the report. Reports are never
+  edited or deleted in place; ``flask index-reports`` rebuilds the index if
+  that changes.
+- ``python``: an in-memory inverted index with BM25 ranking, for databases
+  without FTS5 (another dialect, or a SQLite build without it). Each process
+  builds it lazily. Before every search it catches up by primary key
+  (``id > last indexed id``), which also picks up reports inserted by other
+  workers.
+
+Results are ranked by BM25, with title matches weighted above content
+matches. Snippets are built in Python for the returned page only, from the
+densest window of matching words, HTML-escaped with the matches wrapped in
+``<mark>``.
+"""
+import bisect
+import html
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from sqlalchemy import DateTime, bindparam, event, text
+
+from report_storage import CompressedText
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'lab_report_fts'
+TITLE_WEIGHT = 10.0
+SNIPPET_TOKENS = 12
+BATCH_SIZE = 1000
+
+# Private-use markers survive HTML escaping
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def fold(value):
+    """Lower-case and strip accents, like FTS5's ``remove_diacritics 2``."""
+    decomposed = unicodedata.normalize('NFKD', value.casefold())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(value):
+    return WORD_RE.findall(fold(value or ''))
+
+
+def parse_query(query):
+    """Return ``(terms, prefix)``: the query's words and whether the last is a prefix."""
+    terms = tokenize(query)
+    # A trailing space means the last word is complete
+    return terms, bool(terms) and not query[-1:].isspace()
+
+
+def fts_match(terms, prefix):
+    """Build an FTS5 MATCH expression; every word is quoted so input is never syntax."""
+    parts = [f'"{term}"' for term in terms]
+    if prefix:
+        parts[-1] += '*'
+    return ' '.join(parts)
+
+
+def render_snippet(marked):
+    """Escape text carrying ``MARK_START``/``MARK_END`` and turn the markers into ``<mark>``."""
+    return html.escape(marked).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def make_snippet(content, terms, prefix, size=SNIPPET_TOKENS):
+    """Pick the ``size``-word window of ``content`` with the most matches and mark them."""
+    words = [(match.start(), match.end(), fold(match.group())) for match in WORD_RE.finditer(content)]
+    if not words:
+        return ''
+    exact = set(terms[:-1] if prefix else terms)
+    stem = terms[-1] if prefix else None
+
+    def matches(word):
+        return word in exact or (stem is not None and word.startswith(stem))
+
+    hits = [matches(word) for _, _, word in words]
+    best_start, best_count, count = 0, -1, 0
+    for i, hit in enumerate(hits):
+        count += hit
+        if i >= size:
+            count -= hits[i - size]
+        if i >= size - 1 or i == len(hits) - 1:
+            if count > best_count:
+                best_start, best_count = max(0, i - size + 1), count
+    window = range(best_start, min(len(words), best_start + size))
+
+    pieces = ['…' if best_start > 0 else '']
+    position = words[window[0]][0]
+    for i in window:
+        start, end, _ = words[i]
+        pieces.append(content[position:start])
+        word = content[start:end]
+        pieces.append(f'{MARK_START}{word}{MARK_END}' if hits[i] else word)
+        position = end
+    if window[-1] < len(words) - 1:
+        pieces.append('…')
+    return render_snippet(''.join(pieces))
+
+
+class InvertedIndex:
+    """In-memory BM25 index of LabReport rows, kept current by primary key.
+
+    Postings are grouped by session, so a search only walks the searching
+    session's reports; document frequencies stay global.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings = defaultdict(lambda: defaultdict(dict))
+        self.frequencies = defaultdict(int)
+        self.lengths = {}
+        self.total_length = 0
+        self.last_id = 0
+        self._vocabulary = None
+        self._lock = threading.Lock()
+
+    def add(self, report_id, title, content, session_id):
+        weighted = defaultdict(float)
+        for term in tokenize(title):
+            weighted[term] += TITLE_WEIGHT
+        for term in tokenize(content):
+            weighted[term] += 1.0
+        length = sum(weighted.values())
+        for term, frequency in weighted.items():
+            if term not in self.postings:
+                self._vocabulary = None
+            self.postings[term][session_id][report_id] = frequency
+            self.frequencies[term] += 1
+        self.lengths[report_id] = length
+        self.total_length += length
+        self.last_id = max(self.last_id, report_id)
+
+    def catch_up(self, session):
+        """Index reports inserted since the last call; returns how many were added."""
+        added = 0
+        with self._lock:
+            while True:
+                rows = session.execute(
+                    text('SELECT id, title, content, session_id FROM lab_report '
+                         'WHERE id > :last_id ORDER BY id LIMIT :limit').columns(content=CompressedText),
+                    {'last_id': self.last_id, 'limit': BATCH_SIZE}
+                ).all()
+                for row in rows:
+                    self.add(*row)
+                added += len(rows)
+                if len(rows) < BATCH_SIZE:
+                    return added
+
+    def _expand(self, stem):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, stem)
+        end = bisect.bisect_left(vocabulary, stem + '\U0010ffff')
+        return vocabulary[start:end]
+
+    def search(self, terms, prefix, session_id):
+        """Return ``[(report_id, score)]`` for the session, best first."""
+        if not terms:
+            return []
+        with self._lock:
+            groups = [[term] for term in (terms[:-1] if prefix else terms)]
+            if prefix:
+                groups.append(self._expand(terms[-1]))
+
+            documents = len(self.lengths) or 1
+            average = self.total_length / documents or 1.0
+            scores = None
+            for group in groups:
+                group_scores = defaultdict(float)
+                for term in group:
+                    by_session = self.postings.get(term)
+                    postings = by_session.get(session_id) if by_session else None
+                    if not postings:
+                        continue
+                    frequency_in_corpus = self.frequencies[term]
+                    idf = math.log(1 + (documents - frequency_in_corpus + 0.5) / (frequency_in_corpus + 0.5))
+                    for report_id, frequency in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self.lengths[report_id] / average)
+                        group_scores[report_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+                if scores is None:
+                    scores = group_scores
+                else:
+                    scores = {report_id: score + group_scores[report_id]
+                              for report_id, score in scores.items() if report_id in group_scores}
+                if not scores:
+                    return []
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+class ReportSearch:
+    def __init__(self, backend='auto'):
+        self.requested = backend
+        self.index = InvertedIndex()
+        self._fts = None
+        self.searches = 0
+
+    def init_app(self, app):
+        """Read the backend choice and keep the FTS table in sync with inserts."""
+        from models import LabReport
+        self.requested = app.config.get('REPORT_SEARCH_BACKEND', self.requested)
+        if not event.contains(LabReport, 'after_insert', self._after_insert):
+            event.listen(LabReport, 'after_insert', self._after_insert)
+
+    @staticmethod
+    def _has_fts_table(connection):
+        return connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).first() is not None
+
+    @staticmethod
+    def fts5_available(connection):
+        if connection.dialect.name != 'sqlite':
+            return False
+        try:
+            connection.exec_driver_sql('CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)')
+            connection.exec_driver_sql('DROP TABLE temp.fts5_probe')
+            return True
+        except Exception:
+            return False
+
+    def uses_fts(self, connection):
+        """True when searches go to the FTS5 table; decided once per process."""
+        if self._fts is None:
+            if self.requested == 'python' or connection.dialect.name != 'sqlite':
+                self._fts = False
+            else:
+                self._fts = self._has_fts_table(connection)
+                if not self._fts and self.requested == 'fts5':
+                    logger.warning(f"{FTS_TABLE} is missing; run `flask upgrade-db`. Using the Python index")
+        return self._fts
+
+    @property
+    def backend(self):
+        return {None: 'unknown', True: 'fts5', False: 'python'}[self._fts]
+
+    def create_fts_table(self, connection):
+        """Create the FTS5 table if possible; returns True if it was created now."""
+        if self.requested == 'python' or not self.fts5_available(connection):
+            return False
+        if self._has_fts_table(connection):
+            # The index must be contentless: lab_report.content holds
+            # compressed bytes, so a table reading it would index those
+            sql = connection.execute(
+                text("SELECT sql FROM sqlite_master WHERE name = :name"), {'name': FTS_TABLE}
+            ).scalar()
+            if "content=''" in sql:
+                return False
+            connection.exec_driver_sql(f'DROP TABLE {FTS_TABLE}')
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"title, content, content='', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        self._fts = None
+        return True
+
+    def rebuild(self, connection):
+        """Re-index every report; returns ``(backend, report count)``."""
+        if self.uses_fts(connection):
+            connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+            count = 0
+            last_id = 0
+            while True:
+                rows = connection.execute(
+                    text('SELECT id, title, content FROM lab_report WHERE id > :last_id ORDER BY id LIMIT :limit')
+                    .columns(content=CompressedText),
+                    {'last_id': last_id, 'limit': BATCH_SIZE}
+                ).all()
+                if rows:
+                    connection.execute(
+                        text(f'INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (:id, :title, :content)'),
+                        [{'id': row_id, 'title': title, 'content': content} for row_id, title, content in rows]
+                    )
+                    count += len(rows)
+                    last_id = rows[-1][0]
+                if len(rows) < BATCH_SIZE:
+                    return 'fts5', count
+        self.index = InvertedIndex()
+        from app import db
+        self.index.catch_up(db.session)
+        return 'python', len(self.index.lengths)
+
+    def _after_insert(self, mapper, connection, target):
+        if self.uses_fts(connection):
+            connection.execute(
+                text(f'INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (:id, :title, :content)'),
+                {'id': target.id, 'title': target.title, 'content': target.content}
+            )
+
+    def search(self, session_id, query, page=1, per_page=20):
+        """Return ``(total, results)`` for one page of ``query`` in ``session_id``'s reports.
+
+        Each result is a dict with ``id``, ``title``, ``report_type``,
+        ``created_at``, ``score`` and an HTML ``snippet``.
+        """
+        from app import db
+        self.searches += 1
+        terms, prefix = parse_query(query)
+        if not terms:
+            return 0, []
+        offset = (page - 1) * per_page
+        session = db.session
+
+        if self.uses_fts(session.connection()):
+            params = {'match': fts_match(terms, prefix), 'session_id': session_id}
+            # CROSS JOIN keeps the full-text match as the outer loop; otherwise
+            # SQLite may walk the session's reports and re-run the match per row.
+            # Only ids and scores are sorted; the page's rows are fetched below.
+            where = f'{FTS_TABLE} MATCH :match AND r.session_id = :session_id'
+            # bm25() cannot share a SELECT with a window function, hence the subquery
+            rows = session.execute(text(
+                f'SELECT id, rank, count(*) OVER () FROM ('
+                f'SELECT r.id AS id, bm25({FTS_TABLE}, {TITLE_WEIGHT}, 1.0) AS rank '
+                f'FROM {FTS_TABLE} CROSS JOIN lab_report r ON r.id = {FTS_TABLE}.rowid WHERE {where}'
+                f') ORDER BY rank, id DESC LIMIT :limit OFFSET :offset'
+            ), dict(params, limit=per_page, offset=offset)).all()
+            if rows:
+                total = rows[0][2]
+            else:
+                # Past the last page; count separately so pagination stays correct
+                total = session.execute(text(
+                    f'SELECT count(*) FROM {FTS_TABLE} CROSS JOIN lab_report r '
+                    f'ON r.id = {FTS_TABLE}.rowid WHERE {where}'
+                ), params).scalar()
+            page_ids = [(report_id, -rank) for report_id, rank, _ in rows]
+        else:
+            self.index.catch_up(session)
+            ranked = self.index.search(terms, prefix, session_id)
+            total = len(ranked)
+            page_ids = ranked[offset:offset + per_page]
+
+        if not page_ids:
+            return total, []
+        rows = {row[0]: row for row in session.execute(
+            text('SELECT id, title, report_type, created_at, content FROM lab_report WHERE id IN :ids')
+            .bindparams(bindparam('ids', expanding=True)).columns(created_at=DateTime, content=CompressedText),
+            {'ids': [report_id for report_id, _ in page_ids]}
+        )}
+        return total, [{
+            'id': report_id,
+            'title': rows[report_id][1],
+            'report_type': rows[report_id][2],
+            'created_at': rows[report_id][3],
+            'score': round(score, 4),
+            'snippet': make_snippet(rows[report_id][4], terms, prefix),
+        } for report_id, score in page_ids if report_id in rows]
+
+    def stats(self):
+        return {
+            'backend': self.backend,
+            'searches': self.searches,
+            'python_index_reports': len(self.index.lengths),
+            'python_index_terms': len(self.index.postings),
+        }
+
+
+report_search = ReportSearch()
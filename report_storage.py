@@ -0,0 +1,133 @@
+"""Compact storage of lab report bodies.
+
+``LabReport.content`` is a ``CompressedText`` column. On SQLite, bodies of
+``MIN_BYTES`` or more are stored as a zlib BLOB that starts with ``MARKER``.
+Rows written before compression (plain TEXT) and short bodies are read back
+unchanged, so old and new rows can live in the same table. Other databases
+keep plain text, since their TEXT columns cannot hold bytes.
+
+``LabReport.summary`` is a short plain-text preview computed when the row is
+inserted, so list views can show a report without loading its body; the
+body column is deferred. ``compact()``, run by ``upgrade_schema`` when the
+column is added and by ``flask compact-reports``, fills in summaries for
+older rows and compresses their bodies.
+"""
+import re
+import zlib
+
+from sqlalchemy import Text, bindparam, func, or_, select, update
+from sqlalchemy.types import TypeDecorator
+
+MARKER = b'LZ1\x00'
+MIN_BYTES = 256
+LEVEL = 6
+SUMMARY_LENGTH = 200
+BATCH_SIZE = 500
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def compress_body(text):
+    """Return ``text`` as marked zlib bytes, or unchanged when compressing does not pay."""
+    raw = text.encode('utf-8')
+    if len(raw) < MIN_BYTES:
+        return text
+    packed = MARKER + zlib.compress(raw, LEVEL)
+    return packed if len(packed) < len(raw) else text
+
+
+def decompress_body(value):
+    """Inverse of ``compress_body``; plain text (older rows) passes through."""
+    if isinstance(value, (bytes, memoryview)):
+        value = bytes(value)
+        if value.startswith(MARKER):
+            return zlib.decompress(value[len(MARKER):]).decode('utf-8')
+        return value.decode('utf-8')
+    return value
+
+
+def make_summary(content, length=SUMMARY_LENGTH):
+    """First ``length`` characters of ``content`` on one line, cut at a word boundary."""
+    flat = WHITESPACE_RE.sub(' ', content or '').strip()
+    if len(flat) <= length:
+        return flat
+    cut = flat[:length].rsplit(' ', 1)[0] or flat[:length]
+    return cut.rstrip(' .,;:') + '…'
+
+
+def summary_default(context):
+    """Column default for ``LabReport.summary``; works for ORM and Core inserts."""
+    return make_summary(context.get_current_parameters().get('content'))
+
+
+class CompressedText(TypeDecorator):
+    """Text stored zlib-compressed on SQLite; see the module docstring."""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not report_storage.compress or dialect.name != 'sqlite':
+            return value
+        stored = compress_body(value)
+        if stored is not value:
+            report_storage.compressed += 1
+        return stored
+
+    def process_result_value(self, value, dialect):
+        return decompress_body(value)
+
+
+class ReportStorage:
+    def __init__(self):
+        self.compress = True
+        self.compressed = 0
+
+    def init_app(self, app):
+        self.compress = app.config.get('REPORT_COMPRESSION', True)
+
+    def compact(self, batch_size=BATCH_SIZE):
+        """Fill in missing summaries and compress plain-text bodies.
+
+        Rows are rewritten in id order, one transaction per batch, so a
+        large table never holds the write lock for long. Returns the number
+        of rows rewritten.
+        """
+        from app import db
+        from models import LabReport
+        table = LabReport.__table__
+
+        pending = table.c.summary.is_(None)
+        if self.compress and db.engine.dialect.name == 'sqlite':
+            pending = or_(pending, (func.typeof(table.c.content) == 'text')
+                          & (func.length(table.c.content) >= MIN_BYTES))
+        rewrite = update(table).where(table.c.id == bindparam('row_id')).values(
+            content=bindparam('new_content', type_=CompressedText()),
+            summary=bindparam('new_summary')
+        )
+
+        # Through the session: with a single writer connection a second
+        # connection from the engine would wait for this one
+        rewritten = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(table.c.id, table.c.content)
+                .where(pending, table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                db.session.commit()
+                return rewritten
+            db.session.execute(rewrite, [
+                {'row_id': row_id, 'new_content': content, 'new_summary': make_summary(content)}
+                for row_id, content in rows
+            ])
+            db.session.commit()
+            rewritten += len(rows)
+            last_id = rows[-1][0]
+
+    def stats(self):
+        return {'compression': self.compress, 'compressed_writes': self.compressed}
+
+
+report_storage = ReportStorage()
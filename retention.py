@@ -0,0 +1,254 @@
+"""Activity log retention: rollup, archival and batched deletion.
+
+``compact`` moves ActivityLog rows older than the retention window out of the
+live table. Each batch of rows is
+1. appended to a gzip NDJSON archive, one file per month
+   (``activity-YYYY-MM.ndjson.gz``, same fields as ``flask export activity``),
+2. counted into ``ActivityRollup`` per session, day and action_type, and
+3. deleted,
+with steps 2 and 3 committed together so the counters never disagree with
+the raw rows. Batches are small, short transactions so live traffic keeps
+writing in between.
+
+The cutoff is aligned to a UTC midnight, so a day is either fully compacted
+or untouched. Session totals in ``SessionStats``/``SessionDailyStats`` are
+unaffected by compaction, and ``session_stats.rebuild`` counts rollups.
+
+Archives are written at-least-once: if the process dies after a batch is
+archived but before it is committed, the batch is archived again on the next
+run. Every archived row carries its id, so duplicates are easy to drop.
+"""
+import gzip
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, delete, or_, select
+
+from app import db
+from exports import EXPORTS, generate_ndjson
+from models import ActivityLog, ActivityRollup
+from session_stats import upsert
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = EXPORTS['activity'][2]
+
+
+class CompactionRunning(Exception):
+    """Raised when another process is already compacting into the same archive directory."""
+
+
+def retention_cutoff(retention_days, now=None):
+    """Return the UTC midnight before which activity is compacted."""
+    now = now or datetime.utcnow()
+    return datetime.combine((now - timedelta(days=retention_days)).date(), datetime.min.time())
+
+
+def archive_path(archive_dir, when):
+    return os.path.join(archive_dir, f'activity-{when:%Y-%m}.ndjson.gz')
+
+
+@contextmanager
+def compaction_lock(archive_dir):
+    """Hold an exclusive, non-blocking lock so two processes never compact at once."""
+    os.makedirs(archive_dir, exist_ok=True)
+    with open(os.path.join(archive_dir, '.compaction.lock'), 'w') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise CompactionRunning(f'Compaction already running in {archive_dir}')
+        yield
+
+
+def _archive(archive_dir, rows):
+    """Append rows to their monthly archive files and fsync them."""
+    by_month = defaultdict(list)
+    for row in rows:
+        by_month[(row.timestamp.year, row.timestamp.month)].append(row)
+    for rows_in_month in by_month.values():
+        path = archive_path(archive_dir, rows_in_month[0].timestamp)
+        # Each batch is appended as its own gzip member; gzip readers concatenate them
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for chunk in generate_ndjson('activity', rows_in_month):
+                    f.write(chunk.encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+    return len(by_month)
+
+
+def _roll_up(rows):
+    """Add one batch of rows to the ActivityRollup counters."""
+    grouped = {}
+    for row in rows:
+        key = (row.session_id, row.timestamp.date(), row.action_type)
+        entry = grouped.get(key)
+        if entry is None:
+            grouped[key] = [1, row.timestamp, row.timestamp]
+        else:
+            entry[0] += 1
+            entry[1] = min(entry[1], row.timestamp)
+            entry[2] = max(entry[2], row.timestamp)
+
+    table = ActivityRollup.__table__
+    for (session_id, day, action_type), (count, first_at, last_at) in grouped.items():
+        stmt = upsert(ActivityRollup).values(
+            session_id=session_id, day=day, action_type=action_type,
+            count=count, first_at=first_at, last_at=last_at
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.session_id, table.c.day, table.c.action_type],
+            set_={
+                'count': table.c.count + count,
+                'first_at': case(
+                    (or_(table.c.first_at.is_(None), table.c.first_at > stmt.excluded.first_at),
+                     stmt.excluded.first_at),
+                    else_=table.c.first_at
+                ),
+                'last_at': case(
+                    (or_(table.c.last_at.is_(None), table.c.last_at < stmt.excluded.last_at),
+                     stmt.excluded.last_at),
+                    else_=table.c.last_at
+                ),
+            }
+        ))
+    return len(grouped)
+
+
+def compact(retention_days, archive_dir, batch_size=1000, pause=0.0, dry_run=False, now=None):
+    """Roll up, archive and delete ActivityLog rows older than ``retention_days``.
+
+    Returns a summary dict. With ``dry_run`` only counts what would be compacted.
+    Raises ``CompactionRunning`` if another process holds the archive lock.
+    """
+    cutoff = retention_cutoff(retention_days, now)
+    summary = {'cutoff': cutoff.isoformat(), 'rows': 0, 'batches': 0, 'rollup_rows': 0, 'archive_writes': 0}
+    columns = [getattr(ActivityLog, field) for field in ARCHIVE_FIELDS]
+
+    if dry_run:
+        summary['rows'] = ActivityLog.query.filter(ActivityLog.timestamp < cutoff).count()
+        return summary
+
+    with compaction_lock(archive_dir):
+        last_id = 0
+        while True:
+            # Walk the primary key instead of sorting by timestamp: old rows sit
+            # at the low ids, so this needs no extra index on the hot table
+            rows = db.session.execute(
+                select(*columns)
+                .where(ActivityLog.id > last_id, ActivityLog.timestamp < cutoff)
+                .order_by(ActivityLog.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            summary['archive_writes'] += _archive(archive_dir, rows)
+            try:
+                summary['rollup_rows'] += _roll_up(rows)
+                db.session.execute(delete(ActivityLog).where(ActivityLog.id.in_([row.id for row in rows])))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            summary['rows'] += len(rows)
+            summary['batches'] += 1
+            if pause:
+                time.sleep(pause)
+
+    if summary['rows']:
+        logger.info(f"Compacted {summary['rows']} activity row(s) older than {cutoff:%Y-%m-%d} "
+                    f"in {summary['batches']} batch(es)")
+    return summary
+
+
+class RetentionScheduler:
+    """Runs ``compact`` every ``interval`` seconds in a background thread.
+
+    Disabled unless ``ACTIVITY_RETENTION_INTERVAL`` is set. The thread is
+    started lazily by the first request in each process; the archive lock
+    makes sure only one process compacts at a time.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.interval = None
+        self.retention_days = 90
+        self.archive_dir = None
+        self.batch_size = 1000
+        self.pause = 0.05
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.runs = 0
+        self.skipped = 0
+        self.failed = 0
+        self.compacted = 0
+        self.last_run_at = None
+
+    def init_app(self, app):
+        """Read retention settings from ``app.config``; starts nothing unless an interval is set."""
+        self.app = app
+        self.retention_days = app.config.get('ACTIVITY_RETENTION_DAYS', self.retention_days)
+        self.archive_dir = (app.config.get('ACTIVITY_ARCHIVE_DIR')
+                            or os.path.join(app.instance_path, 'activity_archive'))
+        self.batch_size = app.config.get('ACTIVITY_RETENTION_BATCH_SIZE', self.batch_size)
+        self.pause = app.config.get('ACTIVITY_RETENTION_PAUSE', self.pause)
+        self.interval = app.config.get('ACTIVITY_RETENTION_INTERVAL')
+        if self.interval:
+            app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so start (or restart) lazily per process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='activity-retention', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.run_once()
+
+    def run_once(self):
+        with self.app.app_context():
+            try:
+                summary = compact(self.retention_days, self.archive_dir, self.batch_size, self.pause)
+                self.compacted += summary['rows']
+                self.runs += 1
+            except CompactionRunning:
+                self.skipped += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Activity log compaction failed: {e}")
+            finally:
+                self.last_run_at = time.time()
+
+    def stats(self):
+        return {
+            'enabled': bool(self.interval),
+            'retention_days': self.retention_days,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'compacted': self.compacted,
+        }
+
+
+retention = RetentionScheduler()
@@ -1,23 +1,49 @@
 import json
 import os
-from flask import render_template, request, jsonify, session, redirect, url_for, make_response, flash
-from datetime import datetime, timedelta
-from app import app, db
+from flask import Blueprint, current_app, render_template, request, jsonify, session, redirect, url_for, make_response, flash, send_file, Response, stream_with_context
+from datetime import datetime
+from app import db
 from models import ActivityLog, Calculation, LabReport
-from utils import generate_pdf_report, calculate_reagent_mass, get_chemical_data, log_activity
+import queries
+import session_stats
+from voice_grammar import parse_command
+from report_jobs import report_jobs, QueueFull
+from report_cache import report_cache, cache_key, stream_file
+from bundles import bundle_store, FORMATS as BUNDLE_FORMATS
+from report_search import report_search
+from data_files import CachedJsonFile
+from pagination import keyset_page, InvalidCursor
+from instrumentation import instrumentation
+from exports import EXPORTS, FORMATS as EXPORT_FORMATS, generate_export, parse_bound
+from utils import calculate_reagent_masses, get_chemical_data, find_chemical, log_activity, build_activity, volume_to_liters
+from chemical_registry import registry
+from chemical_search import get_search_engine
+from hazard_index import get_hazard_index
+from activity_buffer import activity_buffer
+from calculations import calculation_cache, store_calculation
+from events import event_hub, stats_payload, TooManySubscribers, POLL_ENDPOINTS
+from unit_of_work import unit_of_work
+from storage import read_only, use_reader
 import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from sqlalchemy import insert
 
-@app.before_request
+bp = Blueprint('main', __name__)
+
+@bp.before_app_request
 def before_request():
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
     
     # Check if user is logged in for protected routes
-    protected_routes = ['dashboard', 'calculator', 'msds', 'safety', 'documentation', 'activity_logs', 'profile']
+    protected_routes = ['main.dashboard', 'main.calculator', 'main.msds', 'main.safety', 'main.documentation',
+                        'main.activity_logs', 'main.profile']
     if request.endpoint in protected_routes and 'user_name' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         user_name = request.form.get('user_name', '').strip()
@@ -38,11 +64,11 @@ def login():
         log_activity('authentication', f'User {user_name} ({lab_role}) logged in')
         
         flash(f'Welcome to LabMate AI, {user_name}!', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     if 'user_name' in session:
         user_name = session['user_name']
@@ -50,9 +76,9 @@ def logout():
     
     session.clear()
     flash('You have been logged out successfully.', 'info')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/profile', methods=['GET', 'POST'])
+@bp.route('/profile', methods=['GET', 'POST'])
 def profile():
     if request.method == 'POST':
         session['user_name'] = request.form.get('user_name', '').strip()
@@ -61,11 +87,13 @@ def profile():
         
         log_activity('profile', 'Updated profile information')
         flash('Profile updated successfully!', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     
+    use_reader()
     # Calculate session statistics
-    total_calculations = Calculation.query.filter_by(session_id=session['session_id']).count()
-    total_activities = ActivityLog.query.filter_by(session_id=session['session_id']).count()
+    stats = session_stats.get_stats(session['session_id'])
+    total_calculations = stats['total_calculations']
+    total_activities = stats['total_activities']
     
     # Calculate session duration
     session_duration = "Not available"
@@ -84,28 +112,26 @@ def profile():
                          total_activities=total_activities,
                          session_duration=session_duration)
 
-@app.route('/')
+@bp.route('/')
+@read_only
 def dashboard():
     # Get recent activity
-    recent_activity = ActivityLog.query.filter_by(session_id=session['session_id']).order_by(ActivityLog.timestamp.desc()).limit(5).all()
+    recent_activity = queries.recent_activity(session['session_id'], 5).all()
     
     # Get today's statistics
-    today = datetime.utcnow().date()
-    calculations_today = Calculation.query.filter(
-        Calculation.session_id == session['session_id'],
-        Calculation.timestamp >= today
-    ).count()
-    
-    total_activities = ActivityLog.query.filter_by(session_id=session['session_id']).count()
+    stats = session_stats.get_stats(session['session_id'])
+    calculations_today = stats['calculations_today']
+    total_activities = stats['total_activities']
     
     return render_template('dashboard.html', 
                          recent_activity=recent_activity,
                          calculations_today=calculations_today,
                          total_activities=total_activities)
 
-@app.route('/api/recent_activity')
+@bp.route('/api/recent_activity')
+@read_only
 def api_recent_activity():
-    recent_activity = ActivityLog.query.filter_by(session_id=session['session_id']).order_by(ActivityLog.timestamp.desc()).limit(10).all()
+    recent_activity = queries.recent_activity(session['session_id'], 10).all()
     activities = []
     for activity in recent_activity:
         activities.append({
@@ -115,22 +141,76 @@ def api_recent_activity():
         })
     return jsonify(activities)
 
-@app.route('/api/stats')
+@bp.route('/api/stats')
+@read_only
 def api_stats():
-    today = datetime.utcnow().date()
-    calculations_today = Calculation.query.filter(
-        Calculation.session_id == session['session_id'],
-        Calculation.timestamp >= today
-    ).count()
-    
-    total_activities = ActivityLog.query.filter_by(session_id=session['session_id']).count()
+    stats = session_stats.get_stats(session['session_id'])
     
     return jsonify({
-        'calculations_today': calculations_today,
-        'total_activities': total_activities
+        'calculations_today': stats['calculations_today'],
+        'total_activities': stats['total_activities']
     })
 
-@app.route('/voice_command', methods=['POST'])
+@bp.route('/api/events')
+@read_only
+def api_events():
+    """Server-sent events: pushes new activity and updated stats for this session."""
+    try:
+        subscription = event_hub.subscribe(session['session_id'])
+    except TooManySubscribers as e:
+        response = jsonify({'error': str(e), 'poll': POLL_ENDPOINTS})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    
+    initial_stats = stats_payload(session_stats.get_stats(session['session_id']))
+    response = Response(event_hub.stream(subscription, initial_stats), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/api/events/stats')
+def api_event_stats():
+    return jsonify(event_hub.stats())
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/activity_buffer/stats')
+def api_activity_buffer_stats():
+    return jsonify(activity_buffer.stats())
+
+@bp.route('/api/calculations/cache')
+def api_calculation_cache_stats():
+    return jsonify(calculation_cache.stats())
+
+@bp.route('/api/chemicals/stats')
+def api_chemical_stats():
+    return jsonify(registry.stats())
+
+@bp.route('/api/chemicals/suggest')
+def api_chemical_suggest():
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    if not query:
+        return jsonify([])
+    return jsonify(get_search_engine().suggest(query, limit=limit))
+
+MAX_HAZARD_CHECK = 1000
+
+@bp.route('/api/hazards/check', methods=['POST'])
+def api_hazard_check():
+    data = request.get_json(silent=True) or {}
+    chemicals = data.get('chemicals')
+    if not isinstance(chemicals, list) or not chemicals:
+        return jsonify({'error': 'Please provide a list of chemicals'}), 400
+    if len(chemicals) > MAX_HAZARD_CHECK:
+        return jsonify({'error': f'A check may contain at most {MAX_HAZARD_CHECK} chemicals'}), 400
+    
+    return jsonify(get_hazard_index().check([str(chemical).strip() for chemical in chemicals]))
+
+@bp.route('/voice_command', methods=['POST'])
 def voice_command():
     try:
         data = request.get_json()
@@ -183,98 +263,13 @@ def voice_command():
             
     except Exception as e:
         import traceback
-        app.logger.error(f"Voice command error: {str(e)}\n{traceback.format_exc()}")
+        unit_of_work.rollback()
+        current_app.logger.error(f"Voice command error: {str(e)}\n{traceback.format_exc()}")
         return jsonify({'success': False, 'error': 'Sorry, there was an error processing your command'})
 
 def parse_lab_command(command):
     """Parse laboratory voice commands into structured data"""
-    import re
-    
-    # Calculation patterns - enhanced for better voice recognition
-    calc_patterns = [
-        r'calculate\s+(\d*\.?\d+)\s*(m|molar|molarity|molecular)?\s*(\w+)\s+for\s+(\d+)\s*(ml|l|liter|milliliters?)',
-        r'calculate\s+(\d*\.?\d+)\s*(m|molar|molarity|molecular)?\s*of\s+(\w+)\s+for\s+(\d+)\s*(ml|l|liter|milliliters?)',
-        r'calculate\s+(\d*\.?\d+)\s*(m|molar|molarity|molecular)?\s*(\w+)',
-        r'prepare\s+(\d+)\s*(ml|l|liter|milliliters?)\s+of\s+(\d*\.?\d+)\s*(m|molar|molarity|molecular)?\s*(\w+)',
-        r'make\s+(\d*\.?\d+)\s*(m|molar|molarity|molecular)?\s*(\w+)\s+solution\s+(\d+)\s*(ml|l|liter|milliliters?)',
-        r'make\s+(\d*\.?\d+)\s*(m|molar|molarity|molecular)?\s*of\s+(\w+)',
-        r'(\d*\.?\d+)\s*(m|molar|molarity|molecular)?\s*(\w+)\s+in\s+(\d+)\s*(ml|l|liter|milliliters?)',
-        r'(\d*\.?\d+)\s*(m|molar|molarity|molecular)?\s*of\s+(\w+)'
-    ]
-    
-    for pattern in calc_patterns:
-        match = re.search(pattern, command, re.IGNORECASE)
-        if match:
-            groups = match.groups()
-            
-            # Default values
-            molarity = 1.0
-            chemical = None
-            volume = 250.0  # Default to 250ml
-            
-            # Enhanced parsing logic
-            try:
-                # Find numbers in the groups
-                numbers = [float(g) for g in groups if g and g.replace('.', '').isdigit()]
-                # Find chemical names (non-numeric, non-unit groups)
-                chemicals = [g for g in groups if g and not g.replace('.', '').isdigit() 
-                           and g.lower() not in ['m', 'molar', 'molarity', 'molecular', 'ml', 'l', 'liter', 'milliliters', 'milliliter']]
-                
-                if numbers:
-                    molarity = numbers[0]
-                    if len(numbers) > 1:
-                        volume = numbers[1]
-                
-                if chemicals:
-                    chemical = chemicals[0].strip()
-                
-                # Fallback: try to extract from the original command
-                if not chemical:
-                    # Look for common chemical patterns
-                    chem_match = re.search(r'(nacl|kcl|cacl2|h2so4|hcl|naoh|mgso4)', command, re.IGNORECASE)
-                    if chem_match:
-                        chemical = chem_match.group(1)
-                
-            except (ValueError, IndexError):
-                # Fallback parsing
-                if len(groups) >= 3:
-                    try:
-                        molarity = float(groups[0]) if groups[0] and groups[0].replace('.', '').isdigit() else 1.0
-                        chemical = groups[2] if groups[2] else 'NaCl'
-                        volume = float(groups[3]) if len(groups) > 3 and groups[3] and groups[3].replace('.', '').isdigit() else 250.0
-                    except:
-                        molarity, chemical, volume = 1.0, 'NaCl', 250.0
-            
-            return {
-                'action': 'calculation',
-                'chemical': chemical or 'NaCl',
-                'molarity': molarity,
-                'volume': volume
-            }
-    
-    # Navigation patterns
-    nav_patterns = {
-        r'(go to|navigate to|open)\s+(calculator|calc)': '/calculator',
-        r'(go to|navigate to|open)\s+(safety|protocols)': '/safety',
-        r'(go to|navigate to|open)\s+(msds|safety data)': '/msds',
-        r'(go to|navigate to|open)\s+(documentation|docs|reports)': '/documentation',
-        r'(go to|navigate to|open)\s+(dashboard|home)': '/',
-        r'(go to|navigate to|open)\s+(activity|logs)': '/activity_logs'
-    }
-    
-    for pattern, url in nav_patterns.items():
-        if re.search(pattern, command, re.IGNORECASE):
-            return {
-                'action': 'navigation',
-                'target': url.split('/')[-1] or 'dashboard',
-                'url': url
-            }
-    
-    # Help patterns
-    if re.search(r'help|what can you do|commands', command, re.IGNORECASE):
-        return {'action': 'help'}
-    
-    return {'action': 'unknown', 'command': command}
+    return parse_command(command)
 
 def process_calculation_command(parsed_result):
     """Process a parsed calculation command"""
@@ -282,29 +277,25 @@ def process_calculation_command(parsed_result):
         chemical_name = parsed_result['chemical']
         molarity = parsed_result['molarity']
         volume = parsed_result['volume']
+        # The grammar gives millilitres; calculations are in litres
+        volume_liters = volume / 1000.0
         
-        # Get chemical data
-        chemical_data = get_chemical_data(chemical_name)
-        if not chemical_data:
+        # Falls back to the closest match for misheard names
+        result = calculation_cache.calculate(chemical_name, molarity, volume_liters, allow_fuzzy=True)
+        if not result:
             return {
                 'success': False,
                 'error': f'Chemical data not found for {chemical_name}. Please try the full chemical name or formula.'
             }
-        
-        # Calculate mass required
-        mass_required = calculate_reagent_mass(molarity, volume, chemical_data['molecular_weight'])
+        # Fuzzy matches are reported under the matched chemical's name
+        if result.fuzzy:
+            chemical_name = result.chemical_data['name']
+        chemical_data = result.chemical_data
+        mass_required = result.mass_required
         
         # Save calculation
-        calculation = Calculation(
-            chemical_name=chemical_name,
-            molarity=molarity,
-            volume=volume,
-            mass_required=mass_required,
-            molecular_weight=chemical_data['molecular_weight'],
-            session_id=session['session_id']
-        )
-        db.session.add(calculation)
-        db.session.commit()
+        store_calculation(session['session_id'], chemical_name, result, molarity, volume_liters)
+        unit_of_work.after_commit(event_hub.publish_stats, session['session_id'])
         
         # Log activity
         log_activity('voice_calculation', f'Voice calculated {mass_required:.4f}g of {chemical_name}')
@@ -318,18 +309,35 @@ def process_calculation_command(parsed_result):
                 'chemical_name': chemical_name,
                 'molarity': molarity,
                 'volume': volume,
+                'volume_unit': 'ml',
                 'mass_required': mass_required,
                 'molecular_weight': chemical_data['molecular_weight']
             }
         }
         
     except Exception as e:
-        app.logger.error(f"Calculation error: {str(e)}")
+        unit_of_work.rollback()
+        current_app.logger.error(f"Calculation error: {str(e)}")
         return {
             'success': False,
             'error': f'Error calculating: {str(e)}'
         }
 
+MAX_BATCH_COMMANDS = 500
+
+@bp.route('/voice_command/batch', methods=['POST'])
+def voice_command_batch():
+    data = request.get_json(silent=True) or {}
+    commands = data.get('commands')
+    if not isinstance(commands, list) or not commands:
+        return jsonify({'error': 'Please provide a list of commands'}), 400
+    if len(commands) > MAX_BATCH_COMMANDS:
+        return jsonify({'error': f'A batch may contain at most {MAX_BATCH_COMMANDS} commands'}), 400
+    
+    # Parse only: nothing is calculated, saved or logged
+    results = [parse_lab_command(str(command).strip().lower()) for command in commands]
+    return jsonify({'results': results})
+
 def get_voice_help_message():
     """Get help message for voice commands"""
     return """I can help you with laboratory calculations and navigation. Try saying:
@@ -340,42 +348,33 @@ def get_voice_help_message():
     - "Open MSDS lookup"
     """
 
-@app.route('/calculator')
+@bp.route('/calculator')
 def calculator():
     log_activity('navigation', 'Accessed reagent calculator')
     return render_template('calculator.html')
 
-@app.route('/calculate', methods=['POST'])
+@bp.route('/calculate', methods=['POST'])
 def calculate():
     try:
         data = request.get_json() if request.is_json else request.form
         
         chemical_name = data.get('chemical_name', '').strip()
         molarity = float(data.get('molarity', 0))
-        volume = float(data.get('volume', 0))
+        # Volumes are in litres unless volume_unit says otherwise
+        volume = volume_to_liters(data.get('volume', 0), data.get('volume_unit', 'l'))
         
         if not chemical_name or molarity <= 0 or volume <= 0:
             return jsonify({'error': 'Please provide valid chemical name, molarity, and volume'}), 400
         
-        # Get chemical data
-        chemical_data = get_chemical_data(chemical_name)
-        if not chemical_data:
+        cached = calculation_cache.calculate(chemical_name, molarity, volume)
+        if not cached:
             return jsonify({'error': f'Chemical data not found for {chemical_name}'}), 404
-        
-        # Calculate mass required
-        mass_required = calculate_reagent_mass(molarity, volume, chemical_data['molecular_weight'])
+        chemical_data = cached.chemical_data
+        mass_required = cached.mass_required
         
         # Save calculation
-        calculation = Calculation(
-            chemical_name=chemical_name,
-            molarity=molarity,
-            volume=volume,
-            mass_required=mass_required,
-            molecular_weight=chemical_data['molecular_weight'],
-            session_id=session['session_id']
-        )
-        db.session.add(calculation)
-        db.session.commit()
+        store_calculation(session['session_id'], chemical_name, cached, molarity, volume)
+        unit_of_work.after_commit(event_hub.publish_stats, session['session_id'])
         
         # Log activity
         log_activity('calculation', f'Calculated {mass_required:.4f}g of {chemical_name}')
@@ -384,6 +383,7 @@ def calculate():
             'chemical_name': chemical_name,
             'molarity': molarity,
             'volume': volume,
+            'volume_unit': 'l',
             'mass_required': round(mass_required, 4),
             'molecular_weight': chemical_data['molecular_weight'],
             'formula': chemical_data.get('formula', 'N/A'),
@@ -396,23 +396,128 @@ def calculate():
             return render_template('calculator.html', result=result)
             
     except ValueError as e:
-        error_msg = 'Invalid numeric values provided'
+        unit_of_work.rollback()
+        error_msg = str(e) if str(e).startswith('Unknown volume unit') else 'Invalid numeric values provided'
         if request.is_json:
             return jsonify({'error': error_msg}), 400
         return render_template('calculator.html', error=error_msg)
     except Exception as e:
-        app.logger.error(f"Calculation error: {str(e)}")
+        unit_of_work.rollback()
+        current_app.logger.error(f"Calculation error: {str(e)}")
         error_msg = 'An error occurred during calculation'
         if request.is_json:
             return jsonify({'error': error_msg}), 500
         return render_template('calculator.html', error=error_msg)
 
-@app.route('/msds')
+MAX_BATCH_CALCULATIONS = 1000
+
+@bp.route('/calculate_batch', methods=['POST'])
+def calculate_batch():
+    try:
+        data = request.get_json(silent=True) or {}
+        rows = data.get('calculations')
+        if not isinstance(rows, list) or not rows:
+            return jsonify({'error': 'Please provide a list of calculations'}), 400
+        if len(rows) > MAX_BATCH_CALCULATIONS:
+            return jsonify({'error': f'A batch may contain at most {MAX_BATCH_CALCULATIONS} calculations'}), 400
+        
+        # Validate rows and resolve each distinct chemical once
+        errors = []
+        valid = []
+        chemicals = {}
+        for index, row in enumerate(rows):
+            try:
+                chemical_name = str(row.get('chemical_name', '')).strip()
+                molarity = float(row.get('molarity', 0))
+                unit = row.get('volume_unit', 'l')
+                volume = float(row.get('volume', 0))
+            except (AttributeError, TypeError, ValueError):
+                errors.append({'index': index, 'error': 'Invalid numeric values provided'})
+                continue
+            try:
+                volume = volume_to_liters(volume, unit)
+            except ValueError as e:
+                errors.append({'index': index, 'error': str(e)})
+                continue
+            
+            if not chemical_name or molarity <= 0 or volume <= 0:
+                errors.append({'index': index, 'error': 'Please provide valid chemical name, molarity, and volume'})
+                continue
+            
+            if chemical_name not in chemicals:
+                chemicals[chemical_name] = get_chemical_data(chemical_name)
+            if not chemicals[chemical_name]:
+                errors.append({'index': index, 'error': f'Chemical data not found for {chemical_name}'})
+                continue
+            
+            valid.append((index, chemical_name, molarity, volume, chemicals[chemical_name]))
+        
+        results = []
+        if valid:
+            masses = calculate_reagent_masses(
+                [row[2] for row in valid],
+                [row[3] for row in valid],
+                [row[4]['molecular_weight'] for row in valid]
+            )
+            
+            session_id = session['session_id']
+            records = []
+            for (index, chemical_name, molarity, volume, chemical_data), mass_required in zip(valid, masses.tolist()):
+                records.append({
+                    'chemical_name': chemical_name,
+                    'molarity': molarity,
+                    'volume': volume,
+                    'mass_required': mass_required,
+                    'molecular_weight': chemical_data['molecular_weight'],
+                    'session_id': session_id
+                })
+                results.append({
+                    'index': index,
+                    'chemical_name': chemical_name,
+                    'molarity': molarity,
+                    'volume': volume,
+                    'volume_unit': 'l',
+                    'mass_required': round(mass_required, 4),
+                    'molecular_weight': chemical_data['molecular_weight'],
+                    'formula': chemical_data.get('formula', 'N/A'),
+                    'hazards': chemical_data.get('hazards', [])
+                })
+            
+            # One bulk insert plus a single summary log entry, in the request's transaction
+            summary = build_activity(
+                'calculation',
+                f'Batch calculated {len(records)} solutions',
+                json.dumps({'calculated': len(records), 'failed': len(errors)})
+            )
+            unit_of_work.stage(db.session.execute, insert(Calculation), records)
+            db.session.add(summary)
+            session_stats.record_calculations(session_id, len(records))
+            session_stats.record_activities([{'session_id': session_id, 'timestamp': summary.timestamp}])
+            unit_of_work.after_commit(event_hub.publish_activities, [{
+                'session_id': session_id,
+                'action_type': summary.action_type,
+                'description': summary.description,
+                'timestamp': summary.timestamp
+            }])
+        
+        return jsonify({
+            'results': results,
+            'errors': errors,
+            'calculated': len(results),
+            'failed': len(errors)
+        })
+        
+    except Exception as e:
+        unit_of_work.rollback()
+        current_app.logger.error(f"Batch calculation error: {str(e)}")
+        return jsonify({'error': 'An error occurred during batch calculation'}), 500
+
+@bp.route('/msds')
 def msds():
     log_activity('navigation', 'Accessed MSDS lookup')
     return render_template('msds.html')
 
-@app.route('/msds_search', methods=['POST'])
+@bp.route('/msds_search', methods=['POST'])
 def msds_search():
     try:
         data = request.get_json() if request.is_json else request.form
@@ -421,9 +526,12 @@ def msds_search():
         if not chemical_name:
             return jsonify({'error': 'Please provide a chemical name'}), 400
         
-        chemical_data = get_chemical_data(chemical_name)
+        chemical_data, fuzzy = find_chemical(chemical_name)
         if not chemical_data:
             return jsonify({'error': f'MSDS data not found for {chemical_name}'}), 404
+        if fuzzy:
+            chemical_data = dict(chemical_data, matched_query=chemical_name)
+            chemical_name = chemical_data['name']
         
         # Log activity
         log_activity('msds_lookup', f'Looked up MSDS for {chemical_name}')
@@ -434,37 +542,88 @@ def msds_search():
             return render_template('msds.html', chemical_data=chemical_data)
             
     except Exception as e:
-        app.logger.error(f"MSDS search error: {str(e)}")
+        unit_of_work.rollback()
+        current_app.logger.error(f"MSDS search error: {str(e)}")
         error_msg = 'An error occurred during MSDS lookup'
         if request.is_json:
             return jsonify({'error': error_msg}), 500
         return render_template('msds.html', error=error_msg)
 
-@app.route('/safety')
+safety_protocols = CachedJsonFile(os.path.join('data', 'safety_protocols.json'), default=[])
+# Rendered /safety pages keyed by ETag; the page embeds the user's name and role
+rendered_safety_pages = OrderedDict()
+rendered_safety_pages_lock = threading.Lock()
+MAX_RENDERED_SAFETY_PAGES = 256
+
+def conditional_response(etag, last_modified, build, cache_control):
+    """Return 304 when the client's validators match, else the response from ``build()``."""
+    if etag in request.if_none_match or (
+        not request.if_none_match and last_modified and request.if_modified_since
+        and last_modified <= request.if_modified_since
+    ):
+        response = make_response('', 304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@bp.route('/safety')
 def safety():
     log_activity('navigation', 'Accessed safety protocols')
     
-    # Load safety protocols
-    protocols_file = os.path.join('data', 'safety_protocols.json')
-    protocols = []
-    try:
-        with open(protocols_file, 'r') as f:
-            protocols = json.load(f)
-    except FileNotFoundError:
-        app.logger.error(f"Safety protocols file not found: {protocols_file}")
+    # Load safety protocols (re-read only when the file changes)
+    protocols = safety_protocols.refresh()
+    if not protocols.exists:
+        current_app.logger.error(f"Safety protocols file not found: {protocols.path}")
+    
+    # Pages carrying flashed messages are one-off and never cached
+    if session.get('_flashes'):
+        return render_template('safety.html', protocols=protocols.data)
     
-    return render_template('safety.html', protocols=protocols)
+    viewer = f"{session.get('user_name', '')}\0{session.get('lab_role', '')}\0{session.get('institution', '')}"
+    etag = hashlib.sha1(f"{protocols.etag}\0{viewer}".encode('utf-8')).hexdigest()
+    
+    def build():
+        with rendered_safety_pages_lock:
+            html = rendered_safety_pages.get(etag)
+            if html is not None:
+                rendered_safety_pages.move_to_end(etag)
+        if html is None:
+            # Rendered outside the lock; a concurrent render of the same page is harmless
+            html = render_template('safety.html', protocols=protocols.data)
+            with rendered_safety_pages_lock:
+                rendered_safety_pages[etag] = html
+                rendered_safety_pages.move_to_end(etag)
+                while len(rendered_safety_pages) > MAX_RENDERED_SAFETY_PAGES:
+                    rendered_safety_pages.popitem(last=False)
+        return make_response(html)
+    
+    return conditional_response(etag, protocols.last_modified, build, 'private, no-cache')
+
+@bp.route('/api/safety_protocols')
+def api_safety_protocols():
+    protocols = safety_protocols.refresh()
+    
+    def build():
+        response = make_response(protocols.raw or b'[]')
+        response.mimetype = 'application/json'
+        return response
+    
+    return conditional_response(protocols.etag, protocols.last_modified, build, 'public, no-cache')
 
-@app.route('/documentation')
+@bp.route('/documentation')
 def documentation():
     log_activity('navigation', 'Accessed documentation')
     
     # Get recent reports
-    recent_reports = LabReport.query.filter_by(session_id=session['session_id']).order_by(LabReport.created_at.desc()).limit(10).all()
+    recent_reports = queries.recent_reports(session['session_id']).all()
     
     return render_template('documentation.html', recent_reports=recent_reports)
 
-@app.route('/generate_report', methods=['POST'])
+@bp.route('/generate_report', methods=['POST'])
 def generate_report():
     try:
         data = request.get_json() if request.is_json else request.form
@@ -484,39 +643,315 @@ def generate_report():
             session_id=session['session_id']
         )
         db.session.add(report)
-        db.session.commit()
         
-        # Generate PDF
-        pdf_content = generate_pdf_report(title, content, report_type)
+        if request.is_json:
+            # Assigns report.id for the job; the row commits with the rest of the request
+            db.session.flush()
+            # Render in the background; the client polls the job for the PDF
+            try:
+                job = report_jobs.submit(title, content, report_type, session['session_id'], report.id)
+            except QueueFull:
+                # Nothing is saved; the client resubmits the report
+                unit_of_work.rollback()
+                return report_queue_full_response()
+            log_activity('documentation', f'Generated report: {title}')
+            return jsonify(report_job_payload(job, message='Report generated successfully')), 202
+        
+        # Generate PDF, reusing an identical earlier render when there is one
+        cache_key, pdf_path = report_cache.render(title, content, report_type)
         
         # Log activity
         log_activity('documentation', f'Generated report: {title}')
         
-        if request.is_json:
-            return jsonify({'message': 'Report generated successfully', 'report_id': report.id})
-        
         # Return PDF as download
-        response = make_response(pdf_content)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename="{title}.pdf"'
-        return response
+        return pdf_file_response(cache_key, pdf_path, title)
         
     except Exception as e:
-        app.logger.error(f"Report generation error: {str(e)}")
+        unit_of_work.rollback()
+        current_app.logger.error(f"Report generation error: {str(e)}")
         error_msg = 'An error occurred during report generation'
         if request.is_json:
             return jsonify({'error': error_msg}), 500
         return render_template('documentation.html', error=error_msg)
 
-@app.route('/activity_logs')
-def activity_logs():
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
+def report_job_payload(job, **extra):
+    payload = job.to_dict()
+    payload['status_url'] = url_for('main.report_job_status', job_id=job.job_id)
+    payload['download_url'] = url_for('main.report_job_download', job_id=job.job_id)
+    payload.update(extra)
+    return payload
+
+def report_queue_full_response(report_id=None):
+    response = jsonify({'error': 'The report queue is full, please try again shortly', 'report_id': report_id})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+@bp.route('/reports/jobs', methods=['POST'])
+def submit_report_job():
+    data = request.get_json(silent=True) or {}
+    try:
+        report = db.session.get(LabReport, int(data.get('report_id')))
+    except (TypeError, ValueError):
+        report = None
+    if not report or report.session_id != session['session_id']:
+        return jsonify({'error': 'Report not found'}), 404
     
-    activities = ActivityLog.query.filter_by(session_id=session['session_id']).order_by(ActivityLog.timestamp.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    try:
+        job = report_jobs.submit(report.title, report.content, report.report_type, session['session_id'], report.id)
+    except QueueFull:
+        return report_queue_full_response(report.id)
+    return jsonify(report_job_payload(job)), 202
+
+@bp.route('/reports/jobs/<job_id>')
+def report_job_status(job_id):
+    job = report_jobs.get(job_id, session['session_id'])
+    if not job:
+        return jsonify({'error': 'Report job not found'}), 404
+    return jsonify(report_job_payload(job))
+
+@bp.route('/reports/jobs/<job_id>/download')
+def report_job_download(job_id):
+    job = report_jobs.get(job_id, session['session_id'])
+    if not job:
+        return jsonify({'error': 'Report job not found'}), 404
+    if job.status == 'failed':
+        return jsonify({'error': 'Report rendering failed'}), 500
+    if job.status != 'done':
+        response = jsonify(report_job_payload(job))
+        response.status_code = 202
+        response.headers['Retry-After'] = '1'
+        return response
+    
+    filename = f"{job.title or 'report'}.pdf"
+    return send_file(report_jobs.path_for(job.job_id), mimetype='application/pdf',
+                     as_attachment=True, download_name=filename)
+
+def pdf_file_response(cache_key, path, title):
+    """Stream a cached PDF to the client in chunks."""
+    response = Response(stream_file(path), mimetype='application/pdf', direct_passthrough=True)
+    response.headers['Content-Length'] = str(os.path.getsize(path))
+    response.headers['Content-Disposition'] = f'attachment; filename="{title}.pdf"'
+    response.set_etag(cache_key)
+    return response
+
+@bp.route('/reports/<int:report_id>/pdf')
+def report_pdf(report_id):
+    report = db.session.get(LabReport, report_id)
+    if not report or report.session_id != session['session_id']:
+        return jsonify({'error': 'Report not found'}), 404
+    
+    key = cache_key(report.title, report.content, report.report_type)
+    if key in request.if_none_match:
+        response = make_response('', 304)
+        response.set_etag(key)
+        return response
+    
+    key, path = report_cache.render(report.title, report.content, report.report_type)
+    return pdf_file_response(key, path, report.title)
+
+MAX_SEARCH_PAGE_SIZE = 50
+
+@bp.route('/api/reports/search')
+@read_only
+def api_report_search():
+    # Not stripped: a trailing space tells the search the last word is complete
+    query = request.args.get('q', '')
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), MAX_SEARCH_PAGE_SIZE))
+    if not query.strip():
+        return jsonify({'error': 'Please provide a search query (q)'}), 400
+
+    total, results = report_search.search(session['session_id'], query, page, per_page)
+    for result in results:
+        result['created_at'] = result['created_at'].isoformat() if result['created_at'] else None
+        result['pdf_url'] = url_for('main.report_pdf', report_id=result['id'])
+    return jsonify({
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
+        'backend': report_search.backend,
+        'results': results
+    })
+
+def bundle_payload(manifest):
+    rendered, total = bundle_store.progress(manifest)
+    return {
+        'bundle_id': manifest['bundle_id'],
+        'format': manifest['format'],
+        'reports': len(manifest['reports']),
+        'rendered': rendered,
+        'total': total,
+        'done': rendered == total,
+        'error': bundle_store.error(manifest),
+        'status_url': url_for('main.report_bundle_status', bundle_id=manifest['bundle_id']),
+        'download_url': url_for('main.report_bundle_download', bundle_id=manifest['bundle_id']),
+    }
+
+@bp.route('/reports/bundles', methods=['POST'])
+def create_report_bundle():
+    data = request.get_json(silent=True) or {}
+    fmt = data.get('format', 'zip')
+    if fmt not in BUNDLE_FORMATS:
+        return jsonify({'error': f'Unknown bundle format {fmt!r}, expected zip or pdf'}), 400
+
+    report_ids = data.get('report_ids')
+    try:
+        if report_ids is not None:
+            report_ids = [int(report_id) for report_id in report_ids]
+        start = parse_bound(data.get('start'))
+        end = parse_bound(data.get('end'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e) or 'Invalid report_ids'}), 400
+    if report_ids is None and start is None and end is None:
+        return jsonify({'error': 'Give report_ids or a start/end date range'}), 400
+
+    limit = bundle_store.max_reports
+    reports = queries.bundle_reports(session['session_id'], report_ids, start, end, limit=limit + 1).all()
+    if not reports:
+        return jsonify({'error': 'No reports matched'}), 404
+    if len(reports) > limit:
+        return jsonify({'error': f'A bundle can hold at most {limit} reports'}), 413
+
+    try:
+        manifest = bundle_store.create(session['session_id'], reports, fmt)
+    except QueueFull:
+        return report_queue_full_response()
+    log_activity('documentation', f'Bundled {len(reports)} report(s) as {fmt}')
+    return jsonify(bundle_payload(manifest)), 202
+
+@bp.route('/reports/bundles/<bundle_id>')
+def report_bundle_status(bundle_id):
+    manifest = bundle_store.load(bundle_id, session['session_id'])
+    if not manifest:
+        return jsonify({'error': 'Bundle not found'}), 404
+    return jsonify(bundle_payload(manifest))
+
+@bp.route('/reports/bundles/<bundle_id>/download')
+def report_bundle_download(bundle_id):
+    session_id = session['session_id']
+    manifest = bundle_store.load(bundle_id, session_id)
+    if not manifest:
+        return jsonify({'error': 'Bundle not found'}), 404
+
+    if manifest['format'] == 'pdf':
+        path = bundle_store.combined_path(manifest)
+        if not path and bundle_store.error(manifest):
+            return jsonify({'error': 'Report rendering failed'}), 500
+        if not path:
+            response = jsonify(bundle_payload(manifest))
+            response.status_code = 202
+            response.headers['Retry-After'] = '2'
+            return response
+        return pdf_file_response(manifest['combined_key'], path, f'labmate-reports-{bundle_id[:8]}')
+
+    def load_report(report_id):
+        report = db.session.get(LabReport, report_id)
+        if not report or report.session_id != session_id:
+            raise LookupError(f'Report {report_id} is no longer available')
+        return report
+
+    # Members are written as they become ready; the archive is never buffered
+    chunks = bundle_store.generate_zip(manifest, load_report)
+    response = Response(stream_with_context(chunks), mimetype=BUNDLE_FORMATS['zip'])
+    response.headers['Content-Disposition'] = f'attachment; filename="labmate-reports-{bundle_id[:8]}.zip"'
+    return response
+
+MAX_REMEMBERED_PAGES = 10
+
+def activity_log_page(per_page, numbered=False):
+    """Fetch the keyset page selected by the ``after``/``before``/``count`` args.
+
+    With ``numbered``, a ``page=N`` arg (what ``Pagination``-style template
+    links carry) is also accepted. It is resolved through the cursors of
+    pages this session has already seen, kept in the session, so no page
+    needs an OFFSET.
+    """
+    after = request.args.get('after')
+    before = request.args.get('before')
+    number = max(1, request.args.get('page', 1, type=int))
+    cursors = session.get('activity_log_cursors', {}) if numbered else {}
+    if numbered and number > 1 and not after and not before:
+        after = cursors.get(str(number))
+        if after is None:
+            raise InvalidCursor(f'Page {number} has not been visited yet')
+    page = keyset_page(
+        queries.session_activity_filter(session['session_id']),
+        ActivityLog,
+        per_page=per_page,
+        after=after,
+        before=before
     )
+    if numbered:
+        page.page = number
+        page.has_prev = number > 1
+        if page.next_cursor:
+            cursors = {key: value for key, value in cursors.items()
+                       if abs(int(key) - number) < MAX_REMEMBERED_PAGES}
+            cursors[str(number + 1)] = page.next_cursor
+            session['activity_log_cursors'] = cursors
+    # Totals come from the materialized counters unless an exact count is requested
+    if request.args.get('count') == 'exact':
+        page.total = queries.session_activity_filter(session['session_id']).count()
+        page.total_is_exact = True
+    else:
+        page.total = session_stats.get_stats(session['session_id'])['total_activities']
+    return page
+
+@bp.route('/activity_logs')
+@read_only
+def activity_logs():
+    try:
+        activities = activity_log_page(per_page=20, numbered=True)
+    except InvalidCursor:
+        return redirect(url_for('main.activity_logs'))
     
     return render_template('activity_logs.html', activities=activities)
 
+@bp.route('/api/activity_logs')
+@read_only
+def api_activity_logs():
+    per_page = max(1, min(request.args.get('limit', 20, type=int), 200))
+    try:
+        page = activity_log_page(per_page)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'items': [{
+            'id': activity.id,
+            'action_type': activity.action_type,
+            'description': activity.description,
+            'details': activity.details,
+            'timestamp': activity.timestamp.isoformat()
+        } for activity in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'total': page.total,
+        'total_is_exact': page.total_is_exact
+    })
+
+@bp.route('/export/<kind>.<fmt>')
+def export_history(kind, fmt):
+    if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown export {kind}.{fmt}'}), 404
+    try:
+        start = parse_bound(request.args.get('start'))
+        end = parse_bound(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    log_activity('export', f'Exported {kind} as {fmt}')
+    
+    chunks = generate_export(kind, fmt, session['session_id'], start, end)
+
+    def body():
+        # Runs after the request has committed the activity row; the export only reads
+        use_reader()
+        yield from chunks
 
+    response = Response(stream_with_context(body()), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="labmate-{kind}.{fmt}"'
+    return response
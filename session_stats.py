@@ -0,0 +1,183 @@
+"""Materialized per-session counters.
+
+``SessionStats`` and ``SessionDailyStats`` are incremented in the same
+transaction that inserts ActivityLog/Calculation rows, so dashboard and stats
+reads are primary-key lookups instead of ``COUNT(*)`` scans. Inside a request
+the upserts are staged on the unit of work and run just before its commit. ``rebuild`` and
+``check_consistency`` recompute the counters from the raw tables plus the
+``ActivityRollup`` rows left behind by activity log compaction.
+"""
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import case, delete, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models import ActivityLog, ActivityRollup, Calculation, SessionStats, SessionDailyStats
+from unit_of_work import unit_of_work
+
+def upsert(model):
+    """Return a dialect-specific ``insert`` supporting ``on_conflict_do_update``."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def _increment(session_id, day, activities=0, calculations=0, last_activity_at=None):
+    table = SessionStats.__table__
+    stmt = upsert(SessionStats).values(
+        session_id=session_id,
+        total_activities=activities,
+        total_calculations=calculations,
+        last_activity_at=last_activity_at
+    )
+    updates = {
+        'total_activities': table.c.total_activities + activities,
+        'total_calculations': table.c.total_calculations + calculations,
+    }
+    if last_activity_at is not None:
+        updates['last_activity_at'] = case(
+            (or_(table.c.last_activity_at.is_(None),
+                 table.c.last_activity_at < stmt.excluded.last_activity_at),
+             stmt.excluded.last_activity_at),
+            else_=table.c.last_activity_at
+        )
+    db.session.execute(stmt.on_conflict_do_update(index_elements=[table.c.session_id], set_=updates))
+
+    daily = SessionDailyStats.__table__
+    stmt = upsert(SessionDailyStats).values(
+        session_id=session_id, day=day, activities=activities, calculations=calculations
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[daily.c.session_id, daily.c.day],
+        set_={
+            'activities': daily.c.activities + activities,
+            'calculations': daily.c.calculations + calculations,
+        }
+    ))
+
+def record_activities(records):
+    """Count ActivityLog rows (dicts with session_id and timestamp) being inserted."""
+    grouped = defaultdict(lambda: [0, None])
+    for record in records:
+        timestamp = record.get('timestamp') or datetime.utcnow()
+        key = (record.get('session_id'), timestamp.date())
+        grouped[key][0] += 1
+        if grouped[key][1] is None or timestamp > grouped[key][1]:
+            grouped[key][1] = timestamp
+    for (session_id, day), (count, last_at) in grouped.items():
+        unit_of_work.stage(_increment, session_id, day, count, 0, last_at)
+
+def record_calculations(session_id, count=1, when=None):
+    """Count ``count`` Calculation rows being inserted for a session."""
+    when = when or datetime.utcnow()
+    unit_of_work.stage(_increment, session_id, when.date(), 0, count)
+
+def get_stats(session_id, today=None):
+    """Return the counters for one session."""
+    today = today or datetime.utcnow().date()
+    totals = db.session.get(SessionStats, session_id)
+    daily = db.session.get(SessionDailyStats, (session_id, today))
+    return {
+        'total_activities': totals.total_activities if totals else 0,
+        'total_calculations': totals.total_calculations if totals else 0,
+        'calculations_today': daily.calculations if daily else 0,
+        'last_activity_at': totals.last_activity_at if totals else None,
+    }
+
+def _recompute():
+    """Recompute counters from the raw tables and activity rollups.
+
+    Returns ``(totals, daily)`` dicts keyed by session_id and (session_id, day).
+    """
+    totals = defaultdict(lambda: {'total_activities': 0, 'total_calculations': 0, 'last_activity_at': None})
+    daily = defaultdict(lambda: {'activities': 0, 'calculations': 0})
+
+    activity_day = func.date(ActivityLog.timestamp)
+    rows = db.session.execute(
+        select(ActivityLog.session_id, activity_day, func.count(), func.max(ActivityLog.timestamp))
+        .group_by(ActivityLog.session_id, activity_day)
+    )
+    for session_id, day, count, last_at in rows:
+        day = _as_date(day)
+        entry = totals[session_id]
+        entry['total_activities'] += count
+        last_at = _as_datetime(last_at)
+        if last_at and (entry['last_activity_at'] is None or last_at > entry['last_activity_at']):
+            entry['last_activity_at'] = last_at
+        daily[(session_id, day)]['activities'] += count
+
+    # Compacted activity only survives as rollup rows
+    rows = db.session.execute(
+        select(ActivityRollup.session_id, ActivityRollup.day, func.sum(ActivityRollup.count),
+               func.max(ActivityRollup.last_at))
+        .group_by(ActivityRollup.session_id, ActivityRollup.day)
+    )
+    for session_id, day, count, last_at in rows:
+        entry = totals[session_id]
+        entry['total_activities'] += count
+        last_at = _as_datetime(last_at)
+        if last_at and (entry['last_activity_at'] is None or last_at > entry['last_activity_at']):
+            entry['last_activity_at'] = last_at
+        daily[(session_id, _as_date(day))]['activities'] += count
+
+    calculation_day = func.date(Calculation.timestamp)
+    rows = db.session.execute(
+        select(Calculation.session_id, calculation_day, func.sum(Calculation.hit_count))
+        .group_by(Calculation.session_id, calculation_day)
+    )
+    for session_id, day, count in rows:
+        totals[session_id]['total_calculations'] += count
+        daily[(session_id, _as_date(day))]['calculations'] += count
+
+    return totals, daily
+
+def _as_date(value):
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return value
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+def rebuild():
+    """Replace all counters with values recomputed from the raw tables."""
+    totals, daily = _recompute()
+    db.session.execute(delete(SessionDailyStats))
+    db.session.execute(delete(SessionStats))
+    db.session.add_all(SessionStats(session_id=session_id, **values) for session_id, values in totals.items())
+    db.session.add_all(
+        SessionDailyStats(session_id=session_id, day=day, **values)
+        for (session_id, day), values in daily.items()
+    )
+    db.session.commit()
+    return len(totals), len(daily)
+
+def check_consistency():
+    """Compare stored counters with the raw tables.
+
+    Returns a list of human-readable mismatch descriptions; empty when consistent.
+    """
+    totals, daily = _recompute()
+    problems = []
+
+    stored = {row.session_id: row for row in SessionStats.query}
+    for session_id in set(totals) | set(stored):
+        expected = totals.get(session_id, {'total_activities': 0, 'total_calculations': 0})
+        row = stored.get(session_id)
+        for field in ('total_activities', 'total_calculations'):
+            actual = getattr(row, field) if row else 0
+            if actual != expected[field]:
+                problems.append(f'{session_id} {field}: stored {actual}, expected {expected[field]}')
+
+    stored = {(row.session_id, row.day): row for row in SessionDailyStats.query}
+    for key in set(daily) | set(stored):
+        expected = daily.get(key, {'activities': 0, 'calculations': 0})
+        row = stored.get(key)
+        for field in ('activities', 'calculations'):
+            actual = getattr(row, field) if row else 0
+            if actual != expected[field]:
+                problems.append(f'{key[0]} {key[1]} {field}: stored {actual}, expected {expected[field]}')
+
+    return problems
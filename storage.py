@@ -0,0 +1,213 @@
+"""Database engines: SQLite tuning and read/write routing.
+
+``storage.init_app`` replaces a bare ``db.init_app``. For a file-backed
+SQLite database it:
+
+- sets ``journal_mode=WAL``, ``synchronous``, ``busy_timeout`` and
+  ``mmap_size`` on every new connection, so readers never wait for the
+  writer and lock contention waits instead of failing with "database is
+  locked";
+- adds a ``reader`` engine, a pool of ``query_only`` connections to the
+  same file (or to ``DATABASE_READ_URL``, e.g. a replica, when it is set);
+- with ``SQLITE_WRITE_LOCK``, serializes write transactions within the
+  process with a lock. A session takes it at its first flush or
+  insert/update/delete and holds it until commit or rollback, so writers
+  hand over immediately instead of polling SQLite's busy handler. Requests
+  stage their writes until the unit of work commits, so they hold it only
+  for the flush and commit. Only the busy timeout arbitrates between
+  processes. Reads and read-only transactions never wait for it, and the
+  writer engine keeps a normal pool (``SQLITE_WRITER_CONNECTIONS``,
+  default 5).
+
+Views that only read call ``use_reader()``, or are decorated with
+``read_only``. The session then sends SELECTs to the reader pool. Flushes
+and insert/update/delete statements still go to the writer, so a stray
+``log_activity`` in such a view is still written, and reads stay on the
+writer from the first write until the commit.
+"""
+import functools
+import logging
+import sqlite3
+import threading
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as WriterTimeout
+
+logger = logging.getLogger(__name__)
+
+READER = 'reader'
+
+
+def is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.drivername in ('sqlite', 'sqlite+pysqlite') and url.database not in (None, '', ':memory:')
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the ``reader`` bind in read-only mode.
+
+    Once the session writes anything it stays on the writer until the
+    transaction ends, so reads in between see those writes. Its first write
+    also takes the process's write lock (``storage.begin_write``).
+    """
+
+    def execute(self, statement, *args, **kwargs):
+        if getattr(statement, 'is_dml', False):
+            storage.begin_write(self)
+            self.info['wrote'] = True
+        return super().execute(statement, *args, **kwargs)
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            storage.end_write(self)
+        # Committed writes are visible to the readers too
+        self.info.pop('wrote', None)
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            storage.end_write(self)
+        self.info.pop('wrote', None)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            storage.end_write(self)
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and has_app_context() and g.get('labmate_read_only') and not self.info.get('wrote')
+                and not self._flushing and not getattr(clause, 'is_dml', False)):
+            engine = self._db.engines.get(READER)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_reader():
+    """Send the rest of this app context's SELECTs to the read-only pool.
+
+    The flag lives on ``g`` rather than the session, so it also covers a
+    streamed response body that runs after the request's session is gone.
+    """
+    g.labmate_read_only = True
+
+
+def read_only(view):
+    """Mark a view as read-only; see ``use_reader``."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        use_reader()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _before_flush(session, flush_context, instances):
+    storage.begin_write(session)
+
+
+class Storage:
+    def __init__(self):
+        self.pragmas = {}
+        self.routing = False
+        self.write_lock = None
+        self.write_timeout = 30
+        self.write_waits = 0
+
+    def init_app(self, app):
+        """Configure the engines for ``app`` and initialize ``db`` with them."""
+        from app import db
+
+        self.pragmas = {}
+        self.write_lock = None
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        read_uri = app.config.get('DATABASE_READ_URL')
+        reader_pool = app.config.get('DATABASE_READ_POOL_SIZE', 5)
+        sqlite_file = is_sqlite_file(uri)
+
+        if sqlite_file:
+            options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+            options.setdefault('pool_size', app.config.get('SQLITE_WRITER_CONNECTIONS', 5))
+            if app.config.get('SQLITE_WRITE_LOCK', False):
+                self.write_lock = threading.Lock()
+            self.write_timeout = app.config.get('SQLITE_WRITER_TIMEOUT', 30)
+            if app.config.get('SQLITE_WAL', True):
+                self.pragmas['journal_mode'] = 'WAL'
+            self.pragmas['synchronous'] = app.config.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+            self.pragmas['busy_timeout'] = app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000)
+            self.pragmas['mmap_size'] = app.config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+            read_uri = read_uri or uri
+
+        if read_uri and reader_pool:
+            binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+            binds.setdefault(READER, {
+                'url': read_uri,
+                'pool_size': reader_pool,
+                'pool_recycle': 300,
+                'pool_pre_ping': not is_sqlite_file(read_uri),
+            })
+
+        db.init_app(app)
+
+        with app.app_context():
+            if sqlite_file:
+                event.listen(db.engine, 'connect', self._configure_writer)
+            reader = db.engines.get(READER)
+            if reader is not None:
+                self.routing = True
+                if is_sqlite_file(str(reader.url)):
+                    event.listen(reader, 'connect', self._configure_reader)
+
+    def begin_write(self, session):
+        """Take the write lock for ``session`` unless it already holds it."""
+        if self.write_lock is None or session.info.get('write_lock'):
+            return
+        if not self.write_lock.acquire(blocking=False):
+            self.write_waits += 1
+            if not self.write_lock.acquire(timeout=self.write_timeout):
+                raise WriterTimeout(f'Waited {self.write_timeout}s for the SQLite write lock')
+        session.info['write_lock'] = True
+
+    def end_write(self, session):
+        if session.info.pop('write_lock', None):
+            self.write_lock.release()
+
+    def _apply(self, dbapi_connection, pragmas):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    def _configure_writer(self, dbapi_connection, connection_record):
+        self._apply(dbapi_connection, self.pragmas)
+
+    def _configure_reader(self, dbapi_connection, connection_record):
+        # journal_mode is a property of the file; the writer sets it
+        pragmas = {name: value for name, value in self.pragmas.items() if name != 'journal_mode'}
+        pragmas['query_only'] = 'ON'
+        self._apply(dbapi_connection, pragmas)
+
+    def stats(self):
+        from app import db
+        result = {'routing': self.routing, 'write_waits': self.write_waits}
+        for key, engine in db.engines.items():
+            pool = engine.pool
+            name = key or 'writer'
+            if hasattr(pool, 'checkedout'):
+                result[f'{name}_checked_out'] = pool.checkedout()
+                result[f'{name}_pool_size'] = pool.size()
+        return result
+
+
+storage = Storage()
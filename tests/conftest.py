@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHEMICALS = {
+    'NaCl': {'name': 'Sodium chloride', 'formula': 'NaCl', 'molecular_weight': 58.44,
+             'common_names': ['salt', 'table salt'], 'hazards': ['Eye irritant']},
+    'HCl': {'name': 'Hydrochloric acid', 'formula': 'HCl', 'molecular_weight': 36.46,
+            'common_names': ['muriatic acid'], 'hazards': ['Corrosive', 'Strong acid']},
+    'NaOH': {'name': 'Sodium hydroxide', 'formula': 'NaOH', 'molecular_weight': 40.0,
+             'common_names': ['caustic soda', 'lye'], 'hazards': ['Corrosive', 'Strong base']},
+}
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Build apps from the factory in the testing environment, on a fresh SQLite file.
+
+    Keyword arguments override the test config.
+    """
+    monkeypatch.setenv('LABMATE_ENV', 'testing')
+    chemicals_path = tmp_path / 'chemicals.json'
+    chemicals_path.write_text(json.dumps(CHEMICALS))
+
+    from chemical_registry import registry
+    monkeypatch.setattr(registry, 'path', str(chemicals_path))
+    monkeypatch.setattr(registry, 'compiled_path', str(tmp_path / 'chemicals.bin'))
+    registry.reload()
+
+    from app import create_app, db
+    from report_jobs import report_jobs
+    apps = []
+
+    def make(**config):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "labmate.db"}',
+            # Activity logged outside a request is written at once instead of by the flusher
+            'ACTIVITY_LOG_SYNC': True,
+            'REPORT_OUTPUT_DIR': str(tmp_path / 'reports'),
+            'REPORT_CACHE_DIR': str(tmp_path / 'report_cache'),
+            **config,
+        })
+        apps.append(app)
+        return app
+
+    yield make
+
+    report_jobs.shutdown()
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+    registry.reload()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+def login(client):
+    with client.session_transaction() as session:
+        session['session_id'] = 'test-session'
+        session['user_name'] = 'Test User'
+        session['lab_role'] = 'researcher'
+    return client
+
+
+@pytest.fixture
+def client(app):
+    """A test client with a logged-in session."""
+    return login(app.test_client())
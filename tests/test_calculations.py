@@ -0,0 +1,64 @@
+import pytest
+
+from conftest import login
+from models import Calculation
+
+# 0.1 M sodium chloride in 250 ml
+MASS = 1.461
+
+
+@pytest.mark.parametrize('volume', [
+    {'volume': 0.25},
+    {'volume': 0.25, 'volume_unit': 'l'},
+    {'volume': 250, 'volume_unit': 'ml'},
+    {'volume': 250, 'volume_unit': 'millilitres'},
+], ids=['default', 'l', 'ml', 'millilitres'])
+def test_calculate_reads_litres_unless_told_otherwise(client, volume):
+    response = client.post('/calculate', json={'chemical_name': 'Sodium chloride', 'molarity': 0.1, **volume})
+
+    assert response.status_code == 200
+    assert response.get_json()['mass_required'] == MASS
+    assert response.get_json()['volume'] == 0.25
+    assert response.get_json()['volume_unit'] == 'l'
+
+
+def test_calculate_rejects_an_unknown_unit(client):
+    response = client.post('/calculate', json={'chemical_name': 'NaCl', 'molarity': 0.1,
+                                               'volume': 1, 'volume_unit': 'gallon'})
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unknown volume unit: gallon'
+
+
+def test_batch_reads_litres_unless_told_otherwise(client):
+    response = client.post('/calculate_batch', json={'calculations': [
+        {'chemical_name': 'NaCl', 'molarity': 0.1, 'volume': 0.25},
+        {'chemical_name': 'NaCl', 'molarity': 0.1, 'volume': 250, 'volume_unit': 'ml'},
+    ]})
+
+    assert [row['mass_required'] for row in response.get_json()['results']] == [MASS, MASS]
+
+
+def test_every_entry_point_stores_litres(app, client):
+    client.post('/calculate', json={'chemical_name': 'NaCl', 'molarity': 0.1, 'volume': 0.25})
+    client.post('/calculate_batch', json={'calculations': [{'chemical_name': 'NaCl', 'molarity': 0.1, 'volume': 0.25}]})
+    response = client.post('/voice_command', json={'command': 'calculate 0.1 molar sodium chloride for 250 ml'})
+
+    assert response.get_json()['result']['volume'] == 250
+    assert response.get_json()['result']['volume_unit'] == 'ml'
+    with app.app_context():
+        rows = Calculation.query.all()
+    assert [(row.volume, round(row.mass_required, 4)) for row in rows] == [(0.25, MASS)] * 3
+
+
+def test_dedup_counts_a_repeat_on_the_existing_row(make_app):
+    app = make_app(CALCULATION_DEDUP=True)
+    client = login(app.test_client())
+    for volume in (0.25, 0.25, 0.5):
+        client.post('/calculate', json={'chemical_name': 'NaCl', 'molarity': 0.1, 'volume': volume})
+
+    with app.app_context():
+        rows = Calculation.query.order_by(Calculation.id).all()
+    assert [(row.volume, row.hit_count) for row in rows] == [(0.25, 2), (0.5, 1)]
+    assert rows[0].last_used_at is not None
+    assert client.get('/api/stats').get_json()['calculations_today'] == 3
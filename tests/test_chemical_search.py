@@ -0,0 +1,35 @@
+import pytest
+
+from chemical_search import ChemicalSearchEngine
+from conftest import CHEMICALS
+
+
+@pytest.fixture
+def engine():
+    return ChemicalSearchEngine(CHEMICALS.values())
+
+
+def names(results):
+    return [result['name'] for result in results]
+
+
+def test_prefix_completes_any_word(engine):
+    assert names(engine.suggest('chlor')) == ['Sodium chloride']
+    assert engine.suggest('sodium chloride')[0]['match'] == 'exact'
+
+
+@pytest.mark.parametrize('query', ['sodum', 'sodiun', 'osdium', 'sodiium'])
+def test_prefix_with_a_typo_still_completes(engine, query):
+    results = engine.suggest(query)
+
+    assert names(results) == ['Sodium chloride', 'Sodium hydroxide']
+    assert {result['match'] for result in results} == {'fuzzy'}
+
+
+def test_typo_in_a_later_word(engine):
+    assert names(engine.suggest('hydroxde')) == ['Sodium hydroxide']
+
+
+def test_short_or_unrelated_queries_find_nothing(engine):
+    assert engine.suggest('xq') == []
+    assert engine.suggest('xyzzy') == []
@@ -0,0 +1,20 @@
+from app import load_config
+
+
+def test_unset_environment_is_production(monkeypatch):
+    monkeypatch.delenv('LABMATE_ENV', raising=False)
+    monkeypatch.delenv('LOG_LEVEL', raising=False)
+    monkeypatch.delenv('SCHEMA_AUTO_UPGRADE', raising=False)
+
+    config = load_config()
+
+    assert config['ENVIRONMENT'] == 'production'
+    assert config['LOG_LEVEL'] == 'INFO'
+    assert config['SCHEMA_AUTO_UPGRADE'] is False
+
+
+def test_development_upgrades_the_schema_on_start(monkeypatch):
+    monkeypatch.setenv('LABMATE_ENV', 'development')
+    monkeypatch.delenv('SCHEMA_AUTO_UPGRADE', raising=False)
+
+    assert load_config()['SCHEMA_AUTO_UPGRADE'] is True
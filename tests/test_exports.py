@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from app import db
+from exports import generate_csv, generate_ndjson
+from models import ActivityLog
+
+START = datetime(2026, 3, 1)
+
+
+def add_activities(app, days, session_id='test-session'):
+    with app.app_context():
+        db.session.add_all(ActivityLog(action_type='test', description=f'Day {day}', session_id=session_id,
+                                       timestamp=START + timedelta(days=day)) for day in days)
+        db.session.commit()
+
+
+def test_csv_export_streams_the_sessions_rows_in_range(app, client):
+    add_activities(app, range(5))
+    add_activities(app, range(5), session_id='other-session')
+
+    response = client.get('/export/activity.csv?start=2026-03-02&end=2026-03-04')
+
+    assert response.is_streamed
+    assert response.headers['Content-Disposition'] == 'attachment; filename="labmate-activity.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    # start is inclusive and end exclusive
+    assert [row['description'] for row in rows] == ['Day 1', 'Day 2']
+    assert {row['session_id'] for row in rows} == {'test-session'}
+
+
+def test_ndjson_export(app, client):
+    client.post('/calculate', json={'chemical_name': 'NaCl', 'molarity': 0.1, 'volume': 0.25})
+
+    response = client.get('/export/calculations.ndjson')
+
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(rows) == 1
+    assert (rows[0]['chemical_name'], rows[0]['volume'], rows[0]['mass_required']) == ('NaCl', 0.25, 1.461)
+
+
+def test_export_is_logged_once_it_commits(app, client):
+    client.get('/export/reports.csv').get_data()
+
+    with app.app_context():
+        assert [row.description for row in ActivityLog.query.all()] == ['Exported reports as csv']
+
+
+def test_bad_export_requests(client):
+    assert client.get('/export/passwords.csv').status_code == 404
+    assert client.get('/export/activity.xml').status_code == 404
+    assert client.get('/export/activity.csv?start=yesterday').status_code == 400
+
+
+def test_output_is_chunked_by_batch():
+    rows = [(row_id, 'test-session', START, 'test', f'Entry {row_id}', None) for row_id in range(5)]
+
+    chunks = list(generate_csv('activity', iter(rows), batch_size=2))
+    assert len(chunks) == 3
+    assert len(list(csv.reader(io.StringIO(''.join(chunks))))) == 6
+
+    chunks = list(generate_ndjson('activity', iter(rows), batch_size=2))
+    assert [chunk.count('\n') for chunk in chunks] == [2, 2, 1]
@@ -0,0 +1,35 @@
+from hazard_index import HazardIndex, class_names, hazard_mask
+
+
+def test_api_reports_an_acid_base_conflict(client):
+    response = client.post('/api/hazards/check', json={'chemicals': ['HCl', 'lye', 'salt', 'unobtainium']})
+
+    result = response.get_json()
+    assert response.status_code == 200
+    assert result['unknown'] == ['unobtainium']
+    assert result['conflicts'] == [{
+        'hazards': ['acid', 'base'],
+        'reason': 'Acids and bases neutralize exothermically',
+        'chemicals': ['Hydrochloric acid'],
+        'incompatible_with': ['Sodium hydroxide'],
+    }]
+
+
+def test_classes_come_from_hazard_data_not_names():
+    assert class_names(hazard_mask({'name': 'Ascorbic acid', 'hazards': []})) == []
+    assert class_names(hazard_mask({'name': 'Amino acid', 'hazards': ['Eye irritant']})) == []
+    assert class_names(hazard_mask({'name': 'Sulfuric acid', 'hazards': ['Corrosive', 'Strong acid']})) == [
+        'corrosive', 'acid']
+    assert class_names(hazard_mask({'name': 'Buffer', 'hazard_classes': ['base']})) == ['base']
+
+
+def test_a_chemical_in_both_classes_does_not_conflict_with_itself():
+    index = HazardIndex([
+        {'name': 'Amphoteric', 'hazards': ['Strong acid', 'Strong base']},
+        {'name': 'Lye', 'hazards': ['Strong base']},
+        {'name': 'Salt', 'hazards': []},
+    ])
+
+    assert index.check(['Amphoteric', 'Salt'])['conflicts'] == []
+    conflicts = index.check(['Amphoteric', 'Lye'])['conflicts']
+    assert [(c['chemicals'], c['incompatible_with']) for c in conflicts] == [(['Amphoteric'], ['Lye'])]
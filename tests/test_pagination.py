@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from app import db
+from models import ActivityLog
+from pagination import KeysetPage
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def add_activities(app, timestamps, session_id='test-session'):
+    with app.app_context():
+        rows = [ActivityLog(action_type='test', description=f'Entry at {timestamp}', session_id=session_id,
+                            timestamp=timestamp) for timestamp in timestamps]
+        db.session.add_all(rows)
+        db.session.commit()
+        return [row.id for row in rows]
+
+
+def test_cursors_page_without_gaps_or_duplicates(app, client):
+    # Three rows share each timestamp, so ties are broken by id
+    timestamps = [START + timedelta(minutes=minute) for minute in range(9) for _ in range(3)]
+    ids = add_activities(app, timestamps)
+    add_activities(app, timestamps[:5], session_id='other-session')
+    expected = [row_id for _, row_id in sorted(zip(timestamps, ids), reverse=True)]
+
+    seen = []
+    behind_cursor = []
+    cursor = None
+    while True:
+        query = {'limit': 4, 'after': cursor} if cursor else {'limit': 4}
+        page = client.get('/api/activity_logs', query_string=query).get_json()
+        seen.extend(item['id'] for item in page['items'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+        # Between requests a newer row arrives, which must not show up on later
+        # pages, and an older one, which sorts behind the cursor and must
+        add_activities(app, [datetime.utcnow()])
+        behind_cursor.extend(add_activities(app, [START - timedelta(minutes=1 + len(behind_cursor))]))
+
+    assert len(seen) == len(set(seen))
+    assert [row_id for row_id in seen if row_id in ids] == expected
+    assert set(seen) - set(ids) == set(behind_cursor)
+
+
+def test_prev_cursor_returns_the_previous_page(app, client):
+    add_activities(app, [START + timedelta(minutes=minute) for minute in range(10)])
+
+    first = client.get('/api/activity_logs?limit=3').get_json()
+    second = client.get('/api/activity_logs', query_string={'limit': 3, 'after': first['next_cursor']}).get_json()
+    back = client.get('/api/activity_logs', query_string={'limit': 3, 'before': second['prev_cursor']}).get_json()
+
+    assert [item['id'] for item in back['items']] == [item['id'] for item in first['items']]
+    assert first['prev_cursor'] is None
+
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get('/api/activity_logs?after=not-a-cursor').status_code == 400
+
+
+def test_numbered_page_attributes():
+    page = KeysetPage([], per_page=20, has_next=True, has_prev=True, timestamp_attr='timestamp',
+                      total=95, page=3)
+
+    assert (page.pages, page.prev_num, page.next_num) == (5, 2, 4)
+    assert list(page.iter_pages(left_edge=2, right_current=5)) == [1, 2, 3, 4]
@@ -0,0 +1,11 @@
+from query_plans import check_query_plans
+
+
+def test_route_queries_use_indexes(app):
+    with app.app_context():
+        plans = check_query_plans('test-session')
+
+    assert plans
+    scans = {name: plan for name, uses_index, plan in plans if not uses_index}
+    assert not scans, 'queries without an index:\n' + '\n'.join(
+        f'{name}: {plan}' for name, plan in scans.items())
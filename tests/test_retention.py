@@ -0,0 +1,55 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import session_stats
+from app import db
+from models import ActivityLog, ActivityRollup
+from retention import compact
+
+NOW = datetime.utcnow()
+
+
+def test_compact_keeps_dashboard_totals(app, client, tmp_path):
+    with app.app_context():
+        db.session.add_all(ActivityLog(action_type=action_type, description='Old entry', session_id='test-session',
+                                       timestamp=NOW - timedelta(days=days, minutes=minute))
+                           for days in (40, 41, 90) for minute, action_type in enumerate(['calculation', 'msds_lookup']))
+        db.session.commit()
+        session_stats.rebuild()
+    client.post('/calculate', json={'chemical_name': 'NaCl', 'molarity': 0.1, 'volume': 0.25})
+    before = client.get('/api/stats').get_json()
+
+    with app.app_context():
+        summary = compact(30, str(tmp_path / 'archive'), batch_size=4, now=NOW)
+
+        assert (summary['rows'], summary['batches']) == (6, 2)
+        assert [row.description for row in ActivityLog.query.all()] == ['Calculated 1.4610g of NaCl']
+        assert db.session.query(db.func.sum(ActivityRollup.count)).scalar() == 6
+        assert session_stats.check_consistency() == []
+
+    assert client.get('/api/stats').get_json() == before
+    assert before['total_activities'] == 7
+
+    with app.app_context():
+        # Counters rebuilt from the rollups match too
+        session_stats.rebuild()
+    assert client.get('/api/stats').get_json() == before
+
+    archived = []
+    for path in (tmp_path / 'archive').glob('activity-*.ndjson.gz'):
+        with gzip.open(path, 'rt') as archive:
+            archived.extend(json.loads(line) for line in archive)
+    assert len(archived) == 6
+    assert {row['session_id'] for row in archived} == {'test-session'}
+
+
+def test_dry_run_changes_nothing(app, tmp_path):
+    with app.app_context():
+        db.session.add(ActivityLog(action_type='test', description='Old entry', session_id='test-session',
+                                   timestamp=NOW - timedelta(days=60)))
+        db.session.commit()
+
+        assert compact(30, str(tmp_path), dry_run=True, now=NOW)['rows'] == 1
+        assert ActivityLog.query.count() == 1
+        assert not list(tmp_path.glob('*.gz'))
@@ -0,0 +1,44 @@
+from sqlalchemy import update
+
+import session_stats
+from app import db
+from models import SessionDailyStats, SessionStats
+
+CALCULATION = {'chemical_name': 'Sodium chloride', 'molarity': 0.1, 'volume': 0.25}
+
+
+def make_activity(client):
+    client.post('/calculate', json=CALCULATION)
+    client.post('/calculate_batch', json={'calculations': [CALCULATION, dict(CALCULATION, molarity=0.2)]})
+    client.post('/voice_command', json={'command': 'calculate 1 molar hcl for 100 ml'})
+    client.post('/msds_search', json={'chemical_name': 'NaOH'})
+
+
+def test_counters_follow_the_raw_tables(app, client):
+    make_activity(client)
+
+    with app.app_context():
+        assert session_stats.check_consistency() == []
+        stats = session_stats.get_stats('test-session')
+    assert stats['total_calculations'] == 4
+    assert stats['calculations_today'] == 4
+    # The voice command logs both the command and its calculation
+    assert stats['total_activities'] == 5
+
+
+def test_rebuild_restores_the_rollups(app, client):
+    make_activity(client)
+
+    with app.app_context():
+        before = session_stats.get_stats('test-session')
+        db.session.execute(update(SessionStats).values(total_activities=999, total_calculations=0))
+        db.session.execute(update(SessionDailyStats).values(calculations=7))
+        db.session.add(SessionStats(session_id='ghost-session', total_activities=3, total_calculations=1))
+        db.session.commit()
+        assert len(session_stats.check_consistency()) == 5
+
+        assert session_stats.rebuild() == (1, 1)
+
+        assert session_stats.check_consistency() == []
+        assert session_stats.get_stats('test-session') == before
+        assert db.session.get(SessionStats, 'ghost-session') is None
@@ -0,0 +1,74 @@
+import pytest
+from flask import g, request_finished
+
+from app import db
+from conftest import login
+
+WRITES = [
+    ('/calculate', {'chemical_name': 'Sodium chloride', 'molarity': 0.1, 'volume': 0.25}),
+    ('/voice_command', {'command': 'calculate 0.1 molar sodium chloride for 250 ml'}),
+    ('/generate_report', {'title': 'Titration', 'content': 'Added 25 ml of NaOH.', 'report_type': 'experiment'}),
+]
+
+
+@pytest.mark.parametrize('path, payload', WRITES, ids=[path for path, _ in WRITES])
+def test_write_route_commits_once(app, client, path, payload):
+    commits = []
+
+    def record(sender, response, **extra):
+        commits.append(g.get('labmate_commits'))
+
+    with request_finished.connected_to(record, app):
+        response = client.post(path, json=payload)
+
+    assert response.status_code in (200, 202), response.get_data(as_text=True)
+    assert response.get_json().get('success', True), response.get_json()
+    assert commits == [1]
+
+
+def test_calculation_and_activity_share_the_commit(app, client):
+    from models import ActivityLog, Calculation
+
+    client.post('/calculate', json=WRITES[0][1])
+
+    with app.app_context():
+        calculation = Calculation.query.one()
+        assert calculation.chemical_name == 'Sodium chloride'
+        assert calculation.volume == 0.25
+        assert round(calculation.mass_required, 4) == 1.461
+        assert ActivityLog.query.filter_by(action_type='calculation').count() == 1
+
+
+def test_buffered_mode_commits_activity_with_the_request(make_app):
+    from activity_buffer import activity_buffer
+    from models import ActivityLog, SessionStats
+    app = make_app(ACTIVITY_LOG_SYNC=False)
+    client = login(app.test_client())
+
+    response = client.post('/calculate', json=WRITES[0][1])
+
+    assert response.status_code == 200
+    assert activity_buffer.stats()['queue_depth'] == 0
+    with app.app_context():
+        assert ActivityLog.query.filter_by(action_type='calculation').count() == 1
+        assert db.session.get(SessionStats, 'test-session').total_activities == 1
+
+
+def test_buffered_mode_rolled_back_request_writes_nothing(make_app):
+    from activity_buffer import activity_buffer
+    from models import ActivityLog, SessionStats
+    from utils import log_activity
+    app = make_app(ACTIVITY_LOG_SYNC=False)
+
+    @app.route('/log-then-fail')
+    def log_then_fail():
+        log_activity('navigation', 'Logged before an error')
+        return 'failed', 500
+
+    client = login(app.test_client())
+    assert client.get('/log-then-fail').status_code == 500
+
+    activity_buffer.flush()
+    with app.app_context():
+        assert ActivityLog.query.count() == 0
+        assert db.session.get(SessionStats, 'test-session') is None
@@ -0,0 +1,27 @@
+import pytest
+
+from voice_grammar import parse_command
+
+
+@pytest.mark.parametrize('command, chemical, molarity, volume, rule', [
+    ('calculate 0.1 molar sodium chloride for 250 ml', 'sodium chloride', 0.1, 250.0, 'calculate_for_volume'),
+    ('prepare 1 liter of 0.5 m naoh', 'naoh', 0.5, 1000.0, 'prepare_volume_of'),
+    ('make 2 mm kcl solution 500 ml', 'kcl', 0.002, 500.0, 'make_solution_volume'),
+    ('calculate 1 molar hcl', 'hcl', 1.0, 250.0, 'calculate'),
+])
+def test_calculation_commands(command, chemical, molarity, volume, rule):
+    result = parse_command(command)
+
+    assert result['action'] == 'calculation'
+    assert (result['chemical'], result['molarity'], result['volume'], result['rule']) == (
+        chemical, molarity, volume, rule)
+
+
+@pytest.mark.parametrize('command', ['calculate 0.5 molar for 250 ml', 'make 1 m solution'])
+def test_a_calculation_without_a_chemical_is_not_guessed(command):
+    assert parse_command(command)['action'] == 'unknown'
+
+
+def test_navigation_and_help():
+    assert parse_command('go to the safety data sheets')['url'] == '/msds'
+    assert parse_command('what can you do')['action'] == 'help'
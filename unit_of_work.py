@@ -0,0 +1,169 @@
+"""One database transaction per request.
+
+Route handlers, ``log_activity`` and the helpers they call only stage
+writes on ``db.session``. The unit of work commits them once, in
+``after_request``. Statements that would otherwise execute in the middle of
+the view (counter upserts, bulk and activity inserts) are registered with
+``stage`` and run just before that commit, so a request holds the SQLite
+write lock only for its flush and commit. It rolls them back instead when the handler raised,
+returned a 5xx response, or called ``unit_of_work.rollback()`` from an
+error branch that still renders a page. Anything that must only happen
+once the data is durable (server-sent events) is registered with
+``after_commit`` and runs after that single commit.
+
+Outside a request (CLI commands, background threads) there is no unit of
+work. ``after_commit`` then runs its callback straight away, and callers
+commit for themselves.
+
+With ``MAX_COMMITS_PER_REQUEST`` set, every request checks the commit
+count that instrumentation records in ``g.labmate_commits``. Exceeding it
+logs an error; in the testing environment it raises ``AssertionError``, so
+a handler that commits on its own fails loudly.
+"""
+import logging
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Core insert/update/delete statements do not show up in session.new/dirty
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        if has_request_context() and 'labmate_unit' in g:
+            g.labmate_unit['writes'] = True
+
+
+_engine_events_installed = False
+
+
+def install_engine_events():
+    """Attach the write-tracking listener to every engine (idempotent)."""
+    global _engine_events_installed
+    if _engine_events_installed:
+        return
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _engine_events_installed = True
+
+
+class UnitOfWork:
+    def __init__(self, max_commits=None):
+        self.max_commits = max_commits
+        self.strict = False
+        self.commits = 0
+        self.rollbacks = 0
+        self.budget_exceeded = 0
+
+    def init_app(self, app):
+        """Install the request hooks and read the commit budget from ``app.config``."""
+        from app import db
+        self.db = db
+        self.max_commits = app.config.get('MAX_COMMITS_PER_REQUEST', self.max_commits)
+        self.strict = app.config.get('ENVIRONMENT') == 'testing' or app.testing
+        install_engine_events()
+        app.before_request(self._begin)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def active(self):
+        return has_request_context() and 'labmate_unit' in g
+
+    def after_commit(self, callback, *args):
+        """Run ``callback(*args)`` once the request's writes are committed."""
+        if self.active():
+            g.labmate_unit['callbacks'].append((callback, args))
+        else:
+            callback(*args)
+
+    def stage(self, callback, *args):
+        """Run the write ``callback(*args)`` right before the request's commit."""
+        if self.active():
+            g.labmate_unit['staged'].append((callback, args))
+        else:
+            callback(*args)
+
+    def rollback(self):
+        """Discard everything staged so far in this request."""
+        self.db.session.rollback()
+        if self.active():
+            g.labmate_unit['callbacks'] = []
+            g.labmate_unit['staged'] = []
+            g.labmate_unit['writes'] = False
+            g.labmate_unit['failed'] = True
+
+    def _begin(self):
+        g.labmate_unit = {'callbacks': [], 'staged': [], 'writes': False, 'failed': False}
+
+    def _has_writes(self, unit):
+        session = self.db.session
+        return unit['writes'] or bool(unit['staged'] or session.new or session.dirty or session.deleted)
+
+    def _run_staged(self, unit):
+        # A staged write may stage more (an insert and its counters)
+        staged = unit['staged']
+        while staged:
+            callback, args = staged.pop(0)
+            callback(*args)
+
+    def _after_request(self, response):
+        unit = g.get('labmate_unit')
+        if unit is None:
+            return response
+        if unit['failed'] or response.status_code >= 500:
+            g.pop('labmate_unit')
+            if self._has_writes(unit):
+                self.db.session.rollback()
+                self.rollbacks += 1
+            return response
+
+        if self._has_writes(unit):
+            try:
+                # Still active, so their after_commit callbacks wait for the commit
+                self._run_staged(unit)
+                self.db.session.commit()
+                self.commits += 1
+            except Exception as e:
+                g.pop('labmate_unit', None)
+                self.db.session.rollback()
+                self.rollbacks += 1
+                current_app.logger.error(f"Commit failed for {request.endpoint}: {e}")
+                raise
+        g.pop('labmate_unit', None)
+        for callback, args in unit['callbacks']:
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.error(f"After-commit callback {callback.__name__} failed: {e}")
+        self._check_budget()
+        return response
+
+    def _check_budget(self):
+        if self.max_commits is None:
+            return
+        commits = g.get('labmate_commits', 0)
+        if commits > self.max_commits:
+            self.budget_exceeded += 1
+            message = f"{request.endpoint} committed {commits} times in one request (budget {self.max_commits})"
+            if self.strict:
+                raise AssertionError(message)
+            current_app.logger.error(message)
+
+    def _teardown_request(self, exc):
+        # Only still set when the handler raised before after_request ran
+        unit = g.pop('labmate_unit', None)
+        if unit is not None and self._has_writes(unit):
+            self.db.session.rollback()
+            self.rollbacks += 1
+
+    def stats(self):
+        return {
+            'commits': self.commits,
+            'rollbacks': self.rollbacks,
+            'budget_exceeded': self.budget_exceeded,
+            'max_commits': self.max_commits,
+        }
+
+
+unit_of_work = UnitOfWork()
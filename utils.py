@@ -1,110 +1,84 @@
-import json
-import os
+import logging
 from datetime import datetime
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from io import BytesIO
-from app import db
 from models import ActivityLog
+from chemical_registry import registry
+from chemical_search import get_search_engine
+from activity_buffer import activity_buffer
+from pdf_render import render_pdf
+from instrumentation import timed
+from voice_grammar import VOLUME_UNITS
 from flask import session
 
+logger = logging.getLogger(__name__)
+
 def load_chemical_database():
     """Load chemical database from JSON file."""
-    chemicals_file = os.path.join('data', 'chemicals.json')
-    try:
-        with open(chemicals_file, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+    return registry.all()
 
 def get_chemical_data(chemical_name):
     """Get chemical data by name or formula."""
-    chemicals = load_chemical_database()
-    
-    # Search by name (case insensitive)
-    for chemical in chemicals.values():
-        if chemical['name'].lower() == chemical_name.lower():
-            return chemical
-        # Also search by formula
-        if chemical.get('formula', '').lower() == chemical_name.lower():
-            return chemical
-        # Search by common names
-        for common_name in chemical.get('common_names', []):
-            if common_name.lower() == chemical_name.lower():
-                return chemical
-    
-    return None
+    with timed('labmate_chemical_lookup_seconds'):
+        return registry.get(chemical_name)
+
+def find_chemical(chemical_name):
+    """Get chemical data, falling back to the closest fuzzy match.
+
+    Returns a ``(chemical_data, fuzzy)`` tuple; ``chemical_data`` is ``None``
+    when nothing is close enough.
+    """
+    chemical_data = get_chemical_data(chemical_name)
+    if chemical_data:
+        return chemical_data, False
+    with timed('labmate_chemical_lookup_seconds'):
+        chemical_data = get_search_engine().best_match(chemical_name)
+    return chemical_data, chemical_data is not None
+
+def volume_to_liters(volume, unit='l'):
+    """Convert a volume given in ``unit`` (l, ml, millilitres, ...) to litres.
+
+    Calculations are computed and stored in litres; raises ValueError for an
+    unknown unit.
+    """
+    factor = VOLUME_UNITS.get(str(unit or 'l').strip().lower())
+    if factor is None:
+        raise ValueError(f'Unknown volume unit: {unit}')
+    return float(volume) * factor / 1000.0
 
 def calculate_reagent_mass(molarity, volume_liters, molecular_weight):
     """Calculate mass of reagent required for a given molarity and volume."""
     # Mass (g) = Molarity (mol/L) × Volume (L) × Molecular Weight (g/mol)
     return molarity * volume_liters * molecular_weight
 
+def calculate_reagent_masses(molarities, volumes_liters, molecular_weights):
+    """Vectorized calculate_reagent_mass over equal-length sequences.
+
+    Returns a NumPy array of masses in grams. NumPy is imported on first use
+    to keep it out of worker start-up.
+    """
+    import numpy as np
+    return (np.asarray(molarities, dtype=np.float64)
+            * np.asarray(volumes_liters, dtype=np.float64)
+            * np.asarray(molecular_weights, dtype=np.float64))
+
 def generate_pdf_report(title, content, report_type):
     """Generate a PDF report using ReportLab."""
-    buffer = BytesIO()
-    
-    # Create PDF document
-    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=1*inch)
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=1  # Center alignment
-    )
-    
-    header_style = ParagraphStyle(
-        'CustomHeader',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12
+    with timed('labmate_pdf_render_seconds'):
+        return render_pdf(title, content, report_type)
+
+def build_activity(action_type, description, details=None):
+    """Build an ActivityLog row for the current session without saving it."""
+    return ActivityLog(
+        action_type=action_type,
+        description=description,
+        details=details,
+        timestamp=datetime.utcnow(),
+        session_id=session.get('session_id', 'unknown')
     )
-    
-    # Build document content
-    story = []
-    
-    # Title
-    story.append(Paragraph(title, title_style))
-    story.append(Spacer(1, 12))
-    
-    # Report metadata
-    story.append(Paragraph(f"Report Type: {report_type.title()}", header_style))
-    story.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
-    story.append(Spacer(1, 20))
-    
-    # Content
-    story.append(Paragraph("Report Content", header_style))
-    
-    # Split content into paragraphs
-    paragraphs = content.split('\n')
-    for paragraph in paragraphs:
-        if paragraph.strip():
-            story.append(Paragraph(paragraph, styles['Normal']))
-            story.append(Spacer(1, 12))
-    
-    # Build PDF
-    doc.build(story)
-    pdf_content = buffer.getvalue()
-    buffer.close()
-    
-    return pdf_content
 
 def log_activity(action_type, description, details=None):
-    """Log user activity to the database."""
+    """Log user activity through the write-behind activity buffer."""
     try:
-        activity = ActivityLog(
-            action_type=action_type,
-            description=description,
-            details=details,
-            session_id=session.get('session_id', 'unknown')
-        )
-        db.session.add(activity)
-        db.session.commit()
+        activity_buffer.log(action_type, description, details,
+                            session_id=session.get('session_id', 'unknown'))
     except Exception as e:
-        print(f"Error logging activity: {e}")
+        logger.error(f"Error logging activity: {e}")
@@ -0,0 +1,219 @@
+"""Compiled grammar for laboratory voice commands.
+
+Commands are tokenized in a single regex pass and then matched against a
+small table of token rules. The result keeps the shape that
+``routes.parse_lab_command`` always returned (``action`` plus the
+calculation or navigation fields) and adds ``confidence`` and ``rule``.
+Volumes are normalized to millilitres and molarities to mol/L.
+"""
+import re
+
+TOKEN_RE = re.compile(r'(?P<number>\d*\.\d+|\d+)|(?P<word>[a-z][a-z0-9]*)')
+
+NUMBER = 'number'
+WORD = 'word'
+
+# Molarity units and their factor to mol/L
+MOLAR_UNITS = {
+    'm': 1.0, 'molar': 1.0, 'molarity': 1.0, 'molecular': 1.0, 'mol': 1.0,
+    'mm': 0.001, 'millimolar': 0.001,
+}
+
+# Volume units and their factor to millilitres
+VOLUME_UNITS = {
+    'ml': 1.0, 'milliliter': 1.0, 'milliliters': 1.0, 'millilitre': 1.0, 'millilitres': 1.0,
+    'l': 1000.0, 'liter': 1000.0, 'liters': 1000.0, 'litre': 1000.0, 'litres': 1000.0,
+}
+
+# Words that end a chemical name
+CHEMICAL_STOP_WORDS = {'for', 'in', 'of', 'solution', 'to', 'and', 'with', 'please', 'using'}
+
+DEFAULT_MOLARITY = 1.0
+DEFAULT_VOLUME_ML = 250.0
+
+NAVIGATION_VERBS = (('go', 'to'), ('navigate', 'to'), ('open',))
+
+# Checked in order, so the two-word "safety data" wins over plain "safety"
+NAVIGATION_TARGETS = (
+    (('safety', 'data'), '/msds'),
+    (('calculator',), '/calculator'),
+    (('calc',), '/calculator'),
+    (('msds',), '/msds'),
+    (('safety',), '/safety'),
+    (('protocols',), '/safety'),
+    (('documentation',), '/documentation'),
+    (('docs',), '/documentation'),
+    (('reports',), '/documentation'),
+    (('dashboard',), '/'),
+    (('home',), '/'),
+    (('activity',), '/activity_logs'),
+    (('logs',), '/activity_logs'),
+)
+
+HELP_WORDS = {'help', 'commands'}
+HELP_PHRASE = ('what', 'can', 'you', 'do')
+
+
+def tokenize(command):
+    """Split a command into ``(kind, value)`` tokens in one regex pass."""
+    tokens = []
+    for match in TOKEN_RE.finditer(command.lower()):
+        number = match.group(NUMBER)
+        if number is not None:
+            tokens.append((NUMBER, number))
+        else:
+            tokens.append((WORD, match.group(WORD)))
+    return tokens
+
+
+# Rule elements. Each matcher takes (tokens, position, fields) and returns the
+# next position, or None when the element does not match.
+
+def _literal(*words):
+    words = set(words)
+
+    def match(tokens, pos, fields):
+        if pos < len(tokens) and tokens[pos][0] == WORD and tokens[pos][1] in words:
+            return pos + 1
+        return None
+    return match
+
+
+def _optional(*words):
+    words = set(words)
+
+    def match(tokens, pos, fields):
+        if pos < len(tokens) and tokens[pos][0] == WORD and tokens[pos][1] in words:
+            return pos + 1
+        return pos
+    return match
+
+
+def _molarity(tokens, pos, fields):
+    if pos >= len(tokens) or tokens[pos][0] != NUMBER:
+        return None
+    value = float(tokens[pos][1])
+    pos += 1
+    if pos < len(tokens) and tokens[pos][0] == WORD and tokens[pos][1] in MOLAR_UNITS:
+        value *= MOLAR_UNITS[tokens[pos][1]]
+        pos += 1
+    fields['molarity'] = value
+    return pos
+
+
+def _volume(tokens, pos, fields):
+    if pos + 1 >= len(tokens) or tokens[pos][0] != NUMBER:
+        return None
+    unit = tokens[pos + 1]
+    if unit[0] != WORD or unit[1] not in VOLUME_UNITS:
+        return None
+    fields['volume'] = float(tokens[pos][1]) * VOLUME_UNITS[unit[1]]
+    return pos + 2
+
+
+def _chemical(tokens, pos, fields):
+    end = pos
+    while (end < len(tokens) and tokens[end][0] == WORD
+           and tokens[end][1] not in CHEMICAL_STOP_WORDS
+           and tokens[end][1] not in VOLUME_UNITS):
+        end += 1
+    if end == pos:
+        return None
+    fields['chemical'] = ' '.join(value for _, value in tokens[pos:end])
+    return end
+
+
+# (name, confidence, elements), tried in order; the first rule that matches
+# anywhere in the command wins. Every rule needs a chemical: a command
+# without one is not a calculation, rather than a guess at a default.
+CALCULATION_RULES = (
+    ('calculate_for_volume', 0.95,
+     (_literal('calculate'), _molarity, _optional('of'), _chemical, _literal('for'), _volume)),
+    ('prepare_volume_of', 0.95,
+     (_literal('prepare', 'make'), _volume, _literal('of'), _molarity, _optional('of'), _chemical)),
+    ('make_solution_volume', 0.9,
+     (_literal('make', 'prepare'), _molarity, _optional('of'), _chemical, _literal('solution'), _volume)),
+    ('amount_in_volume', 0.85,
+     (_molarity, _optional('of'), _chemical, _optional('solution'), _literal('in', 'for'), _volume)),
+    ('calculate', 0.75,
+     (_literal('calculate', 'make', 'prepare'), _molarity, _optional('of'), _chemical)),
+    ('amount_of', 0.6,
+     (_molarity, _literal('of'), _chemical)),
+)
+
+
+def _match_rule(elements, tokens):
+    for start in range(len(tokens)):
+        fields = {}
+        pos = start
+        for element in elements:
+            pos = element(tokens, pos, fields)
+            if pos is None:
+                break
+        else:
+            return fields
+    return None
+
+
+def _find_phrase(tokens, phrase):
+    words = [value for kind, value in tokens]
+    size = len(phrase)
+    for start in range(len(words) - size + 1):
+        if tuple(words[start:start + size]) == phrase:
+            return start + size
+    return None
+
+
+def _parse_calculation(tokens):
+    for name, confidence, elements in CALCULATION_RULES:
+        fields = _match_rule(elements, tokens)
+        if fields is None:
+            continue
+
+        if 'volume' not in fields:
+            confidence *= 0.9
+
+        return {
+            'action': 'calculation',
+            'chemical': fields['chemical'],
+            'molarity': fields.get('molarity', DEFAULT_MOLARITY),
+            'volume': fields.get('volume', DEFAULT_VOLUME_ML),
+            'volume_unit': 'ml',
+            'confidence': round(confidence, 3),
+            'rule': name,
+        }
+    return None
+
+
+def _parse_navigation(tokens):
+    for verb in NAVIGATION_VERBS:
+        start = _find_phrase(tokens, verb)
+        if start is None:
+            continue
+        rest = tokens[start:]
+        for target, url in NAVIGATION_TARGETS:
+            position = _find_phrase(rest, target)
+            if position is not None:
+                return {
+                    'action': 'navigation',
+                    'target': url.split('/')[-1] or 'dashboard',
+                    'url': url,
+                    'confidence': 0.95 if position == len(target) else 0.8,
+                    'rule': 'navigate',
+                }
+    return None
+
+
+def parse_command(command):
+    """Parse a laboratory voice command into a structured result."""
+    tokens = tokenize(command)
+
+    result = _parse_calculation(tokens) or _parse_navigation(tokens)
+    if result:
+        return result
+
+    words = {value for kind, value in tokens if kind == WORD}
+    if words & HELP_WORDS or _find_phrase(tokens, HELP_PHRASE) is not None:
+        return {'action': 'help', 'confidence': 0.9, 'rule': 'help'}
+
+    return {'action': 'unknown', 'command': command, 'confidence': 0.0, 'rule': None}